@@ -0,0 +1,428 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+# Benchmark of photo_renamer on synthetic photos.
+# It generates the same tree of small JPEG files with EXIF for the same seed every time, so results
+# of different versions of script can be compared. Nothing is asked while it works.
+#
+# Knobs of generated tree: number of files, average size of file, share of photos taken during the same
+# second as previous one (burst shooting), share of byte copies of other photos, share of photos without EXIF
+# and how many subfolders every folder has.
+#
+# For every scale it measures:
+# process_files - reading EXIF and picking up names folder by folder
+# get_new_name_for_photo - picking up names (PhotoRenamer.name_photo), it includes check_duplicates
+# binary_comparison - comparing contents of files
+# rename_photos, remove_copies
+# walk - the whole batch mode on a new tree, walk_again - batch mode on the same tree once again
+#
+# Results are written as JSON:
+# python benchmark.py --scales 100 1000 --output results.json
+# python benchmark.py --scales 100 1000 --compare results_of_previous_version.json
+#
+# Memory that picked up names of photos of one huge folder and index of duplicates take (no files are created):
+# python benchmark.py --memory 1000000
+#
+# Time of start of script: bare interpreter, 'import photo_renamer' and 'photo_renamer.py --help'.
+# It fails (exit code 1) if script starts slower than budget or if import loads heavy modules or creates files:
+# python benchmark.py --startup
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+CAMERAS = [('Canon', 'Canon EOS 80D', 'Canon', 'EF-S24mm f/2.8 STM'),
+           ('NIKON CORPORATION', 'NIKON D750', '', 'AF-S NIKKOR 50mm f/1.8G'),
+           ('SONY', 'ILCE-7M3', 'Sony', 'FE 24-105mm F4 G OSS'),
+           ('Xiaomi', 'MI MAX 2', '', ''),
+           ('', 'DMC-FZ200', '', '')]
+
+
+def _ifd(entries, offset):
+    """
+    :param entries: list of tuples (tag id, bytes of ASCII value) or (tag id, None) for pointer to EXIF IFD
+    :param offset: offset of this IFD from the beginning of TIFF header
+    :return: bytes of IFD with values that don't fit into entries right after it
+    """
+    data_offset = offset + 2 + len(entries) * 12 + 4
+    head = struct.pack('>H', len(entries))
+    data = b''
+    for tag, value in sorted(entries, key=lambda entry: entry[0]):
+        if isinstance(value, int):  # pointer to EXIF IFD
+            head += struct.pack('>HHII', tag, 4, 1, value)
+        elif len(value) <= 4:
+            head += struct.pack('>HHI', tag, 2, len(value)) + value.ljust(4, b'\0')
+        else:
+            head += struct.pack('>HHII', tag, 2, len(value), data_offset + len(data))
+            data += value + b'\0' * (len(value) % 2)
+    return head + struct.pack('>I', 0) + data
+
+
+def make_exif(date_time, make, model, lens_make, lens_model):
+    """
+    :return: bytes of APP1 segment with EXIF that has only tags which photo_renamer reads
+    """
+    ifd0 = [(tag, value.encode() + b'\0') for tag, value in ((0x010F, make), (0x0110, model),
+                                                              (0x0132, date_time)) if value]
+    exif_ifd = [(tag, value.encode() + b'\0') for tag, value in ((0x9003, date_time), (0xA433, lens_make),
+                                                                  (0xA434, lens_model)) if value]
+    exif_offset = 8 + len(_ifd(ifd0 + [(0x8769, 0)], 8))
+    tiff = (b'MM\0\x2a' + struct.pack('>I', 8) + _ifd(ifd0 + [(0x8769, exif_offset)], 8) +
+            _ifd(exif_ifd, exif_offset))
+    payload = b'Exif\0\0' + tiff
+    return b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload
+
+
+def make_jpeg(rnd, size, exif=None):
+    """
+    :param rnd: random.Random object to make image data from
+    :param size: size of image data in bytes
+    :param exif: tuple (date and time, make, model, lens make, lens model) or None for file without EXIF
+    :return: bytes of file
+    """
+    image_data = rnd.getrandbits(size * 8).to_bytes(size, 'little').replace(b'\xff', b'\xfe')
+    return (b'\xff\xd8' + (make_exif(*exif) if exif else b'') + b'\xff\xda\x00\x02' + image_data + b'\xff\xd9')
+
+
+def make_corpus(root, files=1000, size=20000, burst=0.2, duplicates=0.05, no_exif=0.02, fan_out=3, depth=2,
+                seed=0):
+    """
+    Generate tree of photos, the same seed and knobs give the same tree
+
+    :param root: folder to create photos in
+    :param files: number of files
+    :param size: average size of file in bytes
+    :param burst: share of photos taken during the same second as the previous one
+    :param duplicates: share of files that are copies of one of previous files with another name
+    :param no_exif: share of photos without EXIF
+    :param fan_out: number of subfolders in every folder
+    :param depth: number of levels of subfolders
+    :param seed: seed of random generator
+    :return: list of paths of folders
+    """
+    rnd = random.Random(seed)
+    folders = [root]
+    level = [root]
+    for _ in range(depth):
+        level = [os.path.join(folder, 'folder_{}'.format(i)) for folder in level for i in range(fan_out)]
+        folders.extend(level)
+    for folder in folders:
+        os.makedirs(folder, exist_ok=True)
+
+    shot_time = 1400000000  # seconds since epoch of the first photo
+    written = []  # paths of written files
+    for number in range(files):
+        folder = folders[rnd.randrange(len(folders))]
+        path = os.path.join(folder, 'IMG_{:06d}.jpg'.format(number))
+        if written and rnd.random() < duplicates:
+            shutil.copyfile(written[rnd.randrange(len(written))], path)
+        else:
+            if rnd.random() >= burst:
+                shot_time += rnd.randrange(1, 3600)
+            exif = None
+            if rnd.random() >= no_exif:
+                exif = (time.strftime('%Y:%m:%d %H:%M:%S', time.gmtime(shot_time)),) + rnd.choice(CAMERAS)
+            with open(path, 'wb') as f:
+                f.write(make_jpeg(rnd, max(1, int(size * rnd.uniform(0.5, 1.5))), exif))
+        written.append(path)
+    return folders
+
+
+class Stage:
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+
+    def as_dict(self):
+        return {'calls': self.calls, 'seconds': round(self.seconds, 6)}
+
+
+def timed(function, stage):
+    """
+    :return: function that does the same, but adds its calls and time to stage
+    """
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            stage.calls += 1
+            stage.seconds += time.perf_counter() - start
+    return wrapper
+
+
+def run_stages(renamer, folders):
+    """
+    Process folders one by one like batch mode does, but measure every stage
+
+    :param renamer: photo_renamer module
+    :param folders: paths of folders
+    :return: dict with results
+    """
+    stages = {name: Stage() for name in ('process_files', 'get_new_name_for_photo', 'binary_comparison',
+                                         'rename_photos', 'remove_copies')}
+    db = renamer.open_db()
+    dup_index = renamer.duplicate_index.DuplicateIndex()
+    dup_index.same_content = timed(dup_index.same_content, stages['binary_comparison'])
+    tags_cache = renamer.exif_cache.ExifCache()
+    journal = renamer.rename_journal.RenameJournal()
+    disposer = renamer.disposal.Disposer('delete')
+
+    engine = renamer.renamer_engine.PhotoRenamer
+    name_photo = engine.name_photo
+    engine.name_photo = timed(name_photo, stages['get_new_name_for_photo'])
+    try:
+        for folder in folders:
+            name_strings = renamer.name_allocator.NameAllocator(folder)
+            files_to_rename = timed(renamer.process_files, stages['process_files'])(
+                folder, db, name_strings, dup_index, tags_cache)[0]
+            timed(renamer.rename_photos, stages['rename_photos'])(files_to_rename, dup_index, tags_cache, journal)
+            if renamer.images_to_delete:
+                timed(renamer.remove_copies, stages['remove_copies'])(disposer)
+                renamer.images_to_delete[:] = []
+    finally:
+        engine.name_photo = name_photo
+        journal.close()
+        db.close()
+        tags_cache.close()
+        dup_index.close()
+
+    results = {name: stage.as_dict() for name, stage in stages.items()}
+    results['binary_comparison']['bytes_read'] = dup_index.bytes_read
+    return results
+
+
+def run_walk(renamer, root):
+    start = time.perf_counter()
+    renamer.batch_main(root, ask=False)
+    return {'calls': 1, 'seconds': round(time.perf_counter() - start, 6)}
+
+
+def run_scale(renamer, work_folder, files, knobs):
+    """
+    :return: dict with results of all stages for tree with this number of files
+    """
+    results = {'files': files}
+
+    # Every run starts from the same new tree and empty databases (they are in db folder of working folder)
+    os.chdir(os.path.join(work_folder, 'stages_{}'.format(files)))
+    folders = make_corpus('photos', files, **knobs)
+    results['stages'] = run_stages(renamer, folders)
+
+    os.chdir(os.path.join(work_folder, 'walk_{}'.format(files)))
+    make_corpus('photos', files, **knobs)
+    results['stages']['walk'] = run_walk(renamer, 'photos')
+    results['stages']['walk_again'] = run_walk(renamer, 'photos')
+    results['files_per_second'] = round(files / max(results['stages']['walk']['seconds'], 1e-9), 1)
+    return results
+
+
+def measure_memory(entries, folder=os.path.join('mnt', 'nas', 'backups', 'phone', 'DCIM', 'Camera')):
+    """
+    Compare memory taken by picked up names of photos of one folder when every photo is kept as
+    [full path, new name] list and dict of full paths (like it was before) and when it is kept as PhotoRecord
+    with NameAllocator that both store only names of files.
+    Memory of DuplicateIndex with the same photos is measured as well, because it keeps full paths of all
+    photos of library during the whole run, so it is a part of memory of every run anyway.
+
+    :param entries: number of photos in folder
+    :param folder: path to folder
+    :return: dict with bytes per both ways and bytes of index
+    """
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import duplicate_index
+    import name_allocator
+
+    # Names of files and new names exist anyway (they come from listing of folder and from EXIF)
+    filenames = ['IMG_{:07d}.jpg'.format(number) for number in range(entries)]
+    new_names = ['2019-01-{:02d} {:02d}-{:02d}-{:02d} Xiaomi MI MAX 2'.format(
+        1 + number // 86400 % 28, number // 3600 % 24, number // 60 % 60, number % 60) for number in range(entries)]
+
+    def lists():
+        images_with_info, name_strings = [], {}
+        for filename, new_name in zip(filenames, new_names):
+            path = os.path.join(folder, filename)
+            images_with_info.append([path, new_name])
+            name_strings[new_name] = path
+        return images_with_info, name_strings
+
+    def records():
+        images_with_info, name_strings = [], name_allocator.NameAllocator(folder, listing=[])
+        for filename, new_name in zip(filenames, new_names):
+            images_with_info.append(name_allocator.PhotoRecord(folder, filename, new_name))
+            name_strings.pick(new_name, filename)
+        return images_with_info, name_strings
+
+    def index():
+        # Files are put in index the way add() does it, but without reading them: every photo has
+        # a digest as if there were other files of its size (it is the most that index keeps)
+        dup_index = duplicate_index.DuplicateIndex(None)
+        for number, filename in enumerate(filenames):
+            path = os.path.join(folder, filename)
+            size = 3000000 + number % 100000
+            partial = '{:040x}'.format(number)
+            dup_index.records[path] = {'size': size, 'mtime': 1500000000000000000 + number, 'partial': partial,
+                                       'full': None}
+            dup_index._index(path, (size, partial))
+        return dup_index
+
+    results = {'entries': entries}
+    for name, build in (('lists', lists), ('records', records), ('index', index)):
+        tracemalloc.start()
+        kept = build()
+        results[name] = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del kept
+    return results
+
+
+# Modules that must not be loaded by 'import photo_renamer', they are loaded by stages that need them
+HEAVY_MODULES = ('exifread', 'send2trash', 'shelve', 'ctypes', 'argparse', 'logging.handlers', 'multiprocessing',
+                 'cProfile')
+STARTUP_BUDGET = 0.15  # seconds that 'photo_renamer.py --help' may take above bare interpreter
+
+
+def measure_startup(runs=10):
+    """
+    Measure how long it takes to import photo_renamer and to start it from command line
+
+    :param runs: how many times to run every command, median time is taken
+    :return: dict with seconds of bare interpreter, import and --help, heavy modules that import has loaded
+    and files that were created in working folder (there should be none of both)
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'photo_renamer.py')
+    folder = tempfile.mkdtemp(prefix='photo_renamer_startup_')
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(script))
+    commands = (('python', [sys.executable, '-c', 'pass']),
+                ('import', [sys.executable, '-c', 'import photo_renamer']),
+                ('help', [sys.executable, script, '--help']))
+    results = {}
+    try:
+        for name, command in commands:
+            times = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                subprocess.run(command, cwd=folder, env=env, stdout=subprocess.DEVNULL, check=True)
+                times.append(time.perf_counter() - start)
+            results[name] = round(statistics.median(times), 4)
+        modules = subprocess.run([sys.executable, '-c', 'import sys, photo_renamer; print(*sys.modules)'],
+                                 cwd=folder, env=env, stdout=subprocess.PIPE, check=True, universal_newlines=True)
+        results['heavy_modules'] = [name for name in HEAVY_MODULES if name in modules.stdout.split()]
+        results['created_files'] = sorted(os.listdir(folder))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    results['budget'] = STARTUP_BUDGET
+    results['ok'] = (results['help'] - results['python'] <= STARTUP_BUDGET and not results['heavy_modules'] and
+                     not results['created_files'])
+    return results
+
+
+def compare(results, previous):
+    """
+    Print how much time every stage takes in comparison with previous results
+    """
+    old_scales = {scale['files']: scale for scale in previous['scales']}
+    for scale in results['scales']:
+        old = old_scales.get(scale['files'])
+        if not old:
+            continue
+        print('{} files:'.format(scale['files']))
+        for name, stage in scale['stages'].items():
+            old_stage = old['stages'].get(name)
+            if old_stage and old_stage['seconds']:
+                print('  {:<24} {:>10.3f} s  was {:>10.3f} s  ({:+.0%})'.format(
+                    name, stage['seconds'], old_stage['seconds'], stage['seconds'] / old_stage['seconds'] - 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark photo_renamer on generated photos')
+    parser.add_argument('--scales', type=int, nargs='+', default=[100, 1000], help='numbers of files')
+    parser.add_argument('--size', type=int, default=20000, help='average size of file in bytes')
+    parser.add_argument('--burst', type=float, default=0.2,
+                        help='share of photos taken during the same second as the previous one')
+    parser.add_argument('--duplicates', type=float, default=0.05, help='share of copies of other files')
+    parser.add_argument('--no-exif', type=float, default=0.02, help='share of photos without EXIF')
+    parser.add_argument('--fan-out', type=int, default=3, help='number of subfolders in every folder')
+    parser.add_argument('--depth', type=int, default=2, help='number of levels of subfolders')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-folder', help='where to generate photos (default: new temporary folder, '
+                                              'it is removed afterwards)')
+    parser.add_argument('--output', help='file to write results to (default: print them)')
+    parser.add_argument('--compare', help='file with results of previous benchmark to compare with')
+    parser.add_argument('--memory', type=int, metavar='ENTRIES',
+                        help='only measure memory that picked up names of ENTRIES photos of one folder take')
+    parser.add_argument('--startup', action='store_true',
+                        help='only measure time of start of script and check that import has no side effects')
+    args = parser.parse_args()
+
+    if args.startup:
+        results = measure_startup()
+        print(json.dumps(results, indent=2))
+        if not results['ok']:
+            print('Script starts too slowly or its import does too much', file=sys.stderr)
+            sys.exit(1)
+        return
+
+    if args.memory:
+        results = measure_memory(args.memory)
+        print(json.dumps(results, indent=2))
+        print('{:.1f} MB as lists, {:.1f} MB as records, {:.1f} MB more for index of duplicates'.format(
+            results['lists'] / 1024**2, results['records'] / 1024**2, results['index'] / 1024**2), file=sys.stderr)
+        return
+
+    knobs = {'size': args.size, 'burst': args.burst, 'duplicates': args.duplicates, 'no_exif': args.no_exif,
+             'fan_out': args.fan_out, 'depth': args.depth, 'seed': args.seed}
+    work_folder = os.path.abspath(args.work_folder or tempfile.mkdtemp(prefix='photo_renamer_benchmark_'))
+    for files in args.scales:
+        os.makedirs(os.path.join(work_folder, 'stages_{}'.format(files)), exist_ok=True)
+        os.makedirs(os.path.join(work_folder, 'walk_{}'.format(files)), exist_ok=True)
+    output = os.path.abspath(args.output) if args.output else None
+    previous = os.path.abspath(args.compare) if args.compare else None
+
+    # photo_renamer creates its log and databases in working folder, so it is imported from there
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(work_folder)
+    import photo_renamer
+    photo_renamer.interactive = False
+    photo_renamer.CONSOLE_LEVEL = logging.WARNING
+    photo_renamer.DISPOSAL = 'delete'
+    photo_renamer.start_logging(logging.WARNING)
+
+    results = {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(),
+               'platform': platform.platform(), 'knobs': knobs, 'scales': []}
+    try:
+        for files in args.scales:
+            with contextlib.redirect_stdout(io.StringIO()):
+                results['scales'].append(run_scale(photo_renamer, work_folder, files, knobs))
+            print('{} files: {} files/s'.format(files, results['scales'][-1]['files_per_second']), file=sys.stderr)
+    finally:
+        photo_renamer.handle_logs.stop_loggers()
+        os.chdir(os.path.dirname(work_folder))
+        if not args.work_folder:
+            shutil.rmtree(work_folder, ignore_errors=True)
+
+    if output:
+        with open(output, 'w', encoding='utf8') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    if previous:
+        with open(previous, encoding='utf8') as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+# Byte-by-byte comparison of two files that never keeps more than one chunk of each file in memory.
+# Files with different size are rejected without opening them, and comparison stops on the first
+# chunk that differs. Comparator counts how many bytes it has actually read, so it is possible
+# to see how much duplicate checks cost.
+
+import mmap
+import os
+
+CHUNK_SIZE = 256 * 1024  # how many bytes of each file to compare at once
+
+
+class FileComparator:
+    def __init__(self, chunk_size=CHUNK_SIZE, use_mmap=False):
+        """
+        :param chunk_size: how many bytes of each file to read and compare at once
+        :param use_mmap: map files to memory instead of reading them, it lets OS page them in by itself
+        """
+        self.chunk_size = chunk_size
+        self.use_mmap = use_mmap
+        self.comparisons = 0  # how many pairs of files were compared
+        self.rejected_by_size = 0  # how many pairs were rejected without opening files
+        self.bytes_read = 0  # how many bytes of both files were read in total
+
+    def same(self, first_path, second_path, digest=None):
+        """
+        Check whether two files are totally equal
+
+        :param first_path: full path to first file
+        :param second_path: full path to second file
+        :param digest: optional hashlib object to feed with content of files while they are compared,
+        it is a hash of both files only if they are equal
+        :return: True or False
+        """
+        self.comparisons += 1
+        size = os.path.getsize(first_path)
+        if size != os.path.getsize(second_path):
+            self.rejected_by_size += 1
+            return False
+        if size == 0:
+            return True
+
+        with open(first_path, 'rb') as a, open(second_path, 'rb') as b:
+            if self.use_mmap:
+                return self._compare_mapped(a, b, size, digest)
+            return self._compare_streams(a, b, digest)
+
+    def _compare_streams(self, a, b, digest):
+        while True:
+            chunk_a = a.read(self.chunk_size)
+            chunk_b = b.read(self.chunk_size)
+            self.bytes_read += len(chunk_a) + len(chunk_b)
+            if chunk_a != chunk_b:
+                return False
+            if not chunk_a:
+                return True
+            if digest is not None:
+                digest.update(chunk_a)
+
+    def _compare_mapped(self, a, b, size, digest):
+        with mmap.mmap(a.fileno(), 0, access=mmap.ACCESS_READ) as map_a, \
+                mmap.mmap(b.fileno(), 0, access=mmap.ACCESS_READ) as map_b:
+            for start in range(0, size, self.chunk_size):
+                end = min(start + self.chunk_size, size)
+                self.bytes_read += 2 * (end - start)
+                chunk_a = map_a[start:end]
+                if chunk_a != map_b[start:end]:
+                    return False
+                if digest is not None:
+                    digest.update(chunk_a)
+        return True
@@ -0,0 +1,84 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+# Manifest of folders that were successfully processed before. It is used by incremental runs
+# to skip folders that haven't been changed since then.
+#
+# For every folder it stores modification time of folder, digest of names of its entries and
+# digest of names, sizes and modification times of its entries.
+# Quick check compares time of folder and names that os.walk has already listed, so it doesn't cost
+# anything except one stat of folder. It notices added, removed and renamed files.
+# Full verify also compares sizes and times of files, so it notices files that were changed in place.
+
+import hashlib
+import os
+import sqlite3
+
+
+class DirManifest:
+    def __init__(self, path_to_db=os.path.join('db', 'manifest.sqlite')):
+        """
+        :param path_to_db: path to SQLite file with manifest
+        """
+        if not os.path.exists(os.path.dirname(path_to_db)):
+            os.mkdir(os.path.dirname(path_to_db))
+        self.connection = sqlite3.connect(path_to_db)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS folders ('
+                                'path TEXT PRIMARY KEY, mtime_ns INTEGER, names_digest TEXT, full_digest TEXT)')
+
+    @staticmethod
+    def _names_digest(names):
+        return hashlib.sha1('\n'.join(sorted(names)).encode('utf8', 'surrogateescape')).hexdigest()
+
+    @staticmethod
+    def _scan(folder):
+        """
+        :return: tuple with list of names of entries of folder and digest of their names, sizes and times
+        """
+        names = []
+        digest = hashlib.sha1()
+        with os.scandir(folder) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                stat = entry.stat(follow_symlinks=False)
+                names.append(entry.name)
+                digest.update('{}\n{}\n{}\n'.format(entry.name, stat.st_size, stat.st_mtime_ns)
+                              .encode('utf8', 'surrogateescape'))
+        return names, digest.hexdigest()
+
+    def is_unchanged(self, folder, names, verify=False):
+        """
+        Check whether folder is the same as it was after the last successful run
+
+        :param folder: path to folder
+        :param names: names of all entries of folder (e.g. subfolders + files from os.walk)
+        :param verify: also compare sizes and modification times of every file
+        :return: True if folder can be skipped
+        """
+        row = self.connection.execute('SELECT mtime_ns, names_digest, full_digest FROM folders WHERE path = ?',
+                                      (os.path.abspath(folder),)).fetchone()
+        if not row or row[0] != os.stat(folder).st_mtime_ns or row[1] != self._names_digest(names):
+            return False
+        if verify and row[2] != self._scan(folder)[1]:
+            return False
+        return True
+
+    def record(self, folder):
+        """
+        Remember current state of folder after it was successfully processed
+        """
+        names, full_digest = self._scan(folder)
+        self.connection.execute('INSERT OR REPLACE INTO folders VALUES (?, ?, ?, ?)',
+                                (os.path.abspath(folder), os.stat(folder).st_mtime_ns,
+                                 self._names_digest(names), full_digest))
+        self.connection.commit()
+
+    def forget(self, folder):
+        """
+        Make folder to be processed next time even if it won't be changed
+        """
+        self.connection.execute('DELETE FROM folders WHERE path = ?', (os.path.abspath(folder),))
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
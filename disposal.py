@@ -0,0 +1,148 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+# Ways to get rid of superfluous copies of photos:
+# 'trash' - send files to trash bin, many files at once (on Windows and macOS it is one call to the system
+#           for the whole batch instead of one call for every file)
+# 'quarantine' - move files to quarantine folder on the same disk, it is just renaming, so it costs nothing
+#           and files can be checked and removed later by hand
+# 'delete' - remove files for good
+#
+# Every way reports its progress and speed while it works.
+
+import os
+import time
+
+import rename_journal
+
+KINDS = ('trash', 'quarantine', 'delete')
+BATCH_SIZE = 500  # how many files to send to trash at once
+QUARANTINE_NAME = '.photo_renamer_quarantine'  # name of quarantine folder on every disk
+
+
+def _writable_folder(path):
+    """
+    Find where to create quarantine folder for file: in the root of its disk if user can write there,
+    otherwise in the highest folder above file on the same disk that user can write to (e.g. home folder)
+
+    :param path: path to file
+    :return: path to folder or None if there is no such folder
+    """
+    device = os.stat(path).st_dev
+    folders = []  # from folder of file up to the root of disk
+    folder = os.path.dirname(os.path.abspath(path))
+    while True:
+        folders.append(folder)
+        parent = os.path.dirname(folder)
+        if os.path.ismount(folder) or parent == folder:
+            break
+        folder = parent
+
+    for folder in reversed(folders):
+        quarantine = os.path.join(folder, QUARANTINE_NAME)
+        target = quarantine if os.path.isdir(quarantine) else folder
+        if os.access(target, os.W_OK | os.X_OK) and os.stat(target).st_dev == device:
+            return folder
+    return None
+
+
+class Disposer:
+    def __init__(self, kind='trash', quarantine_folder=None, progress=None):
+        """
+        :param kind: one of KINDS
+        :param quarantine_folder: folder for 'quarantine', by default it is QUARANTINE_NAME in the root of disk
+        where file is (or in the highest folder above file that user can write to), if file is on another disk
+        than this folder, the default one is used for it as well
+        :param progress: function that takes (number of processed files, total number, files per second)
+        """
+        if kind not in KINDS:
+            raise ValueError('Unknown way to dispose files: {}. Possible ways are: {}'.format(kind, ', '.join(KINDS)))
+        self.kind = kind
+        self.quarantine_folder = quarantine_folder
+        self.progress = progress
+        self.run_name = time.strftime('%Y-%m-%d__%Hh%Mm%Ss')  # every run has its own subfolder in quarantine
+        self.quarantines = {}  # st_dev of disk -> quarantine folder on this disk or error if there is no such folder
+        self.created_folders = set()
+
+    def dispose(self, paths):
+        """
+        :param paths: list of paths to files to get rid of
+        :return: tuple (list of removed files, list of tuples (file, exception) for files that weren't removed)
+        """
+        removed, failed = [], []
+        start = time.monotonic()
+        step = BATCH_SIZE if self.kind == 'trash' else 100  # how often to report progress
+
+        for first in range(0, len(paths), step):
+            batch = paths[first:first + step]
+            if self.kind == 'trash':
+                self._trash(batch, removed, failed)
+            else:
+                for path in batch:
+                    try:
+                        if self.kind == 'delete':
+                            os.remove(path)
+                        else:
+                            self._quarantine(path)
+                        removed.append(path)
+                    except OSError as error:
+                        failed.append((path, error))
+            if self.progress:
+                done = first + len(batch)
+                self.progress(done, len(paths), done / max(time.monotonic() - start, 1e-6))
+        return removed, failed
+
+    def _trash(self, batch, removed, failed):
+        from send2trash import send2trash  # it is imported only when something is sent to trash
+
+        try:
+            send2trash(batch)
+            removed.extend(batch)
+        except OSError:
+            # Some file of batch can't be sent to trash, so find out which one by sending them one by one
+            for path in batch:
+                if not os.path.lexists(path):  # it was sent before the error
+                    removed.append(path)
+                    continue
+                try:
+                    send2trash(path)
+                    removed.append(path)
+                except OSError as error:
+                    failed.append((path, error))
+
+    def _quarantine_for(self, path):
+        device = os.stat(path).st_dev
+        if device not in self.quarantines:
+            folder = self.quarantine_folder
+            if not folder or not os.path.isdir(folder) or os.stat(folder).st_dev != device:
+                parent = _writable_folder(path)
+                folder = os.path.join(parent, QUARANTINE_NAME) if parent else None
+            if folder:
+                self.quarantines[device] = os.path.join(folder, self.run_name)
+            else:  # the same error is given for all files of this disk without looking for folder again
+                self.quarantines[device] = PermissionError(
+                    'there is no folder on disk of {} where quarantine can be created, '
+                    'give --quarantine-folder on the same disk'.format(os.path.dirname(os.path.abspath(path))))
+        if isinstance(self.quarantines[device], OSError):
+            raise self.quarantines[device]
+        return self.quarantines[device]
+
+    def _quarantine(self, path):
+        # Full path of file is kept inside quarantine folder, so files with the same name don't collide
+        # and it is clear where to put file back
+        quarantine = self._quarantine_for(path)
+        folder = os.path.join(quarantine, os.path.splitdrive(os.path.dirname(os.path.abspath(path)))[1].lstrip('\\/'))
+        if folder not in self.created_folders:
+            os.makedirs(folder, exist_ok=True)
+            self.created_folders.add(folder)
+        # The same file can be put into quarantine twice during one run (e.g. file with the same name has appeared
+        # in the same folder again), then order number is added to name like photo_renamer does
+        name, extension = os.path.splitext(os.path.basename(path))
+        number = 1
+        while True:
+            try:
+                rename_journal.move_no_replace(path, os.path.join(folder, name + (
+                    '[{}]'.format(number) if number > 1 else '') + extension))
+                return
+            except FileExistsError:
+                number += 1
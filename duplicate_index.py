@@ -0,0 +1,346 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+# Library-wide index of photo contents that helps photo_renamer to find duplicates
+# across all folders it walks through, not only inside one folder.
+#
+# Files are grouped in three steps so most of them are never read in full:
+# 1. by size - files with unique size can't have a copy, so they are not even opened
+# 2. by partial hash - hash of first and last PARTIAL_CHUNK bytes of file, files are kept in buckets
+#    by (size, partial hash), so new file is compared only with files of its own bucket
+# 3. by full hash - hash of the whole file, only for files that are still alike after step 2
+#    (if full hash of one of files is unknown, files are compared chunk by chunk and hashed at the same time,
+#    because comparison stops on the first difference and plain hashing always reads whole file)
+#
+# Digests are stored in db/hash_db (next to db/tags_db) together with size and mtime of file,
+# so next time script doesn't need to read unchanged files again.
+#
+# Optionally it also finds photos that are not equal byte by byte, but look the same (resized or recompressed
+# copies of the same shot) by perceptual hashes of their EXIF thumbnails (see thumbnail_hash.py).
+
+import hashlib
+import os
+
+import compare_files
+import thumbnail_hash
+
+PARTIAL_CHUNK = 64 * 1024  # how many bytes from head and tail of file to use for partial hash
+
+
+def _same_file(first_path, second_path):
+    """
+    Check whether two paths lead to one file (e.g. hard link or folder that is reachable by two paths),
+    such file is never a copy of itself
+    """
+    try:
+        return os.path.samefile(first_path, second_path)
+    except OSError:
+        return False
+
+
+class DuplicateIndex:
+    def __init__(self, path_to_db=os.path.join('db', 'hash_db'), comparator=None, remember_folder=None,
+                 similar_threshold=None):
+        """
+        :param path_to_db: path to shelve file where digests are stored between runs, None to keep them only
+        in memory (e.g. in worker processes that can't share one file)
+        :param comparator: FileComparator object to compare files which full hashes are unknown
+        :param remember_folder: look for copies among files of this folder and its subfolders that were seen
+        during previous runs as well, it is needed when some folders are skipped during this run.
+        Files of other folders are never taken, they can be in the same db after runs over other trees
+        :param similar_threshold: how many bits of thumbnail hashes can differ for add_similar() to consider
+        photos the same shot, None turns search for similar photos off
+        """
+        self.path_to_db = path_to_db
+        if path_to_db is None:
+            self.db = {}
+        else:
+            import shelve
+
+            if not os.path.exists(os.path.dirname(path_to_db)):
+                os.mkdir(os.path.dirname(path_to_db))
+            self.db = shelve.open(path_to_db)
+        # (size, partial hash) -> list of paths of files that were already seen, partial hash is None for file
+        # that is the only one of its size, it is hashed only when the second file of this size comes
+        self.buckets = {}
+        self.keys = {}  # path -> its key in buckets
+        # All paths are kept absolute, otherwise the same file given relative in one run and absolute in another
+        # would look like two files with the same content, and one of them would be removed as a copy
+        self.files_of_size = {}  # size -> number of files of this size in buckets
+        # path -> record with digests that were read or computed during this run
+        self.records = {}
+        self.bytes_hashed = 0  # how many bytes was actually read from disk to compute hashes
+        self.comparator = comparator or compare_files.FileComparator()
+        self.similar_threshold = similar_threshold
+        self.thumbnails = thumbnail_hash.BKTree()  # thumbnail hashes of photos of this run
+        self.similar = {}  # path of photo in thumbnails -> tuple (thumbnail hash, date and time of shooting)
+
+        if remember_folder is not None:
+            # Records are not loaded into memory, they are taken from db only if they are needed.
+            # Files are not checked here, it would be a stat for every file of the library on every start.
+            # Removed and changed files are dropped later by _get_record when they become candidates
+            prefix = os.path.join(os.path.abspath(remember_folder), '')
+            for path, record in self.db.items():
+                if path.startswith(prefix):
+                    self._index(path, (record['size'], record['partial']))
+
+    def close(self):
+        for path, record in self.records.items():
+            self.db[path] = record
+        if self.path_to_db is not None:
+            self.db.close()
+
+    def _index(self, path, key):
+        self.buckets.setdefault(key, []).append(path)
+        self.keys[path] = key
+        self.files_of_size[key[0]] = self.files_of_size.get(key[0], 0) + 1
+
+    def _unindex(self, path):
+        key = self.keys.pop(path, None)
+        if key is None:
+            return
+        bucket = self.buckets[key]
+        bucket.remove(path)
+        if not bucket:
+            del self.buckets[key]
+        self.files_of_size[key[0]] -= 1
+        if not self.files_of_size[key[0]]:
+            del self.files_of_size[key[0]]
+
+    def _hash_waiting(self, size):
+        """
+        Move files of this size which partial hashes haven't been needed yet to their buckets
+        """
+        for path in list(self.buckets.get((size, None), [])):
+            self._unindex(path)
+            record = self._get_record(path)
+            if record and record['size'] == size:  # file that has been removed or changed is dropped
+                partial = self._digest(path, record)
+                if partial is not None:
+                    self._index(path, (size, partial))
+
+    def _get_record(self, path, stat=None):
+        """
+        Get record about file from memory or from db. Record from db is used only if file wasn't changed since then.
+
+        :param path: full path to file
+        :param stat: result of os.stat for this file if it is already known
+        :return: dict with size, mtime and digests (if they were computed) or None if file doesn't exist anymore
+        """
+        try:
+            stat = stat or os.stat(path)
+        except FileNotFoundError:
+            self.records.pop(path, None)
+            if path in self.db:  # so db doesn't grow with every run
+                del self.db[path]
+            return None
+
+        record = self.records.get(path)
+        if record and record['size'] == stat.st_size and record['mtime'] == stat.st_mtime_ns:
+            return record
+
+        record = self.db.get(path)
+        if not record or record['size'] != stat.st_size or record['mtime'] != stat.st_mtime_ns:
+            record = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'partial': None, 'full': None}
+        self.records[path] = record
+        return record
+
+    def _partial_hash(self, path, record):
+        if record['partial'] is None:
+            digest = hashlib.sha1()
+            with open(path, 'rb') as f:
+                digest.update(f.read(PARTIAL_CHUNK))
+                if record['size'] > PARTIAL_CHUNK:
+                    f.seek(max(PARTIAL_CHUNK, record['size'] - PARTIAL_CHUNK))
+                    digest.update(f.read(PARTIAL_CHUNK))
+            self.bytes_hashed += min(record['size'], 2 * PARTIAL_CHUNK)
+            record['partial'] = digest.hexdigest()
+        return record['partial']
+
+    def _digest(self, path, record):
+        """
+        Get partial hash of file. Returns None if file has been moved or removed meanwhile.
+        """
+        try:
+            return self._partial_hash(path, record)
+        except FileNotFoundError:
+            self.records.pop(path, None)
+            return None
+
+    def same_content(self, first_path, second_path):
+        """
+        Check whether two files are totally equal using cached digests where it is possible
+
+        :param first_path: full path to first file
+        :param second_path: full path to second file
+        :return: True or False
+        """
+        first_path, second_path = os.path.abspath(first_path), os.path.abspath(second_path)
+        first, second = self._get_record(first_path), self._get_record(second_path)
+        if not first or not second or first['size'] != second['size']:
+            return False
+        first_digest = self._digest(first_path, first)
+        if first_digest is None or first_digest != self._digest(second_path, second):
+            return False
+
+        if first['full'] is not None and second['full'] is not None:
+            return first['full'] == second['full']
+
+        # Files are hashed while they are compared, so if they are equal, full hash is known for both
+        digest = hashlib.sha1()
+        try:
+            equal = self.comparator.same(first_path, second_path, digest)
+        except FileNotFoundError:
+            return False
+        if equal:
+            first['full'] = second['full'] = digest.hexdigest()
+        return equal
+
+    @property
+    def bytes_read(self):
+        """
+        :return: how many bytes were read from disk to find duplicates, both for hashing and comparison
+        """
+        return self.bytes_hashed + self.comparator.bytes_read
+
+    def add(self, path, stat=None):
+        """
+        Add file to the index and look for the file with the same content among files that were added before
+
+        :param path: full path to file
+        :param stat: result of os.stat for this file if it is already known
+        :return: absolute path to earlier copy of the same file or None if there is no such copy
+        """
+        path = os.path.abspath(path)
+        record = self._get_record(path, stat)
+        if not record:
+            return None
+        self._unindex(path)  # file can be added once again after it has been changed
+
+        size = record['size']
+        if not self.files_of_size.get(size):
+            self._index(path, (size, None))
+            return None
+        self._hash_waiting(size)
+        partial = self._digest(path, record)
+        if partial is None:
+            return None
+
+        key = (size, partial)
+        copy = None
+        for candidate in list(self.buckets.get(key, [])):
+            if self.same_content(path, candidate) and not _same_file(path, candidate):
+                copy = candidate
+                break
+            if candidate not in self.records:  # it has been removed since it was added
+                self._unindex(candidate)
+
+        self._index(path, key)
+        return copy
+
+    def add_similar(self, path, shot_time=None):
+        """
+        Add photo to index of thumbnails and look for photo that looks the same (e.g. resized or recompressed copy
+        of the same shot) among photos that were added before
+
+        :param path: full path to photo
+        :param shot_time: date and time of shooting from EXIF, photos which have different ones are never alike
+        :return: absolute path to earlier photo that looks the same or None if there is no such photo or search is off.
+        Photo is added to index anyway, because it is only reported and both photos are kept
+        """
+        if self.similar_threshold is None:
+            return None
+        path = os.path.abspath(path)
+        record = self._get_record(path)
+        if not record:
+            return None
+        if 'thumbnail' not in record:  # None means that photo has no thumbnail that can be read
+            record['thumbnail'] = thumbnail_hash.thumbnail_hash(path)
+        value = record['thumbnail']
+        if value is None:
+            return None
+
+        similar = None
+        for _, candidate in self.thumbnails.search(value, self.similar_threshold):
+            if candidate == path or _same_file(path, candidate):
+                continue
+            if not self._get_record(candidate):  # it has been removed since it was added
+                self.thumbnails.remove(self.similar.pop(candidate)[0], candidate)
+                continue
+            other_time = self.similar[candidate][1]
+            if not shot_time or not other_time or shot_time == other_time:
+                similar = candidate
+                break
+
+        if path not in self.similar:
+            self.thumbnails.add(value, path)
+            self.similar[path] = (value, shot_time)
+        return similar
+
+    def has_copy(self, path, folder=None):
+        """
+        Check whether there is a copy of file among files that are in index. Unlike add() it looks through
+        files that were added both before and after this file.
+
+        :param path: full path to file that has been already added
+        :param folder: look for copies only in this folder
+        :return: True or False (True also if file is not in index, because then nothing is known about it)
+        """
+        path = os.path.abspath(path)
+        if folder is not None:
+            folder = os.path.abspath(folder)
+        key = self.keys.get(path)
+        if key is None or path not in self.records:
+            return True
+        if key[1] is None:
+            if self.files_of_size[key[0]] == 1:  # the only file of its size
+                return False
+            self._hash_waiting(key[0])
+            key = self.keys.get(path)
+            if key is None:
+                return True
+        for candidate in list(self.buckets.get(key, [])):
+            if candidate == path or (folder is not None and os.path.dirname(candidate) != folder):
+                continue
+            if self.same_content(path, candidate) and not _same_file(path, candidate):
+                return True
+        return False
+
+    def state(self, path):
+        """
+        :return: tuple (size, modification time in nanoseconds) of file when it was added or None if it wasn't added
+        """
+        record = self.records.get(os.path.abspath(path))
+        return (record['size'], record['mtime']) if record else None
+
+    def moved(self, old_path, new_path):
+        """
+        Keep digests of file after it was renamed, so it still can be found as a copy of other files
+        """
+        old_path, new_path = os.path.abspath(old_path), os.path.abspath(new_path)
+        record = self.records.pop(old_path, None)
+        if not record:
+            return
+        self.records[new_path] = record
+        if old_path in self.db:
+            del self.db[old_path]
+        key = self.keys.pop(old_path, None)
+        if key is not None:
+            bucket = self.buckets[key]
+            bucket[bucket.index(old_path)] = new_path
+            self.keys[new_path] = key
+        if old_path in self.similar:
+            self.similar[new_path] = self.similar.pop(old_path)
+            self.thumbnails.replace(self.similar[new_path][0], old_path, new_path)
+
+    def forget(self, path):
+        """
+        Remove file from index and from db, e.g. when it is going to be deleted or renamed
+        """
+        path = os.path.abspath(path)
+        self.records.pop(path, None)
+        self._unindex(path)
+        if path in self.db:
+            del self.db[path]
+        if path in self.similar:
+            self.thumbnails.remove(self.similar.pop(path)[0], path)
@@ -0,0 +1,90 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+# Cache of exif tags that is stored in SQLite database in db folder between runs.
+# Every record is bound to path, size and modification time of file, so if file has not been changed since
+# the last run, its tags are taken from cache and file is not even opened.
+# Files without exif are stored as well (with empty set of tags).
+
+import json
+import os
+import sqlite3
+
+import fast_exif
+
+COMMIT_EVERY = 500  # how many new records to keep in transaction before writing them to disk
+
+
+class ExifCache:
+    def __init__(self, path_to_db=os.path.join('db', 'exif_cache.sqlite')):
+        """
+        :param path_to_db: path to SQLite file with cache
+        """
+        if not os.path.exists(os.path.dirname(path_to_db)):
+            os.mkdir(os.path.dirname(path_to_db))
+        self.connection = sqlite3.connect(path_to_db)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS exif ('
+                                'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, tags TEXT)')
+        self.hits = 0
+        self.misses = 0
+        self.not_committed = 0
+
+    def get(self, path, stat=None):
+        """
+        Get tags of file if file has not been changed since they were cached
+
+        :param path: path to file
+        :param stat: result of os.stat for this file if it is already known
+        :return: dict with tags (empty if there is no exif in file) or None if there is nothing in cache
+        """
+        stat = stat or os.stat(path)
+        row = self.connection.execute('SELECT size, mtime_ns, tags FROM exif WHERE path = ?',
+                                      (os.path.abspath(path),)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            self.hits += 1
+            return json.loads(row[2])
+        self.misses += 1
+        return None
+
+    def put(self, path, tags, stat=None):
+        """
+        Save tags of file in cache. Only tags that are used for renaming are saved.
+
+        :param path: path to file
+        :param tags: dict with tags from exifread or fast_exif
+        :param stat: result of os.stat for this file if it is already known
+        """
+        stat = stat or os.stat(path)
+        tags = {name: str(tags[name]) for name in fast_exif.RENAMER_TAGS if name in tags}
+        self.connection.execute('INSERT OR REPLACE INTO exif VALUES (?, ?, ?, ?)',
+                                (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, json.dumps(tags)))
+        self.not_committed += 1
+        if self.not_committed >= COMMIT_EVERY:
+            self.connection.commit()
+            self.not_committed = 0
+
+    def flush(self):
+        """
+        Write records that are kept in transaction to disk, so other processes can see them
+        """
+        self.connection.commit()
+        self.not_committed = 0
+
+    def moved(self, old_path, new_path):
+        """
+        Keep cached tags of file after it was renamed (renaming doesn't change modification time)
+        """
+        self.connection.execute('UPDATE OR REPLACE exif SET path = ? WHERE path = ?',
+                                (os.path.abspath(new_path), os.path.abspath(old_path)))
+
+    def stats(self):
+        """
+        :return: string with number of hits and misses of cache
+        """
+        total = self.hits + self.misses
+        return 'Exif cache: {} hits, {} misses ({:.1f}% hit rate)'.format(
+            self.hits, self.misses, 100 * self.hits / total if total else 0)
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,83 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+# Reads EXIF of many files in the background with a pool of threads or processes.
+# While photo_renamer picks up a name for one photo (and maybe asks user something),
+# the next photos are already being opened and parsed.
+# Results are given back strictly in the same order as paths were given.
+
+import collections
+import concurrent.futures
+
+import fast_exif
+
+WORKERS = 4  # how many files are parsed at the same time
+PREFETCH = 4  # how many files per worker can be parsed ahead of the one that is being processed now
+
+
+def read_tags(path_to_image):
+    """
+    Open file and extract exif from it
+
+    :param path_to_image: full path to image
+    :return: dict with exif tags (it is empty if there is no exif in file)
+    """
+    import exifread  # it takes a while to import, so it is imported only when it is used
+
+    with open(path_to_image, 'rb') as f:
+        # 'details=False' to avoid extracting superfluous data from EXIF and overflowing memory
+        return exifread.process_file(f, details=False)
+
+
+def read_tags_counted(path_to_image):
+    """
+    The same as read_tags, but also tells how many bytes were read from file
+
+    :return: tuple (dict with exif tags, number of bytes read)
+    """
+    import exifread
+
+    with open(path_to_image, 'rb') as raw_file:
+        f = fast_exif.CountingFile(raw_file)
+        return exifread.process_file(f, details=False), f.bytes_read
+
+
+# Functions that can be used to read exif: exifread parses every tag, fast one reads only tags
+# that are needed for renaming and uses exifread only for unusual files
+READERS = {'exifread': read_tags, 'fast': fast_exif.read_tags}
+# The same readers that give back tuples (tags, bytes read from file), bytes are counted in report of run
+COUNTING_READERS = {'exifread': read_tags_counted, 'fast': fast_exif.read_tags_counted}
+
+
+def iter_tags(paths, workers=WORKERS, use_processes=False, reader=read_tags):
+    """
+    Parse exif of files in parallel
+
+    :param paths: iterable with full paths to images
+    :param workers: size of pool, if it is 1 or less files are parsed one by one in the current thread
+    :param use_processes: use pool of processes instead of threads (useful when parsing itself is a bottleneck,
+    threads are enough when most of the time is spent waiting for disk or network)
+    :param reader: function that takes path and returns tags, it must be picklable if processes are used
+    :return: generator of tuples (path, tags) in the same order as paths
+    """
+    if workers <= 1:
+        for path in paths:
+            yield path, reader(path)
+        return
+
+    pool_class = concurrent.futures.ProcessPoolExecutor if use_processes else concurrent.futures.ThreadPoolExecutor
+    paths = iter(paths)
+    queue = collections.deque()
+    with pool_class(max_workers=workers) as pool:
+        # Keep limited number of files in flight to not read the whole folder into memory in advance
+        for path in paths:
+            queue.append((path, pool.submit(reader, path)))
+            if len(queue) >= workers * PREFETCH:
+                break
+
+        while queue:
+            path, future = queue.popleft()
+            next_path = next(paths, None)
+            if next_path is not None:
+                queue.append((next_path, pool.submit(reader, next_path)))
+            yield path, future.result()
@@ -0,0 +1,237 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+# Fast reader of those few EXIF tags that photo_renamer actually uses.
+# Instead of parsing every tag with exifread it reads only APP1 segment of JPEG (usually it is within
+# first HEAD_SIZE bytes of file) and decodes only entries from RENAMER_TAGS.
+# If file looks unusual in any way (it is not JPEG, tags have unexpected type, offsets are broken etc.),
+# it falls back to exifread, so result is always the same as exifread would give.
+# find_tiff() that takes EXIF out of JPEG is used by thumbnail_hash.py as well.
+#
+# Run this file to compare speed of both readers on your folder with photos:
+# python fast_exif.py path/to/folder
+
+import os
+import struct
+import sys
+import time
+
+HEAD_SIZE = 64 * 1024  # how far from the beginning of file to look for APP1 segment
+FIRST_READ = 4 * 1024  # how many bytes to read at once at first, the rest is read only if it is needed
+
+# Tags that photo_renamer needs: (IFD, tag id) -> name of tag like exifread names it
+IFD0_TAGS = {0x010F: 'Image Make', 0x0110: 'Image Model', 0x0132: 'Image DateTime'}
+EXIF_IFD_TAGS = {0x9003: 'EXIF DateTimeOriginal', 0x9004: 'EXIF DateTimeDigitized',
+                 0xA433: 'EXIF LensMake', 0xA434: 'EXIF LensModel'}
+RENAMER_TAGS = tuple(IFD0_TAGS.values()) + tuple(EXIF_IFD_TAGS.values())
+EXIF_IFD_POINTER = 0x8769
+ASCII_TYPE = 2
+
+# Markers of JPEG that don't have length after them
+STANDALONE_MARKERS = {0x01} | set(range(0xD0, 0xD8))
+
+
+class UnusualFile(Exception):
+    """
+    Raised when file can't be parsed by fast reader and has to be parsed by exifread
+    """
+
+
+def read_tags(path_to_image):
+    """
+    Extract tags that are used for renaming from file
+
+    :param path_to_image: full path to image
+    :return: dict where keys are names of tags like exifread names them and values are strings
+    (it is empty if there is no exif in file)
+    """
+    with open(path_to_image, 'rb') as f:
+        return read_tags_from_file(f)
+
+
+def read_tags_counted(path_to_image):
+    """
+    The same as read_tags, but also tells how many bytes were read from file
+
+    :param path_to_image: full path to image
+    :return: tuple (dict with tags, number of bytes read)
+    """
+    with open(path_to_image, 'rb') as raw_file:
+        f = CountingFile(raw_file)
+        return read_tags_from_file(f), f.bytes_read
+
+
+def read_tags_from_file(f):
+    """
+    The same as read_tags, but takes file opened in binary mode
+    """
+    try:
+        tiff = find_tiff(f)
+        if tiff is None:
+            return {}
+        return _parse_tiff(tiff)
+    except (UnusualFile, struct.error, UnicodeDecodeError):
+        f.seek(0)
+        return read_tags_with_exifread(f)
+
+
+def find_tiff(f):
+    """
+    Walk through segments of JPEG till APP1 segment with EXIF
+
+    :param f: file opened in binary mode
+    :return: bytes with TIFF structure from APP1 segment or None if JPEG has no EXIF
+    """
+    head = f.read(FIRST_READ)
+    if head[:2] != b'\xff\xd8':
+        raise UnusualFile('It is not JPEG')
+
+    position = 2
+    while True:
+        if position + 4 > HEAD_SIZE:
+            raise UnusualFile('There is no APP1 segment in the head of file')
+        if position + 4 > len(head):
+            head += f.read(max(position + 4 - len(head), FIRST_READ))
+            if position + 4 > len(head):
+                raise UnusualFile('File is truncated')
+        if head[position] != 0xFF:
+            raise UnusualFile('Broken JPEG marker')
+        marker = head[position + 1]
+        if marker == 0xFF:  # fill byte
+            position += 1
+            continue
+        if marker in STANDALONE_MARKERS:
+            position += 2
+            continue
+        if marker in (0xDA, 0xD9):  # image data has started, there is no exif in this file
+            return None
+
+        length = struct.unpack('>H', head[position + 2:position + 4])[0]
+        segment_start = position + 4
+        segment_end = position + 2 + length
+        if marker == 0xE1 and len(head) < segment_start + 6:
+            head += f.read(max(segment_start + 6 - len(head), FIRST_READ))
+        if marker == 0xE1 and head[segment_start:segment_start + 6] == b'Exif\x00\x00':
+            if segment_end > len(head):  # segment is larger than what was read, read the rest of it
+                head += f.read(segment_end - len(head))
+            return head[segment_start + 6:segment_end]
+        position = segment_end
+
+
+def _parse_tiff(tiff):
+    byte_order = tiff[:2]
+    if byte_order == b'II':
+        endian = '<'
+    elif byte_order == b'MM':
+        endian = '>'
+    else:
+        raise UnusualFile('Unknown byte order')
+    if struct.unpack(endian + 'H', tiff[2:4])[0] != 42:
+        raise UnusualFile('Wrong TIFF header')
+
+    tags = {}
+    ifd0 = struct.unpack(endian + 'I', tiff[4:8])[0]
+    exif_ifd = _read_ifd(tiff, ifd0, endian, IFD0_TAGS, tags)
+    if exif_ifd:
+        _read_ifd(tiff, exif_ifd, endian, EXIF_IFD_TAGS, tags)
+    return tags
+
+
+def _read_ifd(tiff, offset, endian, wanted_tags, tags):
+    """
+    Decode wanted ASCII entries of one IFD and put them into tags
+
+    :return: offset of EXIF sub IFD if there is pointer to it in this IFD, otherwise None
+    """
+    if offset + 2 > len(tiff):
+        raise UnusualFile('IFD is out of EXIF segment')
+    entries = struct.unpack(endian + 'H', tiff[offset:offset + 2])[0]
+    if offset + 2 + entries * 12 > len(tiff):
+        raise UnusualFile('IFD is out of EXIF segment')
+
+    exif_ifd = None
+    for i in range(entries):
+        entry = offset + 2 + i * 12
+        tag, field_type, count = struct.unpack(endian + 'HHI', tiff[entry:entry + 8])
+        if tag == EXIF_IFD_POINTER:
+            exif_ifd = struct.unpack(endian + 'I', tiff[entry + 8:entry + 12])[0]
+            continue
+        if tag not in wanted_tags:
+            continue
+        if field_type != ASCII_TYPE:
+            raise UnusualFile('Tag has unexpected type')
+
+        if count <= 4:
+            value = tiff[entry + 8:entry + 8 + count]
+        else:
+            value_offset = struct.unpack(endian + 'I', tiff[entry + 8:entry + 12])[0]
+            if value_offset + count > len(tiff):
+                raise UnusualFile('Value of tag is out of EXIF segment')
+            value = tiff[value_offset:value_offset + count]
+        # Drop any garbage after a null like exifread does
+        tags[wanted_tags[tag]] = value.split(b'\x00', 1)[0].decode('utf-8')
+    return exif_ifd
+
+
+def read_tags_with_exifread(f):
+    """
+    The same as read_tags_from_file, but always uses exifread
+    """
+    import exifread  # it takes a while to import and it is seldom needed
+
+    tags = exifread.process_file(f, details=False)
+    return {name: str(tags[name]) for name in RENAMER_TAGS if name in tags}
+
+
+class CountingFile:
+    """
+    Wrapper for file object that counts how many bytes were read from it
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+
+def benchmark(folder):
+    """
+    Read all jpg files in folder with both readers and print how much time and bytes each of them spent
+
+    :param folder: path to folder with photos (subfolders are not included)
+    """
+    paths = [os.path.join(folder, filename) for filename in sorted(os.listdir(folder))
+             if filename.lower().endswith(('.jpg', '.jpeg'))]
+    results = {}
+
+    for name, reader in (('exifread', read_tags_with_exifread), ('fast', read_tags_from_file)):
+        results[name] = []
+        bytes_read = 0
+        start = time.perf_counter()
+        for path in paths:
+            with open(path, 'rb') as raw_file:
+                f = CountingFile(raw_file)
+                results[name].append(reader(f))
+                bytes_read += f.bytes_read
+        seconds = time.perf_counter() - start
+        print('{:>8}: {} files, {:.3f} s, {:.1f} KB read per file'.format(
+            name, len(paths), seconds, bytes_read / max(len(paths), 1) / 1024))
+
+    mismatches = [path for path, slow, fast in zip(paths, results['exifread'], results['fast']) if slow != fast]
+    print('{} files have different tags from fast reader and exifread'.format(len(mismatches)))
+    for path in mismatches:
+        print(path)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        benchmark(sys.argv[1])
+    else:
+        print('Usage: python fast_exif.py path/to/folder')
@@ -0,0 +1,106 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+# Moves files to another file system, where they can't be just renamed.
+# Contents of file are copied by kernel without passing them through the script: with copy_file_range
+# (it can even share blocks on file systems that support it), or with sendfile if file systems don't let
+# copy_file_range work between them, and only on other systems by reading and writing chunks.
+# Copy is written under temporary name next to its destination, compared with the original, gets modification
+# time of the original and only then takes its name (without replacing existing file), after that
+# the original is removed. So if script is killed in the middle, the original is never lost.
+
+import errno
+import os
+
+import compare_files
+import rename_journal
+
+CHUNK_SIZE = 1024 * 1024  # how many bytes to copy with one call when file is read and written by script
+PART_SUFFIX = '.part'  # temporary name of copy that hasn't been checked yet
+# Errors which mean that this way of copying doesn't work for these files, not that copying failed
+UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP}
+
+
+def same_device(path, folder):
+    """
+    :param path: path to file or folder
+    :param folder: path to existing folder
+    :return: True if file can be renamed into folder, i.e. both are on the same file system
+    """
+    return os.stat(path).st_dev == os.stat(folder).st_dev
+
+
+def _copy_file_range(src_fd, dst_fd, offset, count):
+    return os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+
+
+def _sendfile(src_fd, dst_fd, offset, count):
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    return os.sendfile(dst_fd, src_fd, offset, count)
+
+
+def _read_write(src_fd, dst_fd, offset, count):
+    os.lseek(src_fd, offset, os.SEEK_SET)
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    data = os.read(src_fd, min(count, CHUNK_SIZE))
+    return os.write(dst_fd, data)
+
+
+def copy_contents(src_fd, dst_fd, size):
+    """
+    Copy contents of one file to another, by kernel if it is possible
+
+    :param src_fd: descriptor of file opened for reading
+    :param dst_fd: descriptor of file opened for writing
+    :param size: how many bytes to copy
+    """
+    ways = [_copy_file_range] if hasattr(os, 'copy_file_range') else []
+    if hasattr(os, 'sendfile') and os.name != 'nt':
+        ways.append(_sendfile)
+    ways.append(_read_write)
+
+    offset = 0
+    copy = ways.pop(0)
+    while offset < size:
+        try:
+            copied = copy(src_fd, dst_fd, offset, size - offset)
+        except OSError as e:
+            if e.errno not in UNSUPPORTED or not ways:
+                raise
+            copied = 0
+        if copied == 0:  # this way doesn't work here, the next one goes on from the same place
+            if not ways:
+                raise OSError(errno.EIO, 'File is shorter than expected')
+            copy = ways.pop(0)
+        offset += copied
+
+
+def move_across_devices(src, dst, comparator=None):
+    """
+    Move file to another file system, never replacing existing file
+
+    :param src: path to file
+    :param dst: new path to file
+    :param comparator: FileComparator object to check copy with
+    :raise FileExistsError: if dst already exists
+    :raise OSError: if file can't be copied or copy differs from the original, the original is kept then
+    """
+    comparator = comparator or compare_files.FileComparator()
+    if os.path.lexists(dst):  # to not copy the whole file in vain, it is checked once again at the end anyway
+        raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), dst)
+
+    part = dst + PART_SUFFIX
+    try:
+        with open(src, 'rb') as f_src, open(part, 'wb') as f_dst:
+            copy_contents(f_src.fileno(), f_dst.fileno(), os.fstat(f_src.fileno()).st_size)
+            os.fsync(f_dst.fileno())
+        if not comparator.same(src, part):
+            raise OSError(errno.EIO, 'Copy differs from the original', src, None, part)
+        stat = os.stat(src)
+        os.utime(part, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        rename_journal.move_no_replace(part, dst)
+    except BaseException:
+        if os.path.lexists(part):
+            os.unlink(part)
+        raise
+    os.unlink(src)
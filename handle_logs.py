@@ -16,105 +16,333 @@
 # or
 # logFile.info('User went crazy!')
 
-# This module can also clean up log folder when it is too large
-# Put in your script 'handle_logs.clean_log_folder(size, logFile, logConsole)'
+# This module can also clean up log folder when it is too large or logs are too old
+# Put in your script 'handle_logs.rotate_logs(size, logFile, days)'
 # where size is integer that represents maximum size in megabytes that
-# triggers removing the oldest log files
-# and where logFile and logConsole are names of loggers
+# triggers removing the oldest log files, days is maximum age of logs (None to keep them while there is room)
+# and where logFile is name of logger
+# Logs of previous runs are compressed with gzip. Folder keeps index of logs (log/index.json), so neither
+# folder has to be listed nor names of files parsed to find the oldest one.
+#
+# Loggers can also be set so they don't slow down the script:
+# logFile, logConsole = handle_logs.set_loggers(level=logging.INFO, use_queue=True)
+# level - messages below it are dropped before their text is even put together (use
+# logFile.debug('Name is %s', name) instead of logFile.debug('Name is ' + name) for that)
+# use_queue - messages are put in a queue and written to file by a separate thread
+# json_lines - write every message to file as a line of JSON instead of plain text
+#
+# Worker processes can write to the same log: call 'messages = handle_logs.share_with_processes(logFile)'
+# before they are started and 'handle_logs.log_to_queue(logFile, messages)' in every one of them
 
+import atexit
+import gzip
+import json
 import logging
 import os
+import queue
+import shutil
 import time
-import send2trash
-from datetime import datetime
-import re
 
+LOG_FOLDER = 'log'
+INDEX_NAME = 'index.json'
+# Names of verbosity levels for command line
+VERBOSITY = {'quiet': logging.WARNING, 'normal': logging.INFO, 'verbose': logging.DEBUG}
+
+_listener = None  # thread that writes messages from queue to file
+_file_handler = None
+_store = None  # LogStore with log of this run
+
+
+class LogStore:
+    """
+    Folder with logs and index of them from the oldest to the newest
+    """
+
+    def __init__(self, folder=LOG_FOLDER):
+        self.folder = os.path.abspath(folder)  # script can change working folder meanwhile
+        self.index_path = os.path.join(self.folder, INDEX_NAME)
+        os.makedirs(folder, exist_ok=True)
+        self.current = None  # name of log of this run
+        self.logs = self._load()  # list of dicts: name, size, time of creation, closed (log is not written anymore)
+
+    def _load(self):
+        # Index is read again before every change, because other runs of script can change it meanwhile
+        try:
+            with open(self.index_path, encoding='utf8') as f:
+                return json.load(f)['logs']
+        except (OSError, ValueError, KeyError):
+            return self._rebuild()
+
+    def _rebuild(self):
+        # There is no index yet (or it is broken), so take every file in folder once, whatever its name is
+        logs = []
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name != INDEX_NAME and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    logs.append({'name': entry.name, 'size': stat.st_size, 'time': stat.st_mtime, 'closed': True})
+        logs.sort(key=lambda log: log['time'])
+        return logs
+
+    def _save(self):
+        temp_path = '{}.{}.tmp'.format(self.index_path, os.getpid())
+        with open(temp_path, 'w', encoding='utf8') as f:
+            json.dump({'logs': self.logs}, f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, self.index_path)
+
+    def new_log(self):
+        """
+        Pick name for log of this run and add it to index
+
+        :return: path to new log file
+        """
+        self.logs = self._load()
+        # create new log every time when script starts instead of writing in the same file
+        # if log file with this date already exists, make new one with (i) in the name
+        timestr = time.strftime('%Y-%m-%d__%Hh%Mm')
+        name = 'log_' + timestr + '.txt'
+        i = 2
+        while os.path.exists(os.path.join(self.folder, name)) or os.path.exists(os.path.join(self.folder,
+                                                                                             name + '.gz')):
+            name = 'log_' + timestr + '(' + str(i) + ').txt'
+            i += 1
+        open(os.path.join(self.folder, name), 'a').close()
+        self.current = name
+        self.logs.append({'name': name, 'size': 0, 'time': time.time(), 'closed': False})
+        self._save()
+        return os.path.join(self.folder, name)
+
+    def close_log(self):
+        """
+        Remember that log of this run is finished, so it can be compressed next time
+        """
+        self.logs = self._load()
+        for log in self.logs:
+            if log['name'] == self.current:
+                log['closed'] = True
+                try:
+                    log['size'] = os.path.getsize(os.path.join(self.folder, log['name']))
+                except OSError:
+                    pass
+        self._save()
+
+    def _compress(self, log):
+        path = os.path.join(self.folder, log['name'])
+        with open(path, 'rb') as src, gzip.open(path + '.gz', 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(path)
+        log['name'] += '.gz'
+        log['size'] = os.path.getsize(path + '.gz')
+
+    def rotate(self, max_size, max_age_days=None):
+        """
+        Compress finished logs and remove the oldest ones till logs take no more than max_size
+
+        :param max_size: maximum size of all logs in bytes
+        :param max_age_days: logs older than this number of days are removed, None to keep them
+        :return: names of removed logs
+        """
+        self.logs = self._load()
+        kept = []
+        for log in self.logs:
+            if log['closed'] and not log['name'].endswith('.gz') and log['name'] != self.current:
+                try:
+                    self._compress(log)
+                except FileNotFoundError:  # it was removed by hand
+                    continue
+            kept.append(log)
+
+        removed = []
+        total_size = sum(log['size'] for log in kept)
+        oldest_time = time.time() - max_age_days * 24 * 3600 if max_age_days else None
+        self.logs = []
+        # Logs are in index from the oldest to the newest, so the oldest ones are removed first
+        for log in kept:
+            too_much = total_size > max_size or (oldest_time and log['time'] < oldest_time)
+            if not too_much or log['name'] == self.current:
+                self.logs.append(log)
+                continue
+            try:
+                os.remove(os.path.join(self.folder, log['name']))
+            except FileNotFoundError:
+                pass
+            total_size -= log['size']
+            removed.append(log['name'])
+        self.total_size = total_size
+        self._save()
+        return removed
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats message as one line of JSON
+    """
+
+    def format(self, record):
+        entry = {'time': self.formatTime(record), 'level': record.levelname, 'line': record.lineno,
+                 'message': record.getMessage()}
+        if record.exc_info:
+            record.exc_text = record.exc_text or self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _ThreadQueueHandler(logging.Handler):
+    """
+    Puts records in queue that is read by a thread of the same process, so record doesn't have to be turned into
+    a string here like logging.handlers.QueueHandler does: text of message is put together by that thread instead
+    of the one that logs
+    """
+
+    def __init__(self, messages):
+        super().__init__()
+        self.queue = messages
+
+    def emit(self, record):
+        try:
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+            self.queue.put_nowait(record)
+        except Exception:
+            self.handleError(record)
+
+
+def _make_formatter(json_lines):
+    if json_lines:
+        return JsonFormatter()
+    return logging.Formatter('%(levelname)s %(asctime)s line %(lineno)s: %(message)s')
+
+
+def set_loggers(level=logging.DEBUG, use_queue=False, json_lines=False):
+    """
+    :param level: messages below this level are neither logged to file nor printed
+    :param use_queue: write messages to file in a separate thread
+    :param json_lines: write messages as lines of JSON
+    :return: tuple (logger to file, logger to console)
+    """
+    global _listener, _file_handler, _store
+    import logging.handlers  # it is imported only here, because it takes a while and loggers are set just once
 
-def set_loggers():
     log_file = logging.getLogger('fs1')  # create logger for this specific module for logging to file
 
-    log_file.setLevel(logging.DEBUG)  # set level of messages to be logged to file
+    log_file.setLevel(level)  # set level of messages to be logged to file
 
     log_console = logging.getLogger('fs2')
-    log_console.setLevel(logging.DEBUG)
+    log_console.setLevel(level)  # the same level, so verbosity that user has chosen is kept on console too
 
     # define format of logging messages
     formatter = logging.Formatter('%(levelname)s %(asctime)s line %(lineno)s: %(message)s')
 
-    timestr = time.strftime('%Y-%m-%d__%Hh%Mm')
-    new_log_name = os.path.join('log', 'log_' + timestr + '.txt')
-
-    if os.path.exists('.\log'):  # create new log every time when script starts instead of writing in the same file
-        if os.path.exists(new_log_name): # if log file with this date already exists, make new one with (i) in the name
-            i = 2
-            while os.path.exists(os.path.join('log', 'log_' + timestr + '(' + str(i) + ').txt')):
-                i += 1
-                continue
-            file_handler = logging.FileHandler(os.path.join('log', 'log_' + timestr + '(' +
-                                                            str(i) + ').txt'), encoding='utf8')
-        else:
-            file_handler = logging.FileHandler(new_log_name, encoding='utf8')
-    else:
-        os.mkdir('.\log')
-        file_handler = logging.FileHandler(new_log_name, encoding='utf8')
+    _store = LogStore()
+    file_handler = logging.FileHandler(_store.new_log(), encoding='utf8')
 
     # set format to both handlers
     stream_handler = logging.StreamHandler()
     stream_handler.setFormatter(formatter)
-    file_handler.setFormatter(formatter)
+    file_handler.setFormatter(_make_formatter(json_lines))
+    _file_handler = file_handler
 
     # apply handler to this module (folderSync.py)
-    log_file.addHandler(file_handler)
+    if use_queue:
+        messages = queue.SimpleQueue()
+        log_file.addHandler(_ThreadQueueHandler(messages))
+        _listener = logging.handlers.QueueListener(messages, file_handler)
+        _listener.start()
+    else:
+        log_file.addHandler(file_handler)
+    atexit.register(stop_loggers)  # write everything that is left in queue and close log before script exits
     log_console.addHandler(stream_handler)
 
     return log_file, log_console
 
 
-def clean_log_folder(max_size, log_file, log_console):
-    # Remove oldest log files from log folder when size of folder is more than max_size.
-
-    # Script take creation time of file not from its properties (get.cwd()),
-    # but from it's name, because you cannot rely on properties in case if log file was copied by
-    # for example Yandex.Disk, because then creation time is time of copying this file from another machine
-
-    logfile_list = []
-
-    def check_logs_size():  # count size of all already existing logs and create a list of them
-        nonlocal logfile_list
-        total_size = 0
-
-        for root, subfolders, logfiles in os.walk('log'):  # Get name and creation time of every logfile
-            for logfile in logfiles:
-                # Get date and time as a string from file name
-                date_from_filename = re.search(r'(\d{4}-\d{2}-\d{2}__\d{2}h\d{2}m)', logfile).group()
-                # Covert string with date and time to timestamp
-                creation_time = time.mktime(datetime.strptime(date_from_filename, '%Y-%m-%d__%Hh%Mm').timetuple())
-                # creation_time = time.mktime(creation_time.timetuple())
-                path_to_logfile = os.path.join(root, logfile)
-                size_of_log = os.path.getsize(path_to_logfile)
-                logfile_list.append([path_to_logfile, creation_time, size_of_log])
-                total_size += size_of_log
-
-        log_file.info('There is {0:.02f} MB of logs.\n'.format(total_size / 1024**2))
-        return total_size
-
-    total_log_size = check_logs_size()
-
-    while total_log_size > max_size * 1024**2:
-        # if log files weighs more than max_size in megabytes - recursively remove oldest one one by one
-        logfile_to_delete = ''
-        oldest = time.time()
-
-        # recursively check all log files to find out the oldest one
-        for index, val in enumerate(logfile_list):  # enumerate to extract not only values, but their indexes also
-            if val[1] < oldest:  # if file older than previous one
-                oldest = val[1]
-                logfile_to_delete = val[0]
-                index_to_remove = index
-        log_file.info('Removing old log file: ' + logfile_to_delete + ', ' +
-                      str(datetime.fromtimestamp(oldest)))
-
-        send2trash.send2trash(logfile_to_delete)
-        # remove item from from list and subtract it's size from total size
-        total_log_size -= logfile_list[index_to_remove][2]
-        logfile_list.pop(index_to_remove)
+def configure(log_file, level=None, json_lines=None, log_console=None):
+    """
+    Change level of loggers or format of log file after loggers were set
+
+    :param log_file: logger to file from set_loggers
+    :param level: new level or None to keep it
+    :param json_lines: True or False to switch format of log file or None to keep it
+    :param log_console: logger to console from set_loggers to change level of as well
+    """
+    if level is not None:
+        log_file.setLevel(level)
+        if log_console is not None:
+            log_console.setLevel(level)
+    if json_lines is not None and _file_handler is not None:
+        _file_handler.setFormatter(_make_formatter(json_lines))
+
+
+def share_with_processes(log_file):
+    """
+    Take messages for log file from a queue that other processes can write to as well instead of the queue
+    of this process only. Loggers must be set with use_queue=True.
+
+    :param log_file: logger to file from set_loggers
+    :return: multiprocessing queue to give to log_to_queue in other processes
+    """
+    global _listener
+    import logging.handlers
+    import multiprocessing
+
+    messages = multiprocessing.Queue()
+    if _listener is not None:
+        _listener.stop()
+    for handler in list(log_file.handlers):
+        if isinstance(handler, (_ThreadQueueHandler, logging.handlers.QueueHandler)) or handler is _file_handler:
+            log_file.removeHandler(handler)
+    # Records go to another process, so their text is put together before they are sent
+    log_file.addHandler(logging.handlers.QueueHandler(messages))
+    # There is no file handler if loggers were never set, e.g. when script is used as a module
+    _listener = logging.handlers.QueueListener(messages, *[handler for handler in [_file_handler] if handler])
+    _listener.start()
+    # Handlers run in reverse order at exit, so queue is read to the end before multiprocessing closes it
+    atexit.register(stop_loggers)
+    return messages
+
+
+def log_to_queue(log_file, messages):
+    """
+    Send messages of logger to process that has called share_with_processes instead of writing them here
+
+    :param log_file: logger to file
+    :param messages: queue from share_with_processes
+    """
+    import logging.handlers
+
+    for handler in list(log_file.handlers):
+        log_file.removeHandler(handler)
+    log_file.addHandler(logging.handlers.QueueHandler(messages))
+
+
+def stop_loggers():
+    """
+    Wait till all messages from queue are written to file
+    """
+    global _listener, _file_handler
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _file_handler is not None:
+        logging.getLogger('fs1').removeHandler(_file_handler)
+        _file_handler.close()
+        _file_handler = None
+        _store.close_log()
+
+
+def rotate_logs(max_size, log_file, max_age_days=None):
+    """
+    Remove the oldest log files from log folder when size of folder is more than max_size
+    or when they are older than max_age_days, logs of previous runs are compressed
+
+    :param max_size: size in megabytes
+    :param log_file: logger to file from set_loggers
+    :param max_age_days: number of days or None
+    """
+    store = _store or LogStore()
+    removed = store.rotate(max_size * 1024**2, max_age_days)
+    for name in removed:
+        log_file.info('Removing old log file: ' + name)
+    log_file.info('There is {0:.02f} MB of logs.\n'.format(store.total_size / 1024**2))
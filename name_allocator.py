@@ -0,0 +1,121 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+# Keeps track of names in one folder: names of files that already exist there and new names
+# that have been picked up for photos during this session.
+#
+# Folder is listed only once, after that checking whether file with some name exists is just a lookup in set
+# (case-insensitive, like on Windows and most network shares) and doesn't cost a request to disk.
+# For every name it also remembers from which order number ("name[3]") to start looking for a free one,
+# so series of photos taken during the same second don't make script check the same names again and again.
+#
+# Folders can have million of files (e.g. backups of phones), so only names of files are kept for every photo
+# and path of folder is stored once for all of them.
+
+import os
+
+
+class PhotoRecord:
+    """
+    Photo and new name that has been picked up for it. It can be used as list [full path to photo, new name].
+    """
+    __slots__ = ('folder', 'filename', 'new_name')
+
+    def __init__(self, folder, filename, new_name):
+        """
+        :param folder: path to folder, the same string object is shared by all photos of folder
+        :param filename: current name of file
+        :param new_name: new name of file without extension
+        """
+        self.folder = folder
+        self.filename = filename
+        self.new_name = new_name
+
+    @property
+    def path(self):
+        return os.path.join(self.folder, self.filename)
+
+    @property
+    def new_path(self):
+        return os.path.join(self.folder, self.new_name + '.jpg')
+
+    def __getitem__(self, index):
+        return (self.path, self.new_name)[index]
+
+    def __len__(self):
+        return 2
+
+    def __repr__(self):
+        return 'PhotoRecord({!r}, {!r}, {!r})'.format(self.folder, self.filename, self.new_name)
+
+
+class NameAllocator(dict):
+    """
+    Dict where key is a new name of photo (without extension) and value is a full path to this photo
+    (only name of file is stored, path is put together when it is asked for).
+    Besides that it knows which files exist in the folder.
+    """
+
+    def __init__(self, folder, extension='.jpg', listing=None):
+        """
+        :param folder: path to folder
+        :param extension: extension that is added to new names of files
+        :param listing: names of all entries of folder if it has been already listed
+        """
+        super().__init__()
+        self.folder = folder
+        self.extension = extension
+        # names of files in folder in the same order os gives them
+        self.listing = os.listdir(folder) if listing is None else listing
+        self.existing = {}  # lowercase file name -> file name as it is in folder
+        for filename in self.listing:
+            self.existing.setdefault(filename.lower(), filename)
+        # (base name, True for names on disk or False for picked up names) -> order number from which
+        # all names up to the first free one are known to be taken
+        self.free_counters = {}
+
+    def __setitem__(self, name, path):
+        super().__setitem__(name, os.path.basename(path))
+
+    def pick(self, name, filename):
+        """
+        Remember that name has been picked up for file
+        :param name: new name without extension
+        :param filename: current name of file in this folder
+        """
+        super().__setitem__(name, filename)
+
+    def __getitem__(self, name):
+        return os.path.join(self.folder, super().__getitem__(name))
+
+    def exists(self, name):
+        """
+        :param name: name of file without extension
+        :return: True if file with this name was in folder when it was listed
+        """
+        return (name + self.extension).lower() in self.existing
+
+    def existing_path(self, name):
+        """
+        :param name: name of file without extension
+        :return: full path to file with this name as it is written on disk
+        """
+        return os.path.join(self.folder, self.existing[(name + self.extension).lower()])
+
+    def next_free_counter(self, name, counter=2, on_disk=False):
+        """
+        Find the first order number starting from counter for which name "name[number]" is free
+
+        :param name: name without order number and extension
+        :param counter: order number to start from
+        :param on_disk: look for name that doesn't exist in folder instead of name that hasn't been picked up
+        :return: order number
+        """
+        is_taken = self.exists if on_disk else self.__contains__
+        known_free = self.free_counters.get((name, on_disk), 2)
+        start = max(counter, known_free) if counter >= 2 else counter
+        while is_taken(name + '[{}]'.format(start)):
+            start += 1
+        if 2 <= counter <= known_free:  # all numbers from 2 to start are taken, remember it for the next time
+            self.free_counters[(name, on_disk)] = start
+        return start
@@ -20,446 +20,456 @@ with this mark then.
 It was tested under Windows 10 64 bit and Ubuntu 16.04 with Python 3.6
 """
 
+import concurrent.futures
+import json
+import logging
 import os
-import shelve
-import re
-import exifread  # library to get exif data from file
+import exif_pipeline  # reads exif of files in background while names are being picked up
+import exif_cache  # keeps exif of files between runs
+import tag_aliases  # names to use instead of names of cameras and lenses from exif
 import handle_logs  # a separate file for setting up logging to console and log file
+import duplicate_index  # library-wide index of file contents to find copies of photos
+import name_allocator  # keeps track of names in one folder
+import dir_manifest  # remembers folders that were processed to skip them next time
+import rename_journal  # renames files in bulk and remembers what was renamed
+import disposal  # ways to get rid of copies: trash bin, quarantine folder or deleting for good
+import run_stats  # counts calls and time of every stage of script
+import tree_walker  # lists every folder once and picks out photos by their names
+import rename_plan  # plan of renames and removals that can be applied later
+import thumbnail_hash  # perceptual hashes of EXIF thumbnails to find resized copies of photos
+import renamer_engine  # picks up new names and finds copies without asking or printing anything
 import time
-from datetime import datetime
-from send2trash import send2trash
 
-# setting up loggers
-logFile, logConsole = handle_logs.set_loggers()
-handle_logs.clean_log_folder(20, logFile, logConsole)
-logFile.info('Program has started')
+LOG_MAX_SIZE = 20  # megabytes of logs to keep
+LOG_MAX_AGE_DAYS = 365
+
+# Loggers are set up by start_logging() when script is run, importing this module creates no files
+logFile, logConsole = logging.getLogger('fs1'), logging.getLogger('fs2')
+
+# How many files to parse in parallel and whether to use processes instead of threads for that
+EXIF_WORKERS = exif_pipeline.WORKERS
+EXIF_USE_PROCESSES = False
+# Which reader to use for exif: 'fast' or 'exifread' (see exif_pipeline.READERS)
+EXIF_READER = 'fast'
 
 images_to_delete = []  # list of superfluous copies to remove (really hard to make it local)
+copies = {}  # path of superfluous copy -> path of file with the same content that is kept
 unknown_camera = ''
+interactive = True  # in batch mode script never asks user anything while files are being processed
+UNKNOWN_CAMERA = 'Unknown camera'  # name for camera without brand in EXIF if user is not asked about it
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg')  # Files with only these extensions will be processed
+# How to get rid of copies: 'trash', 'quarantine' or 'delete' (see disposal.py)
+DISPOSAL = 'trash'
+QUARANTINE_FOLDER = None  # folder for 'quarantine', by default it is on the same disk as files (see disposal.py)
+# How many bits of 64-bit hashes of EXIF thumbnails can differ for photos to be considered copies of the same shot
+# (resized or recompressed ones), None means that only copies that are equal byte by byte are looked for
+NEAR_DUPLICATES = None
+# Photos that only look the same are never removed automatically, pairs of them are written to this file to review
+NEAR_DUPLICATES_REPORT = os.path.join('db', 'near_duplicates.jsonl')
+near_duplicates = []  # renamer_engine.Duplicate objects of smaller photos and larger ones that look the same
+ORGANIZE_BATCH = 500  # how many photos are moved to one folder of organize mode at once
+# Calls, time and bytes read of every stage, they are written to log (and to REPORT_PATH) at the end of run
+stats = run_stats.RunStats()
+REPORT_PATH = None
+# Messages below this level are not printed, in interactive mode everything is printed
+CONSOLE_LEVEL = logging.DEBUG
+
+
+def on_console(level):
+    """
+    :param level: level of message, e.g. logging.DEBUG for messages about every file
+    :return: True if message of this level has to be printed
+    """
+    return level >= CONSOLE_LEVEL
 
 
-def get_new_name_for_photo(exif, path_to_picture, original_filename, db, name_strings):
+def start_logging(level=logging.DEBUG, json_lines=False):
+    """
+    Set up loggers (messages are written to file by a separate thread) and remove old logs
 
+    :param level: messages below this level are not logged
+    :param json_lines: write log file as lines of JSON
     """
-    Takes exif info of one page, covert it to appropriate name by the template, check if there are some duplicates
+    handle_logs.set_loggers(level, use_queue=True, json_lines=json_lines)
+    handle_logs.rotate_logs(LOG_MAX_SIZE, logFile, LOG_MAX_AGE_DAYS)
+    logFile.info('Program has started')
 
-    :param original_filename: file name to compare with new name to avoid creating copies of the same file
-    :param exif: exif data from current file
-    :param path_to_picture: full path to picture
-    :param db: shelve object
-    :param name_strings: dict with strings how files are supposed to be renamed
-    :return: list where first item is path to picture and the second is string with new name for picture OR
-    returns -1 if file will not be renamed
+
+def ask_name_for_tag(tag, tag_type, db):
     """
-    global unknown_camera
+    Ask user whether to use name of camera or lens from EXIF or to give it a new name and save answer in database
 
-    def check_tag(tag, tag_type):
-        """
-        Function that compare name of camera and lens in database and in EXIF data.
-        If it is not in db, function asks user whether to use name from EXIF data or give tag a
-        new name to use it for renaming of photo. It will then store this new name in database to use it next time.
-
-        :param tag: name of component from EXIF
-        :param tag_type: tape of tag e.g. camera brand, camera model, lens brand, lens model
-        :return: name to use for renaming of file
-        """
-        def rename_and_save():
-            # nonlocal tag
-            nonlocal db_tag
-
-            while True:
-                user_answer = input('Do you want ' + tag_type + ' to be named ' + tag + '? y/n: ').lower()
-                logFile.info('Do you want ' + tag_type + ' to be named ' + tag + '? y/n: ' + user_answer)
-                if user_answer == 'y':
-                    # Is user wants to use exact name from EXIF — save it in db and return it for renaming
-                    db[tag] = tag
-                    return tag
-                elif user_answer == 'n':  # If user wants to use another name, let him key it in
-                    sure = 'n'
-                    while sure == 'n':
-                        db_tag = input('Please, type new name for ' + tag_type + ' instead of ' + tag + ': ').strip()
-                        logFile.info('Please, type new name for ' + tag_type + ' instead of ' + tag + ': ' + db_tag)
-
-                        sure = input('Are you sure you wanna use ' + db_tag + ' for ' + tag_type +
-                                     ' instead of ' + tag + '? y/n: ').lower()
-                        logFile.info('Are you sure you wanna use ' + db_tag + ' for ' + tag_type +
-                                     ' instead of ' + tag + '? y/n: ' + sure)
-                        if sure == 'y':
-                            db[tag] = db_tag
-                            print('Gotcha.')
-                            return db_tag
-                        else:
-                            continue
+    :param tag: name of component from EXIF
+    :param tag_type: tape of tag e.g. camera brand, camera model, lens brand, lens model
+    :param db: TagAliases object
+    :return: name to use for renaming of file
+    """
+    while True:
+        user_answer = input('Do you want ' + tag_type + ' to be named ' + tag + '? y/n: ').lower()
+        logFile.info('Do you want ' + tag_type + ' to be named ' + tag + '? y/n: ' + user_answer)
+        if user_answer == 'y':
+            # Is user wants to use exact name from EXIF — save it in db and return it for renaming
+            db[tag] = tag
+            return tag
+        elif user_answer == 'n':  # If user wants to use another name, let him key it in
+            sure = 'n'
+            while sure == 'n':
+                db_tag = input('Please, type new name for ' + tag_type + ' instead of ' + tag + ': ').strip()
+                logFile.info('Please, type new name for ' + tag_type + ' instead of ' + tag + ': ' + db_tag)
+
+                sure = input('Are you sure you wanna use ' + db_tag + ' for ' + tag_type +
+                             ' instead of ' + tag + '? y/n: ').lower()
+                logFile.info('Are you sure you wanna use ' + db_tag + ' for ' + tag_type +
+                             ' instead of ' + tag + '? y/n: ' + sure)
+                if sure == 'y':
+                    db[tag] = db_tag
+                    print('Gotcha.')
+                    return db_tag
                 else:
-                    print('Wrong input. You need to type y or n.')
                     continue
+        else:
+            print('Wrong input. You need to type y or n.')
+            continue
+
 
-        def rename_not_save():
-            nonlocal tag
+def ask_name_for_unknown_camera():
+    """
+    Ask user how to name camera which brand is not mentioned in EXIF. The name is used only during this session.
 
-            while True:
-                user_answer = input('Do you want your camera to be named "Unknown camera"? y/n: ').lower()
-                logFile.info('Do you want your camera to be named "Unknown camera"? y/n: ' + user_answer)
-                if user_answer == 'y':
-                    tag = 'Unknown camera'
-                    # Is user wants to use exact name from EXIF — save it in db and return it for renaming
+    :return: name to use for renaming of file
+    """
+    while True:
+        user_answer = input('Do you want your camera to be named "Unknown camera"? y/n: ').lower()
+        logFile.info('Do you want your camera to be named "Unknown camera"? y/n: ' + user_answer)
+        if user_answer == 'y':
+            tag = 'Unknown camera'
+            # Is user wants to use exact name from EXIF — save it in db and return it for renaming
+            return tag
+        elif user_answer == 'n':  # If user wants to use another name, let him key it in
+            sure = 'n'
+            while sure == 'n':
+                new_tag = input('Please, type in brand of your camera: ').strip()
+                logFile.info('Please, type in brand of your camera: ' + new_tag)
+
+                sure = input('Are you sure you wanna name your camera ' + new_tag + '? y/n: ').lower()
+                logFile.info('Are you sure you wanna name your camera ' + new_tag + '? y/n: ' + sure)
+                if sure == 'y':
+                    print('Gotcha.')
+                    tag = new_tag
                     return tag
-                elif user_answer == 'n':  # If user wants to use another name, let him key it in
-                    sure = 'n'
-                    while sure == 'n':
-                        new_tag = input('Please, type in brand of your camera: ').strip()
-                        logFile.info('Please, type in brand of your camera: : ' + tag)
-
-                        sure = input('Are you sure you wanna name your camera ' + new_tag + '? y/n: ').lower()
-                        logFile.info('Are you sure you wanna name your camera ' + new_tag + '? y/n: ' + sure)
-                        if sure == 'y':
-                            print('Gotcha.')
-                            tag = new_tag
-                            return tag
-                        else:
-                            continue
                 else:
-                    print('Wrong input. You need to type y or n.')
                     continue
+        else:
+            print('Wrong input. You need to type y or n.')
+            continue
 
-        db_tag = db.get(tag, None)  # Check whether tag already exists in database
-        if db_tag:  # If yes, use it to rename file
-            return db_tag
-
-        elif not db_tag and tag:  # If not, ask user how to call it instead
-            return rename_and_save()
-        elif not tag and tag_type == 'camera_brand':
-            return rename_not_save()
-
-    def remove_repeated_words(camera_info_string):
-        """
-        Remove name of brand or whatever if it is mentioned more than one time
-
-        :param camera_info_string: string like "date_time camera_brand camera_model lens_brand lens_model"
-        :return: string without words that are used more than once
-        """
-
-        words_array = []
-        # Dedupe string
-        for one_item in camera_info_string.split(' '):
-            if one_item not in words_array:
-                words_array.append(one_item)
-
-        # Convert back to string from list and return
-        return ' '.join(words_array)
-
-    def binary_comparison(current_photo, processed_photo):
-        """
-        Check whether two photos are totally equal
-        :param current_photo: full path to picture for which script tries to come up with a new name
-        :param processed_photo: full path of picture that can be possibly a duplicate of a current photo
-        :return: True or False
-        """
-        with open(current_photo, 'rb') as a:
-            with open(processed_photo, 'rb') as b:
-                if a.read() == b.read():
-                    print('DUPLICATE: "{}" already exists here as "{}"'.format(current_photo, processed_photo))
-                    print('You can delete this extra copy later in this program.')
-                    logFile.info('DUPLICATE: "{}" already exists here as "{}"'.format(current_photo, processed_photo))
-                    logFile.info('You can delete this extra copy later in this program.')
-                    # That list will be used to show user files to be deleted and to send them to trash bin recursively
-                    images_to_delete.append(path_to_picture)
-                    return True
-                else:
-                    logFile.info('"{}" is not duplicate of "{}"'.format(current_photo, processed_photo))
-                    return False
-
-    def check_duplicates(supposed_name):
-        """
-        That was most hard function for me.
-        Function checks whether file is going to get unique name after renaming.
-        If there is more than one file with this name (usually because of burst shooting) these file should
-        be named as someName[2].jpg, someName[3].jpg and so on. Function just keeps track of every name that app
-        is going to give to every file.
-        This function maybe doesn't look very elegant, but I did my best and at least it works write.
-
-        :param supposed_name: string with name that script wants to give to a photo
-        :return: it either returns new name according to existing duplicates (is any) or returns None if current photo
-        ia a duplicate or has been already renamed
-
-        """
-
-        # Counter which increases every time there is a duplicate for current photo.
-        # It will be added to the end of the photo name if it is > 1
-        counter = 1
-
-        def already_has_this_name(name):
-            """
-            Check whether file already has exactly this name that script wants to give it
-            :param name: string with new supposed name of file
-            :return: Boolean
-            """
-
-            if name.lower() == original_filename.lower():
-                print('New name matches current name. This file has already been renamed.')
-                logFile.info('New name matches current name. This file has already been renamed.')
-                return True
-            return False
-
-        def get_new_order_name(name, name_with_counter):
-            """
-            Avoid giving the same names for photos that were taken during the same second
-            Also avoid giving new order names to duplicates instead of ignoring them
-            :param name: string with new supposed name of file
-            :param name_with_counter: same name, but with counter to manage photos with same date of shooting
-            :return: string with name with counter or None
-            """
-
-            nonlocal counter
-
-            # We don't always need to use name_with_counter in this function,
-            # sometimes we need to use just name everywhere
-            if not name_with_counter:
-                name_with_counter = name
-
-            print('That name has already been picked up during this session.')
-            logFile.info('That name has already been picked up during this session.')
-            # Check whether files are duplicates
-            if binary_comparison(path_to_picture, name_strings[name_with_counter]):
-                return None
-
-            # Check if it is possible to give to file a name with next order number
-            # or name with this order number has been already picked up during the session
-            counter += 1
-            while name + '[{}]'.format(counter) in list(name_strings.keys()):
-                logFile.info('New supposed name is "' + name + '[{}].jpg"'.format(counter))
-                # Check if there is already the duplicate of this file
-                if binary_comparison(path_to_picture, name_strings[name + '[{}]'.format(counter)]):
-                    return None
-                counter += 1
-            logFile.info('New supposed name is "' + name + '[{}]"'.format(counter))
-            return name + '[{}]'.format(counter)
-
-        logFile.info('Supposed name is "{}.jpg"'.format(supposed_name))
-        print('Checking for duplicates...')
-        logFile.info('Checking for duplicates...')
-
-        if already_has_this_name(supposed_name + '.jpg'):
-            return None
-
-        if supposed_name in list(name_strings.keys()):
-            supposed_name = get_new_order_name(supposed_name, None)
-            if not supposed_name:
-                return None
-
-        # Check whether file with the same new name already exists in folder (avoiding duplicates)
-        if os.path.exists(os.path.join(os.path.dirname(path_to_picture), supposed_name + '.jpg')):
-            path_to_existing_copy = os.path.join(os.path.dirname(path_to_picture))
-            # Check if files are duplicates
-            if binary_comparison(path_to_picture, os.path.join(path_to_existing_copy,  supposed_name + '.jpg')):
-                return None
-            else:
-                # If there is file with this name but not a duplicate of already existing file
-                print('There is already another file with this name.')
-                logFile.warning('There is already another file with this name.')
-                counter = 2
-                # Try to give it new name with next order number
-                while os.path.exists(os.path.join(path_to_existing_copy, supposed_name + '[{}].jpg'.format(counter))):
-                    # Check if file already has this name and script doesn't need to rename it
-                    if already_has_this_name(supposed_name + '[{}].jpg'.format(counter)):
-                        return None
-                    new_supposed_name = os.path.join(path_to_existing_copy, supposed_name + '[{}].jpg'.format(counter))
-                    logFile.info('New supposed name is "' + supposed_name + '[{}].jpg"'.format(counter))
-                    # To be on safe side check whether file to be renamed and file with this name that already
-                    # exists are duplicates
-                    if binary_comparison(path_to_picture, new_supposed_name):
-                        return None
-                    counter += 1
-
-                # Second check whether supposed name has been picked up already (yes, it is 100% need second check)
-                if supposed_name + '[{}]'.format(counter) in list(name_strings.keys()):
-                    supposed_name = get_new_order_name(supposed_name, supposed_name + '[{}]'.format(counter))
-                    if not supposed_name:
-                        return None
-                    logFile.info('New supposed name is "' + supposed_name + '[{}]"'.format(counter))
-                    return supposed_name
-                else:
-                    logFile.info('New supposed name is "' + supposed_name + '[{}]"'.format(counter))
-                    supposed_name = supposed_name + '[{}]'.format(counter)
 
-        return supposed_name
+def log_step(level, message, *args):
+    """
+    Show step of renamer engine on console if it is shown at this level and write it to log file
+    """
+    if on_console(level):
+        print(message % args if args else message)
+    logFile.log(level, message, *args)
 
-    one_image_with_info = []  # All info about image in list form
 
-    # Get date of when picture was shot
-    date_time = (str(exif.get('EXIF DateTimeOriginal', '')) or str(exif.get('EXIF DateTimeDigitized', '')) or
-                 str(exif.get('Image DateTime', '')))
+def check_tag(tag, tag_type, db):
+    """
+    Function that compare name of camera and lens in database and in EXIF data.
+    If it is not in db, function asks user whether to use name from EXIF data or give tag a
+    new name to use it for renaming of photo. It will then store this new name in database to use it next time.
+
+    :param tag: name of component from EXIF
+    :param tag_type: tape of tag e.g. camera brand, camera model, lens brand, lens model
+    :param db: TagAliases object
+    :return: name to use for renaming of file
+    """
+    global unknown_camera
 
-    if date_time == '':  # If there is no date and time in EXIF
-        print(path_to_picture + ' --- there is no EXIF data.')
-        logFile.info(path_to_picture + ' --- there is no EXIF data.\n')
+    # If camera brand is empty string in EXIF, we ask user to give a name for this camera, but for a session
+    # Next time we just pick this name from the global variable. But un the same time we don't store it permanently
+    # in database
+    if not tag and tag_type == 'camera_brand' and unknown_camera:
+        return unknown_camera
+
+    db_tag = db.get(tag, None)  # Check whether tag already exists in database
+    if db_tag:  # If yes, use it to rename file
+        new_tag = db_tag
+    elif tag:  # If not, ask user how to call it instead or use name from EXIF as it is in batch mode
+        return ask_name_for_tag(tag, tag_type, db) if interactive else tag
+    elif tag_type == 'camera_brand':
+        new_tag = ask_name_for_unknown_camera() if interactive else UNKNOWN_CAMERA
+    else:
+        return None
+    if not tag and tag_type == 'camera_brand':
+        unknown_camera = new_tag.strip()
+    return new_tag
+
+
+def make_engine(db, dup_index):
+    """
+    :param db: TagAliases object
+    :param dup_index: DuplicateIndex object
+    :return: PhotoRenamer object that asks user about unknown names (unless script runs in batch mode)
+    and shows every step on console
+    """
+    return renamer_engine.PhotoRenamer(lambda tag, tag_type: check_tag(tag, tag_type, db), dup_index,
+                                       log=log_step, stats=stats)
 
-        #  if file mame matches pattern like 22-04-05_1304 -> rename it to pattern like 2005-04-22 13-04
-        match = re.match(r'(\d\d-\d\d-\d\d)_(\d{4})', original_filename)
-        if match:
-            original_filename = datetime.strptime(match.group(0), '%d-%m-%y_%H%M').strftime('%Y-%m-%d %H-%M')
 
-        # Add "(no exif)" mark in order to know in advance there is no EXIF in photo in order not to spend time on
-        # opening it next time
-        if original_filename.lower().endswith('.jpg'):
-            original_filename = original_filename[:-4] + ' (no exif)'
-        elif original_filename.lower().endswith('.jpeg'):
-            original_filename = original_filename[:-5] + ' (no exif)'
-        else:
-            original_filename = original_filename + ' (no exif)'
-
-        one_image_with_info.extend([path_to_picture, original_filename])
-        return one_image_with_info
-
-    # Get necessary tags from EXIF data
-    camera_brand = str(exif.get('Image Make', '')).strip()
-    camera_model = str(exif.get('Image Model', '')).strip()
-    lens_brand = str(exif.get('EXIF LensMake', '')).strip()
-    lens_model = str(exif.get('EXIF LensModel', '')).strip()
-
-    # Show to user raw data from EXIF
-    print('\nRaw data from ' + path_to_picture)
-    logFile.info('')
-    logFile.info('Raw data from ' + path_to_picture)
-    print('DateTime: {} Camera brand: {} Camera model: {} Lens brand: {} Lens model: {}'
-          .format(date_time, camera_brand, camera_model, lens_brand, lens_model))
-    logFile.info('DateTime: {} Camera brand: {} Camera model: {} Lens brand: {} Lens model: {}'
-                 .format(date_time, camera_brand, camera_model, lens_brand, lens_model))
-
-    if camera_brand + camera_model + lens_brand + lens_model != '':
-        # Check if we have more appropriate name in database for every tag
-        if camera_brand:
-            camera_brand = check_tag(camera_brand, 'camera_brand').strip()
-
-        # If camera brand is empty string in EXIF, we ask user to give a name for this camera, but for a session
-        # Next time we just pick this name from the global variable. But un the same time we don't store it permanently
-        # in database
-        elif not camera_brand and not unknown_camera:
-            camera_brand = check_tag(camera_brand, 'camera_brand').strip()
-            unknown_camera = camera_brand
-        else:
-            camera_brand = unknown_camera
+def add_duplicate(copy):
+    """
+    :param copy: renamer_engine.Duplicate object
+    """
+    # That list will be used to show user files to be deleted and to send them to trash bin recursively
+    images_to_delete.append(copy.path)
+    copies[copy.path] = copy.copy_of
 
-        camera_model = check_tag(camera_model, 'camera_model').strip() if camera_model else camera_model
 
-        lens_brand = check_tag(lens_brand, 'lens_brand').strip() if lens_brand else lens_brand
+def get_new_name_for_photo(exif, path_to_picture, original_filename, db, name_strings, dup_index):
+    """
+    Takes exif info of one page, covert it to appropriate name by the template, check if there are some duplicates
 
-        lens_model = check_tag(lens_model, 'lens_model').strip() if lens_model else lens_model
+    :param original_filename: file name to compare with new name to avoid creating copies of the same file
+    :param exif: exif data from current file
+    :param path_to_picture: full path to picture
+    :param db: TagAliases object
+    :param name_strings: NameAllocator object - dict with strings how files are supposed to be renamed
+    that also knows which files exist in the folder
+    :param dup_index: DuplicateIndex object with cached digests of files
+    :return: PhotoRecord with path to picture and string with new name for picture (it can be used as list
+    [path, new name]) OR returns -1 if file will not be renamed
+    """
+    item = make_engine(db, dup_index).name_photo(exif, path_to_picture, original_filename, name_strings)
+    if isinstance(item, renamer_engine.Duplicate):
+        add_duplicate(item)
+        return -1
+    return -1 if item is None else item
 
-    # Make string 'name_string' out of photo date, camera model etc and put it in one list with path
-    # Example of name_string after loop:
-    # 2015:06:13 15:20:32 Canon Canon EOS 60D 17-50mm
-    name_string = ''
-    for entry in [date_time, camera_brand, camera_model, lens_brand, lens_model]:
-        if entry:
-            name_string += entry + ' '
 
-    # Replace not allowed characters before calling function
-    name_string = remove_repeated_words(name_string.replace(':', '-').replace('/', '')).strip()
+def process_files(path_with_images, db, name_strings, dup_index, tags_cache, filenames=None, listing=None):
+    # Recursively search for photos and extract exif info
+    # If filenames are given, only these files of folder are processed
+    # If listing (FolderListing from tree_walker) is given, photos are taken from it
 
-    new_name = check_duplicates(name_string)
-    if not new_name:
-        return -1
+    images_with_info = []
 
-    name_string = new_name
+    # Folder has been already listed by NameAllocator or tree_walker, so it is not listed second time
+    if listing is None:
+        listing = tree_walker.list_folder(path_with_images, name_strings.listing if filenames is None else filenames,
+                                          tree_walker.PhotoFilter(IMAGE_EXTENSIONS))
+
+    # If filename has special "no exif" mark - don't even open it, just count and skip
+    for entry in listing.no_exif_marked:
+        if on_console(logging.DEBUG):
+            print('{} has "no exif" mark thereby it will not be processed.'.format(entry.path))
+        logFile.debug('%s has "no exif" mark thereby it will not be processed.', entry.path)
+    images_no_exif_mark = len(listing.no_exif_marked)  # counter of images that the script won't even open
+
+    # If some photos of folder are not processed (watch mode gives only new files, include and exclude patterns
+    # skip some), they are not in index of copies, so new photos are compared with every file of the same name
+    photos_in_folder = sum(1 for name in name_strings.listing
+                           if name.lower().endswith(IMAGE_EXTENSIONS) and tree_walker.NO_EXIF_MARK not in name)
+    whole_folder = len(listing.photos) >= photos_in_folder
+
+    engine = make_engine(db, dup_index)
+
+    def read_tags(entries):  # exif is taken from cache or read in background, engine only picks up names
+        return read_tags_of_files(entries, tags_cache)
+
+    for item in engine.plan_folder(listing.photos, name_strings, read_tags, whole_folder):
+        if isinstance(item, renamer_engine.Duplicate) and item.similar:
+            near_duplicates.append(item)
+        elif isinstance(item, renamer_engine.Duplicate):
+            add_duplicate(item)
+        else:
+            images_with_info.append(item)
 
-    one_image_with_info.extend([path_to_picture, name_string])
+    return images_with_info, images_no_exif_mark
 
-    # Put final file name and it's full path in dictionary in order to be able to keep tracked of name that have been
-    # picked up during the session and to be able to perform binary comparison to figure out duplicates
-    name_strings[name_string] = path_to_picture
-    print('How it will be renamed: ')
-    print(one_image_with_info[1] + '.jpg\n')
-    logFile.info('How it will be renamed: ')
-    logFile.info(one_image_with_info[1] + '.jpg\n')
-    return one_image_with_info
 
+def read_tags_of_files(entries, tags_cache):
+    """
+    Get exif of files from cache or read it from files in background if there is nothing in cache
 
-def process_files(path_with_images, db, name_strings):
-    # Recursively search for photos and extract exif info
+    :param entries: list with DirEntry (or tree_walker.PathEntry) objects of images
+    :param tags_cache: ExifCache object
+    :return: generator of tuples (path, tags) in the same order as entries
+    """
+    images_to_parse = []  # paths of images which exif is not in cache and has to be read
+    images_with_tags = []  # tuples (path, stat, tags from cache or None)
+
+    for entry in entries:
+        path_to_image = entry.path
+        # Don't open file at all if its exif is in cache and file hasn't been changed since then
+        stat = entry.stat()
+        with stats.stage('exif_cache'):
+            tags = tags_cache.get(path_to_image, stat)
+        if tags is None:
+            images_to_parse.append(path_to_image)
+        images_with_tags.append((path_to_image, stat, tags))
+
+    # Exif is parsed in background in advance, but files are given back in the same order as before
+    parsed_tags = exif_pipeline.iter_tags(images_to_parse, EXIF_WORKERS, EXIF_USE_PROCESSES,
+                                          exif_pipeline.COUNTING_READERS[EXIF_READER])
+    for path_to_image, stat, tags in images_with_tags:
+        if tags is None:
+            # Only time of waiting for parsed tags is counted, files are parsed in background meanwhile
+            with stats.stage('exif'):
+                tags, bytes_read = next(parsed_tags)[1]
+            stats.add('exif', bytes_read=bytes_read, calls=0)
+            tags_cache.put(path_to_image, tags, stat)
+        yield path_to_image, tags
 
-    images_with_info = []
-    images_no_exif_mark = 0  # counter of images that the script won't even open
 
-    image_extension = ('.jpg', '.jpeg')  # Files with only these extensions will be processed
+def open_db():
+    # Load database which contains information how different tags from exif rename to normal names
+    # e.g 'NIKON CORPORATION' to 'Nikon' or 'chiron' to 'Mi MIx 2'
+    # It is loaded into memory once per run, new names are written to disk as soon as user gives them
+    aliases = tag_aliases.TagAliases()
+    logConsole.debug('Database ok, {} names loaded'.format(len(aliases)))
+    logFile.debug('Database ok, {} names loaded'.format(len(aliases)))
+    return aliases
+
 
-    for filename in os.listdir(path_with_images):
-        if filename.lower().endswith(image_extension):
+def write_run_report(dup_index=None):
+    """
+    Write calls, time and bytes read of every stage to log as JSON and to REPORT_PATH if it is set
+    :param dup_index: DuplicateIndex object, bytes that it has read are added to binary_comparison
+    """
+    if dup_index:
+        stats.add('binary_comparison', bytes_read=dup_index.bytes_read, calls=0)
+    logFile.info('Run report: %s', json.dumps(stats.report()))
+    if REPORT_PATH:
+        stats.write_report(REPORT_PATH)
 
-            # If filename has special "no exif" mark - don't even open it, just count and skip
-            if re.search(r'\(no exif\)', filename):
-                msg = ('{} has "no exif" mark thereby ' 
-                       'it will not be processed.'.format(os.path.join(path_with_images, filename)))
-                print(msg)
-                logFile.info(msg)
-                images_no_exif_mark += 1
-                continue
 
-            with open(os.path.join(path_with_images, filename), 'rb') as f:
-                # 'details=False' to avoid extracting superfluous data from EXIF and overflowing memory
-                tags = exifread.process_file(f, details=False)
-                path_to_image = os.path.join(path_with_images, filename)
-                data = get_new_name_for_photo(tags, path_to_image, filename, db, name_strings)
-                if data != -1:
-                    images_with_info.append(data)
+def report_near_duplicates(pics_to_rename):
+    """
+    Append pairs of photos that look the same to NEAR_DUPLICATES_REPORT for user to look through them,
+    they can be different shots after all, so nothing is removed
 
-    return images_with_info, images_no_exif_mark
+    :param pics_to_rename: PhotoRecord objects of folder, photos that have been renamed are written with new names
+    :return: number of written pairs
+    """
+    # Index of duplicates gives absolute paths, so all paths in report are absolute
+    new_paths = {os.path.abspath(item.path): os.path.abspath(item.new_path) for item in pics_to_rename}
 
+    def current_path(path):
+        path = os.path.abspath(path)
+        new_path = new_paths.get(path)
+        if new_path and not os.path.lexists(path) and os.path.lexists(new_path):
+            return new_path
+        return path
 
-def open_db():
-    # Open database which contains information how different tags from exif rename to normal names
-    # e.g 'NIKON CORPORATION' to 'Nikon' or 'chiron' to 'Mi MIx 2'
-    if not os.path.exists('db'):
-        os.mkdir('db')
-    shelve_db = shelve.open(os.path.join('db', 'tags_db'))
-    shelve_db['test'] = 'database ok'
-    if shelve_db['test']:
-        logConsole.debug('Database ok')
-        logFile.debug('Database ok')
-    return shelve_db
+    os.makedirs(os.path.dirname(NEAR_DUPLICATES_REPORT), exist_ok=True)
+    with open(NEAR_DUPLICATES_REPORT, 'a', encoding='utf8') as f:
+        for pair in near_duplicates:
+            f.write(json.dumps({'smaller': current_path(pair.path), 'larger': current_path(pair.copy_of)},
+                               ensure_ascii=False) + '\n')
+    written = len(near_duplicates)
+    near_duplicates[:] = []
+    return written
 
 
-def remove_copies():
+def show_disposal_progress(done, total, speed):
+    print('{} of {} copies were removed ({:.0f} files/s)'.format(done, total, speed))
+    logFile.info('{} of {} copies were removed ({:.0f} files/s)'.format(done, total, speed))
+
+
+@stats.timed('remove_copies')
+def remove_copies(disposer=None):
     """
-    Function for recursive removing files from list
-    :return: doesn't get or return anything
+    Function for removing files from list all at once
+    :param disposer: Disposer object, by default files are removed in the way set in DISPOSAL
+    :return: number of removed files
     """
+    if disposer is None:
+        disposer = disposal.Disposer(DISPOSAL, QUARANTINE_FOLDER, show_disposal_progress)
     print('Start to remove superfluous copies.')
     logFile.info('Start to remove superfluous copies.')
-    for file in images_to_delete:
-        send2trash(file)
-        print(file + ' was removed.')
-        logFile.info(file + ' was removed.')
-    print('All old copies were removed')
-    logFile.info('All old copies were removed')
+    removed, failed = disposer.dispose(images_to_delete)
+    for file in removed:
+        logFile.debug('%s was removed.', file)
+    shown = set()  # error that is the same for many files (e.g. no quarantine on disk) is printed only once
+    for file, error in failed:
+        if id(error) in shown:
+            logFile.debug('{}: ERROR: {}'.format(file, error))
+            continue
+        shown.add(id(error))
+        print('{}: ERROR: {}'.format(file, error))
+        logFile.info('{}: ERROR: {}'.format(file, error))
+    if failed:
+        print('{} old copies were removed, {} were not'.format(len(removed), len(failed)))
+        logFile.info('{} old copies were removed, {} were not'.format(len(removed), len(failed)))
+    else:
+        print('All old copies were removed')
+        logFile.info('All old copies were removed')
+    return len(removed)
+
+
+def skip_service_folders(subfolders):
+    """
+    Don't let os.walk go inside quarantine folder
+    :param subfolders: list of subfolders from os.walk, it is changed in place
+    """
+    subfolders[:] = [folder for folder in subfolders if folder != disposal.QUARANTINE_NAME]
 
 
-def rename_photos(pics_to_rename):
+@stats.timed('rename_photos')
+def rename_photos(pics_to_rename, dup_index=None, tags_cache=None, journal=None):
     """
     Recursively rename photos
-    :pics_to_rename: list with new filename and path to picture
+    :pics_to_rename: list of PhotoRecord objects with path to picture and new filename
+    :dup_index: DuplicateIndex object to keep track of new names of files
+    :tags_cache: ExifCache object to keep track of new names of files
+    :journal: RenameJournal object to write renames to, new journal is created if it is not given
     :return: list of files which weren't copied because OS denied it
     """
-    perm_denied_files = []
-    for item in pics_to_rename:
+    # Remove current name of file from full path to file and add a new name to path
+    moves = [(item.path, item.new_path) for item in pics_to_rename]
+    errors = move_files(moves, dup_index, tags_cache, journal)
+    return [old_name for (old_name, new_name), error in zip(moves, errors) if isinstance(error, PermissionError)]
 
-        # Remove current name of file from full path to file and add a new name to path
-        new_name = os.path.join(os.path.dirname(item[0]), item[1])
 
-        if os.path.exists(new_name + '.jpg'):
+def move_files(moves, dup_index=None, tags_cache=None, journal=None, across_devices=False):
+    """
+    Rename files through journal and report every error
+    :param moves: list of tuples (path to file, new path to file)
+    :param dup_index: DuplicateIndex object to keep track of new names of files
+    :param tags_cache: ExifCache object to keep track of new names of files
+    :param journal: RenameJournal object to write renames to, new journal is created if it is not given
+    :param across_devices: files go to another file system, they are copied, checked and then removed
+    :return: list of errors in the same order as moves: None for renamed file or exception
+    """
+    # All renames are written to journal first, then files are renamed without replacing existing ones
+    own_journal = journal is None
+    if own_journal:
+        journal = rename_journal.RenameJournal()
+    errors = journal.apply(moves, across_devices)
+    if own_journal:
+        journal.close()
+
+    for (old_name, new_name), error in zip(moves, errors):
+        if error is None:
+            if dup_index:
+                dup_index.moved(old_name, new_name)
+            if tags_cache:
+                tags_cache.moved(old_name, new_name)
+            if on_console(logging.DEBUG):
+                print(new_name + ' was renamed successfully.')
+            logFile.debug('%s was renamed successfully.', new_name)
+        elif isinstance(error, FileExistsError):
             print('Error! File already exists')
             logFile.info('Error! File already exists\n')
+        elif isinstance(error, PermissionError):
+            print(old_name + ': ERROR: Permission denied.')
+            logFile.info(old_name + ': ERROR: Permission denied.\n')
         else:
-            try:
-                os.rename(item[0], new_name + '.jpg')
-                print(new_name + '.jpg was renamed successfully.')
-                logFile.info(new_name + '.jpg was renamed successfully.')
-            except PermissionError:
-                print(item[0] + ': ERROR: Permission denied.')
-                logFile.info(item[0] + ': ERROR: Permission denied.\n')
-                perm_denied_files.append(item[0])
+            print('{}: ERROR: {}'.format(old_name, error))
+            logFile.info('{}: ERROR: {}\n'.format(old_name, error))
 
-    return perm_denied_files
+    return errors
 
 
 def ask_show_files_to_rename(pics_to_rename):
@@ -468,7 +478,7 @@ def ask_show_files_to_rename(pics_to_rename):
         logFile.info('Do you want to see list of files to be renamed? y/n: \n')
         if see_rename_list_or_not.lower() == 'y':
             for item in pics_to_rename:
-                print('"{}" will be renamed as "{}.jpg"'.format(item[0], item[1]))
+                print('"{}" will be renamed as "{}.jpg"'.format(item.path, item.new_name))
             break
         elif see_rename_list_or_not.lower() == 'n':
             break
@@ -477,12 +487,12 @@ def ask_show_files_to_rename(pics_to_rename):
             logFile.info('It is wrong input, try again.\n')
 
 
-def ask_to_rename_files(pics_to_rename):
+def ask_to_rename_files(pics_to_rename, dup_index=None, tags_cache=None, journal=None):
     while True:
         rename_or_not = input('Do you want to rename these photos? y/n: ')
         logFile.info('Do you want to rename these photos? y/n: \n')
         if rename_or_not.lower() == 'y':
-            unsuccessful_to_copy_files = rename_photos(pics_to_rename)
+            unsuccessful_to_copy_files = rename_photos(pics_to_rename, dup_index, tags_cache, journal)
             return unsuccessful_to_copy_files
         elif rename_or_not.lower() == 'n':
             print('Ciao!')
@@ -540,18 +550,24 @@ def main():
             print('Gotcha!')
             logFile.info('Path to look up for pictures to renames is ' + path_to_look_for_photos + '\n')
 
-            for root, subfolders, files in os.walk(path_to_look_for_photos):
+            # One index for the whole walk in order to find copies of photos in different folders
+            dup_index = duplicate_index.DuplicateIndex(similar_threshold=NEAR_DUPLICATES)
+            tags_cache = exif_cache.ExifCache()
+            db = open_db()
+            journal = rename_journal.RenameJournal()
+
+            for listing in stats.timed_iter('walk', tree_walker.walk(path_to_look_for_photos, IMAGE_EXTENSIONS)):
+                root = listing.folder
+                skip_service_folders(listing.subfolders)
 
                 print('Going inside {} in 3 seconds'.format(root))
                 time.sleep(3)
                 # Dict where key is a final new name of a photo and values is a full path to this photo
-                name_strings = {}
+                name_strings = name_allocator.NameAllocator(root, listing=listing.names)
 
-                db = open_db()
-                files_to_rename, pics_without_exif = process_files(root, db, name_strings)
-                db.close()
+                files_to_rename, pics_without_exif = process_files(root, db, name_strings, dup_index, tags_cache,
+                                                                   listing=listing)
 
-                logFile.info('Database was closed successfully')
                 print('Now we inside {}:'.format(root))
                 logFile.info('Now we inside {}:'.format(root))
                 print('There are ' + str(len(files_to_rename)) + ' files to rename.')
@@ -566,7 +582,7 @@ def main():
 
                 if len(files_to_rename) > 0:
                     ask_show_files_to_rename(files_to_rename)
-                    not_copied_files = ask_to_rename_files(files_to_rename)
+                    not_copied_files = ask_to_rename_files(files_to_rename, dup_index, tags_cache, journal)
 
                     if len(not_copied_files) > 0:
                         print(str(len(not_copied_files)) + ' files were skipped because OS denied permission.')
@@ -579,10 +595,19 @@ def main():
                     ask_show_files_to_delete()
                     ask_to_delete_files()
                     images_to_delete[:] = []
+                    copies.clear()
 
                 print()
                 unknown_camera = ''
 
+            journal.close()
+            db.close()
+            logFile.info('Database was closed successfully')
+            dup_index.close()
+            logFile.info(tags_cache.stats())
+            tags_cache.close()
+            logFile.info('{0:.02f} MB was read to look for duplicates'.format(dup_index.bytes_read / 1024**2))
+            write_run_report(dup_index)
             print('There is nothing to look for anymore. Bye!')
             break
         else:
@@ -590,5 +615,843 @@ def main():
         continue
 
 
+def collect_unknown_tags(path_to_look_for_photos, db, tags_cache, manifest=None, verify=False, include=None,
+                         exclude=None):
+    """
+    Quickly go through all folders before renaming and find names of cameras and lenses that are not in database
+
+    :param path_to_look_for_photos: folder to look through (subfolders are included)
+    :param db: TagAliases object
+    :param tags_cache: ExifCache object, exif that is read here is saved in it to not read files second time
+    :param manifest: DirManifest object, folders that haven't been changed since the last run are skipped
+    :param verify: check sizes and modification times of files in folders from manifest as well
+    :param include: glob patterns of files to process, other files are skipped
+    :param exclude: glob patterns of files and folders to skip
+    :return: tuple where first item is dict where key is unknown tag and value is its type,
+    and second item is True if there are photos of camera without brand in EXIF
+    """
+    unknown_tags = {}
+    camera_without_brand = False
+
+    for listing in stats.timed_iter('walk', tree_walker.walk(path_to_look_for_photos, IMAGE_EXTENSIONS, include,
+                                                             exclude)):
+        skip_service_folders(listing.subfolders)
+        if manifest and manifest.is_unchanged(listing.folder, listing.names, verify):
+            continue
+
+        for path_to_image, exif in read_tags_of_files(listing.photos, tags_cache):
+            date_time = renamer_engine.get_shot_time(exif)
+            if not date_time:  # file will get "no exif" mark and its camera doesn't matter
+                continue
+
+            tags = {'camera_brand': str(exif.get('Image Make', '')).strip(),
+                    'camera_model': str(exif.get('Image Model', '')).strip(),
+                    'lens_brand': str(exif.get('EXIF LensMake', '')).strip(),
+                    'lens_model': str(exif.get('EXIF LensModel', '')).strip()}
+            if not any(tags.values()):
+                continue
+            if not tags['camera_brand']:
+                camera_without_brand = True
+            for tag_type, tag in tags.items():
+                if tag and not db.get(tag):
+                    unknown_tags.setdefault(tag, tag_type)
+
+    return unknown_tags, camera_without_brand
+
+
+def batch_main(path_to_look_for_photos, rules=None, ask=True, incremental=False, verify=False, include=None,
+               exclude=None, plan_path=None):
+    """
+    Rename photos in folder and its subfolders and remove copies without any questions.
+    Names for unknown cameras and lenses are asked all at once before renaming (or taken from rules file).
+
+    :param path_to_look_for_photos: folder to look through (subfolders are included)
+    :param rules: path to JSON or CSV file with names for cameras and lenses (see tag_aliases.py)
+    :param ask: whether to ask user about cameras and lenses that are neither in database nor in rules,
+    otherwise names from EXIF are used as they are
+    :param incremental: skip folders that haven't been changed since they were successfully processed last time
+    :param verify: in incremental mode check sizes and modification times of files as well to notice files
+    that were changed in place
+    :param include: glob patterns (for names of files or their paths inside folder), only matching files are
+    processed
+    :param exclude: glob patterns of files and folders to skip
+    :param plan_path: path to plan file (JSON lines or CSV), if it is given, renames and removals are written there
+    folder by folder instead of being done (see rename_plan.py)
+    """
+    global unknown_camera, interactive
+
+    interactive = False
+    logFile.info('Batch mode. Path to look up for pictures to renames is ' + path_to_look_for_photos)
+
+    db = open_db()
+    if rules:
+        logFile.info('{} names were imported from {}'.format(db.import_file(rules), rules))
+    # If some folders are skipped, copies of new photos can be there, so files from previous runs are remembered
+    dup_index = duplicate_index.DuplicateIndex(remember_folder=path_to_look_for_photos if incremental else None,
+                                               similar_threshold=NEAR_DUPLICATES)
+    tags_cache = exif_cache.ExifCache()
+    manifest = dir_manifest.DirManifest() if incremental else None
+    journal = rename_journal.RenameJournal()
+    disposer = disposal.Disposer(DISPOSAL, QUARANTINE_FOLDER, show_disposal_progress)
+    plan = rename_plan.PlanWriter(plan_path, path_to_look_for_photos) if plan_path else None
+    if NEAR_DUPLICATES is not None and os.path.exists(NEAR_DUPLICATES_REPORT):  # report is made anew every run
+        os.remove(NEAR_DUPLICATES_REPORT)
+
+    print('Looking for unknown cameras and lenses...')
+    unknown_tags, camera_without_brand = collect_unknown_tags(path_to_look_for_photos, db, tags_cache, manifest,
+                                                              verify, include, exclude)
+    logFile.info('There are {} unknown names of cameras and lenses'.format(len(unknown_tags)))
+    if ask:
+        for tag, tag_type in unknown_tags.items():
+            ask_name_for_tag(tag, tag_type, db)
+    session_camera = ask_name_for_unknown_camera() if ask and camera_without_brand else UNKNOWN_CAMERA
+
+    renamed = skipped = deleted = unchanged_folders = similar = 0
+    for listing in stats.timed_iter('walk', tree_walker.walk(path_to_look_for_photos, IMAGE_EXTENSIONS, include,
+                                                             exclude)):
+        root = listing.folder
+        skip_service_folders(listing.subfolders)
+        if manifest and manifest.is_unchanged(root, listing.names, verify):
+            unchanged_folders += 1
+            continue
+
+        # Dict where key is a final new name of a photo and values is a full path to this photo
+        name_strings = name_allocator.NameAllocator(root, listing=listing.names)
+        unknown_camera = session_camera
+
+        files_to_rename, pics_without_exif = process_files(root, db, name_strings, dup_index, tags_cache,
+                                                           listing=listing)
+        logFile.info('{}: {} files to rename, {} old copies to delete'.format(
+            root, len(files_to_rename), len(images_to_delete)))
+
+        if plan:  # nothing is done, files that haven't been renamed are not remembered in manifest either
+            add_to_plan(plan, files_to_rename, dup_index)
+            images_to_delete[:] = []
+            copies.clear()
+            if near_duplicates:
+                similar += report_near_duplicates([])
+            continue
+
+        not_copied_files = rename_photos(files_to_rename, dup_index, tags_cache, journal)
+        renamed += len(files_to_rename) - len(not_copied_files)
+        skipped += len(not_copied_files)
+        if near_duplicates:
+            similar += report_near_duplicates(files_to_rename)
+
+        if len(images_to_delete) > 0:
+            deleted += remove_copies(disposer)
+            images_to_delete[:] = []
+            copies.clear()
+
+        # Folder is skipped next time only if everything has been done in it, files that include and exclude
+        # patterns have skipped are not done, so folders are never recorded when patterns are given
+        if manifest and not not_copied_files and not (include or exclude):
+            manifest.record(root)
+        elif manifest:
+            manifest.forget(root)
+
+    journal.close()
+    db.close()
+    if manifest:
+        manifest.close()
+        logFile.info('{} folders were skipped because they have not been changed'.format(unchanged_folders))
+    dup_index.close()
+    logFile.info(tags_cache.stats())
+    tags_cache.close()
+    if plan:
+        plan.close()
+        msg = '{} renames and {} removals of copies were written to {}'.format(plan.renames, plan.deletes, plan_path)
+    else:
+        msg = '{} files were renamed, {} were skipped because OS denied permission, {} copies were removed'.format(
+            renamed, skipped, deleted)
+    print(msg)
+    logFile.info(msg)
+    if similar:
+        msg = '{} pairs of photos look the same, they are written to {} to look through'.format(
+            similar, NEAR_DUPLICATES_REPORT)
+        print(msg)
+        logFile.info(msg)
+    write_run_report(dup_index)
+
+
+class ShardCache:
+    """
+    Exif cache of worker process of sharded batch mode: tags are taken from the shared cache,
+    but new tags and renames are only collected to be written to cache by coordinator process
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.changes = []  # tuples ('put', path, tags, stat) and ('moved', old path, new path)
+
+    def get(self, path, stat=None):
+        return self.cache.get(path, stat)
+
+    def put(self, path, tags, stat=None):
+        tags = {name: str(value) for name, value in tags.items()}  # tags from exifread can't be sent as they are
+        self.changes.append(('put', path, tags, stat or os.stat(path)))
+
+    def moved(self, old_path, new_path):
+        self.changes.append(('moved', old_path, new_path))
+
+
+shard_state = {}  # what every worker process of sharded batch mode keeps between folders
+
+
+def init_shard_worker(aliases, camera, console_level, journal_path, messages):
+    """
+    Prepare worker process of sharded batch mode, it is called once in every worker
+
+    :param aliases: dict with names for cameras and lenses
+    :param camera: name for cameras without brand in EXIF
+    :param console_level: level of messages to print
+    :param journal_path: path to journal of run, every worker writes its own journal next to it
+    :param messages: queue to send messages for log file to coordinator
+    """
+    global interactive, CONSOLE_LEVEL
+    interactive = False
+    CONSOLE_LEVEL = console_level
+    handle_logs.log_to_queue(logFile, messages)
+    handle_logs.configure(logFile, console_level, log_console=logConsole)
+    shard_state.update(aliases=aliases, camera=camera, tags_cache=exif_cache.ExifCache(),
+                       journal=rename_journal.RenameJournal(rename_journal.worker_path(journal_path, os.getpid())))
+
+
+def run_shard(folder, names, photo_names):
+    """
+    Pick up new names for photos of one folder and rename them, it is done in worker process
+
+    :param folder: path to folder
+    :param names: names of all entries of folder
+    :param photo_names: names of photos to process (copies of photos from other folders are not among them)
+    :return: dict with results to merge: number of renamed files, files that were not renamed,
+    copies inside folder (tuples (copy, file that is kept)), changes of exif cache and stages of run
+    """
+    global unknown_camera
+    unknown_camera = shard_state['camera']
+    images_to_delete[:] = []
+    copies.clear()
+    stats.stages.clear()  # worker gives back only what was done for this folder
+    tags_cache = ShardCache(shard_state['tags_cache'])
+    hits, misses = tags_cache.cache.hits, tags_cache.cache.misses
+
+    listing = tree_walker.FolderListing(folder, names, [], [tree_walker.PathEntry(folder, name)
+                                                           for name in photo_names], [])
+    name_strings = name_allocator.NameAllocator(folder, listing=names)
+    # Copies in other folders have been already found by coordinator, only copies inside this folder are left
+    dup_index = duplicate_index.DuplicateIndex(path_to_db=None)
+    files_to_rename, _ = process_files(folder, shard_state['aliases'], name_strings, dup_index, tags_cache,
+                                       listing=listing)
+    not_copied_files = rename_photos(files_to_rename, None, tags_cache, shard_state['journal'])
+    shard_state['journal'].close()
+
+    return {'renamed': len(files_to_rename) - len(not_copied_files), 'not_renamed': not_copied_files,
+            'copies': [(path, copies[path]) for path in images_to_delete], 'cache_changes': tags_cache.changes,
+            'hits': tags_cache.cache.hits - hits, 'misses': tags_cache.cache.misses - misses,
+            'stages': dict(stats.stages), 'bytes_read': dup_index.bytes_read}
+
+
+def sharded_main(path_to_look_for_photos, rules=None, ask=True, incremental=False, verify=False, include=None,
+                 exclude=None, workers=2):
+    """
+    The same as batch_main, but folders are processed by several worker processes at once.
+    Coordinator (this process) walks through folders and removes copies of photos from other folders first,
+    because it needs the whole library to find them, then every folder is given to one of workers,
+    which reads exif, picks up names and renames photos, and results are merged here.
+
+    :param workers: number of worker processes
+    Other parameters are the same as for batch_main.
+    """
+    global interactive
+
+    interactive = False
+    logFile.info('Sharded batch mode with {} workers. Path to look up for pictures to renames is {}'.format(
+        workers, path_to_look_for_photos))
+
+    db = open_db()
+    if rules:
+        logFile.info('{} names were imported from {}'.format(db.import_file(rules), rules))
+    dup_index = duplicate_index.DuplicateIndex(remember_folder=path_to_look_for_photos if incremental else None)
+    tags_cache = exif_cache.ExifCache()
+    manifest = dir_manifest.DirManifest() if incremental else None
+    journal = rename_journal.RenameJournal()  # workers write their journals next to it
+    disposer = disposal.Disposer(DISPOSAL, QUARANTINE_FOLDER, show_disposal_progress)
+
+    # Unknown cameras and lenses are looked for only if user is going to be asked about them,
+    # otherwise exif is read by workers only
+    session_camera = UNKNOWN_CAMERA
+    if ask:
+        print('Looking for unknown cameras and lenses...')
+        unknown_tags, camera_without_brand = collect_unknown_tags(path_to_look_for_photos, db, tags_cache, manifest,
+                                                                  verify, include, exclude)
+        logFile.info('There are {} unknown names of cameras and lenses'.format(len(unknown_tags)))
+        for tag, tag_type in unknown_tags.items():
+            ask_name_for_tag(tag, tag_type, db)
+        if camera_without_brand:
+            session_camera = ask_name_for_unknown_camera()
+        tags_cache.flush()  # workers take exif that has been just read from cache
+
+    renamed = skipped = deleted = unchanged_folders = 0
+    tasks = []
+    for listing in stats.timed_iter('walk', tree_walker.walk(path_to_look_for_photos, IMAGE_EXTENSIONS, include,
+                                                             exclude)):
+        root = listing.folder
+        skip_service_folders(listing.subfolders)
+        if manifest and manifest.is_unchanged(root, listing.names, verify):
+            unchanged_folders += 1
+            continue
+
+        photo_names = []
+        for entry in listing.photos:
+            copy = dup_index.add(entry.path, entry.stat())
+            if copy and os.path.dirname(copy) != os.path.abspath(root):
+                if on_console(logging.INFO):
+                    print('DUPLICATE: "{}" already exists as "{}"'.format(entry.path, copy))
+                logFile.info('DUPLICATE: "%s" already exists as "%s"', entry.path, copy)
+                images_to_delete.append(entry.path)
+                copies[entry.path] = copy
+                dup_index.forget(entry.path)
+                continue
+            photo_names.append(entry.name)
+        tasks.append((root, listing.names, photo_names))
+
+    # Copies are removed before renaming, so workers don't have to know about them
+    if images_to_delete:
+        deleted += remove_copies(disposer)
+        images_to_delete[:] = []
+        copies.clear()
+
+    messages = handle_logs.share_with_processes(logFile)
+    with concurrent.futures.ProcessPoolExecutor(workers, initializer=init_shard_worker, initargs=(
+            db.aliases, session_camera, CONSOLE_LEVEL, journal.path, messages)) as executor:
+        futures = {executor.submit(run_shard, *task): task[0] for task in tasks}
+        for future in concurrent.futures.as_completed(futures):
+            root = futures[future]
+            result = future.result()
+            for change in result['cache_changes']:
+                if change[0] == 'put':
+                    tags_cache.put(*change[1:])
+                else:
+                    tags_cache.moved(*change[1:])
+                    dup_index.moved(*change[1:])
+            tags_cache.hits += result['hits']
+            tags_cache.misses += result['misses']
+            for name, (calls, seconds, bytes_read) in result['stages'].items():
+                stats.add(name, seconds, bytes_read, calls)
+            stats.add('binary_comparison', bytes_read=result['bytes_read'], calls=0)
+            renamed += result['renamed']
+            skipped += len(result['not_renamed'])
+            logFile.info('{}: {} files were renamed, {} old copies to delete'.format(
+                root, result['renamed'], len(result['copies'])))
+
+            if result['copies']:
+                for path, copy in result['copies']:
+                    images_to_delete.append(path)
+                    copies[path] = copy
+                deleted += remove_copies(disposer)
+                images_to_delete[:] = []
+                copies.clear()
+
+            if manifest and not result['not_renamed'] and not (include or exclude):
+                manifest.record(root)
+            elif manifest:
+                manifest.forget(root)
+
+    db.close()
+    if manifest:
+        manifest.close()
+        logFile.info('{} folders were skipped because they have not been changed'.format(unchanged_folders))
+    dup_index.close()
+    logFile.info(tags_cache.stats())
+    tags_cache.close()
+    msg = '{} files were renamed, {} were skipped because OS denied permission, {} copies were removed'.format(
+        renamed, skipped, deleted)
+    print(msg)
+    logFile.info(msg)
+    write_run_report(dup_index)
+
+
+def add_to_plan(plan, pics_to_rename, dup_index):
+    """
+    Write renames and removals of copies of one folder to plan instead of doing them
+    :param plan: rename_plan.PlanWriter object
+    :param pics_to_rename: list of PhotoRecord objects with path to picture and new filename
+    :param dup_index: DuplicateIndex object, it knows sizes and times of files
+    """
+    def state(path):
+        known_state = dup_index.state(path)
+        if known_state is None:  # copy that has been already forgotten by index
+            stat = os.stat(path)
+            known_state = (stat.st_size, stat.st_mtime_ns)
+        return known_state
+
+    for item in pics_to_rename:
+        plan.rename(item.path, item.new_path, state(item.path))
+    for path in images_to_delete:
+        plan.delete(path, copies[path], state(path))
+    plan.flush()
+
+
+def apply_plan(plan_path, root=None, batch_size=500):
+    """
+    Rename files and remove copies as it is written in plan. Nothing is read from EXIF or compared,
+    but files that have been changed since plan was made are not touched.
+
+    :param plan_path: path to plan file made by batch_main
+    :param root: folder to apply plan to instead of folder that was scanned
+    :param batch_size: how many files to rename or remove at once
+    """
+    logFile.info('Applying plan ' + plan_path)
+    tags_cache = exif_cache.ExifCache()
+    journal = rename_journal.RenameJournal()
+    disposer = disposal.Disposer(DISPOSAL, QUARANTINE_FOLDER, show_disposal_progress)
+    renamed_to = {}  # path -> new path of files renamed by plan, to find files that copies are kept instead of
+    moves = []
+    renamed = deleted = skipped = 0
+
+    def do_moves():
+        nonlocal renamed
+        errors = move_files(moves, None, tags_cache, journal)
+        for (old_name, new_name), error in zip(moves, errors):
+            if error is None:
+                renamed_to[old_name] = new_name
+                renamed += 1
+        moves[:] = []
+
+    for record in rename_plan.read_plan(plan_path, root):
+        if not rename_plan.is_unchanged(record):
+            print('{} has been changed or removed since plan was made, it is skipped.'.format(record['path']))
+            logFile.info('%s has been changed or removed since plan was made, it is skipped.', record['path'])
+            skipped += 1
+        elif record['action'] == 'rename':
+            moves.append((record['path'], record['new_path']))
+            if len(moves) >= batch_size:
+                do_moves()
+        elif record['action'] == 'delete':
+            if moves:  # file that is kept instead of this copy can be among them
+                do_moves()
+            kept = renamed_to.get(record['copy_of'], record['copy_of'])
+            if not os.path.exists(kept):
+                print('{} is not removed, because {} is not there anymore.'.format(record['path'], kept))
+                logFile.info('%s is not removed, because %s is not there anymore.', record['path'], kept)
+                skipped += 1
+                continue
+            images_to_delete.append(record['path'])
+            if len(images_to_delete) >= batch_size:
+                deleted += remove_copies(disposer)
+                images_to_delete[:] = []
+    if moves:
+        do_moves()
+    if images_to_delete:
+        deleted += remove_copies(disposer)
+        images_to_delete[:] = []
+
+    journal.close()
+    tags_cache.close()
+    msg = '{} files were renamed, {} copies were removed, {} files were skipped'.format(renamed, deleted, skipped)
+    print(msg)
+    logFile.info(msg)
+    write_run_report()
+
+
+def watch_main(path_to_watch, settle_seconds=2.0, batch_size=100, poll_interval=None):
+    """
+    Keep running and rename new photos as soon as they appear in folder or its subfolders.
+    User is never asked anything: names that are not in database are used as they are.
+
+    :param path_to_watch: folder to watch
+    :param settle_seconds: how long new file has to stay the same before it is renamed
+    :param batch_size: maximum number of files to process at once
+    :param poll_interval: list folders every poll_interval seconds instead of using inotify
+    """
+    global unknown_camera, interactive
+    import watcher  # watches folders for new files, it is needed only here
+
+    interactive = False
+    db = open_db()  # database stays in memory all the time
+    dup_index = duplicate_index.DuplicateIndex(remember_folder=path_to_watch)
+    tags_cache = exif_cache.ExifCache()
+    files_watcher = watcher.make_watcher(path_to_watch, poll_interval)
+    debouncer = watcher.Debouncer(settle_seconds)
+    renamed_by_script = set()  # new names of renamed files, events about them are ignored
+    journal = rename_journal.RenameJournal()
+    disposer = disposal.Disposer(DISPOSAL, QUARANTINE_FOLDER, show_disposal_progress)
+
+    msg = 'Watching {} with {}. Press Ctrl+C to stop.'.format(path_to_watch, type(files_watcher).__name__)
+    print(msg)
+    logFile.info(msg)
+
+    try:
+        while True:
+            for path in files_watcher.changed_files(timeout=settle_seconds / 2):
+                if path in renamed_by_script:
+                    renamed_by_script.discard(path)
+                elif disposal.QUARANTINE_NAME in path.split(os.sep):  # copies that have been just removed
+                    continue
+                elif path.lower().endswith(IMAGE_EXTENSIONS):
+                    debouncer.touch(path)
+
+            if files_watcher.overflowed:  # some events were lost, so look through all folders again
+                files_watcher.overflowed = False
+                for root, subfolders, files in os.walk(path_to_watch):
+                    skip_service_folders(subfolders)
+                    for filename in files:
+                        if filename.lower().endswith(IMAGE_EXTENSIONS):
+                            debouncer.touch(os.path.join(root, filename))
+
+            ready = debouncer.settled()
+            # Group new files by folder, because names are picked up for every folder separately
+            folders = {}
+            for path in ready[:batch_size]:
+                folders.setdefault(os.path.dirname(path), []).append(os.path.basename(path))
+            for path in ready[batch_size:]:  # the rest will be processed during the next round
+                debouncer.touch(path)
+
+            for folder, filenames in folders.items():
+                name_strings = name_allocator.NameAllocator(folder)
+                unknown_camera = UNKNOWN_CAMERA
+                try:
+                    files_to_rename, pics_without_exif = process_files(folder, db, name_strings, dup_index,
+                                                                       tags_cache, filenames)
+                    not_copied_files = rename_photos(files_to_rename, dup_index, tags_cache, journal)
+                    for item in files_to_rename:
+                        if item.path not in not_copied_files:
+                            renamed_by_script.add(item.new_path)
+
+                    if len(images_to_delete) > 0:
+                        remove_copies(disposer)
+                except OSError as error:
+                    # File can be removed or become unreadable after it has settled, it must not stop watching.
+                    # Other files of folder are tried once again during one of next rounds
+                    msg = 'Error! Files in {} are skipped this time: {}'.format(folder, error)
+                    print(msg)
+                    logFile.info(msg)
+                    if isinstance(error, FileNotFoundError):
+                        for filename in filenames:
+                            if os.path.exists(os.path.join(folder, filename)):
+                                debouncer.touch(os.path.join(folder, filename))
+                images_to_delete[:] = []
+                copies.clear()
+    except KeyboardInterrupt:
+        print('Watching is stopped.')
+        logFile.info('Watching is stopped.')
+    finally:
+        files_watcher.close()
+        journal.close()
+        db.close()
+        dup_index.close()
+        logFile.info(tags_cache.stats())
+        tags_cache.close()
+        write_run_report(dup_index)
+
+
+def date_folder(date_time):
+    """
+    :param date_time: date and time of shooting from EXIF like '2017:09:05 09:15:27'
+    :return: tuple (year, month) like ('2017', '09') or None if there is no real date (cameras with reset clock
+    write zeros)
+    """
+    year, month = date_time[:4], date_time[5:7]
+    if not (year.isdigit() and month.isdigit()) or year == '0000' or not 1 <= int(month) <= 12:
+        return None
+    return year, month
+
+
+def organize_main(path_to_look_for_photos, destination, rules=None, ask=True, include=None, exclude=None,
+                  batch_size=ORGANIZE_BATCH):
+    """
+    Move photos from folder and its subfolders to folders destination/YYYY/MM by date of shooting and give them
+    new names there. Copies are removed without questions like in batch mode, photos without date of shooting
+    stay where they are.
+    Photos are renamed if destination is on the same file system and copied by kernel, checked and removed if it is
+    not. Moves are done by batches for every folder of destination, and every such folder is listed only once.
+
+    :param path_to_look_for_photos: folder to look through (subfolders are included)
+    :param destination: folder to put folders of years to, it can be on another disk
+    :param rules: path to JSON or CSV file with names for cameras and lenses (see tag_aliases.py)
+    :param ask: whether to ask user about cameras and lenses that are neither in database nor in rules
+    :param include: glob patterns of files to process
+    :param exclude: glob patterns of files and folders to skip
+    :param batch_size: how many photos for one folder of destination are collected before they are moved
+    """
+    global unknown_camera, interactive
+
+    interactive = False
+    logFile.info('Organize mode. Photos from %s are moved to %s', path_to_look_for_photos, destination)
+    source = os.path.abspath(path_to_look_for_photos)
+    destination = os.path.abspath(destination)
+
+    db = open_db()
+    if rules:
+        logFile.info('{} names were imported from {}'.format(db.import_file(rules), rules))
+    dup_index = duplicate_index.DuplicateIndex()
+    tags_cache = exif_cache.ExifCache()
+    journal = rename_journal.RenameJournal()
+    disposer = disposal.Disposer(DISPOSAL, QUARANTINE_FOLDER, show_disposal_progress)
+
+    print('Looking for unknown cameras and lenses...')
+    unknown_tags, camera_without_brand = collect_unknown_tags(source, db, tags_cache, include=include,
+                                                              exclude=exclude)
+    logFile.info('There are {} unknown names of cameras and lenses'.format(len(unknown_tags)))
+    if ask:
+        for tag, tag_type in unknown_tags.items():
+            ask_name_for_tag(tag, tag_type, db)
+    unknown_camera = ask_name_for_unknown_camera() if ask and camera_without_brand else UNKNOWN_CAMERA
+    engine = make_engine(db, dup_index)
+
+    folders = {}  # folder of destination -> NameAllocator object
+    pending = {}  # folder of destination -> list of tuples (PhotoRecord, st_dev of file system where photo is)
+    moved = across_devices = skipped = deleted = without_date = 0
+
+    def move_pending(folder):
+        nonlocal moved, across_devices, skipped
+        items = pending.pop(folder, [])
+        if not items:
+            return
+        os.makedirs(folder, exist_ok=True)
+        device = os.stat(folder).st_dev
+        for other_device in (False, True):
+            batch = [item for item, item_device in items if (item_device != device) == other_device]
+            if not batch:
+                continue
+            moves = [(item.path, item.new_path) for item in batch]
+            with stats.stage('organize_copy' if other_device else 'organize_rename'):
+                errors = move_files(moves, dup_index, tags_cache, journal, other_device)
+            for item, (old_path, new_path), error in zip(batch, moves, errors):
+                if error is None:
+                    folders[folder].pick(item.new_name, new_path)  # name is taken by file that is there now
+                    moved += 1
+                    across_devices += other_device
+                else:
+                    skipped += 1
+
+    for listing in stats.timed_iter('walk', tree_walker.walk(source, IMAGE_EXTENSIONS, include, exclude)):
+        skip_service_folders(listing.subfolders)
+        # Photos that have been already moved are not looked through again
+        listing.subfolders[:] = [name for name in listing.subfolders
+                                 if os.path.join(listing.folder, name) != destination]
+        device = os.stat(listing.folder).st_dev
+        without_date += len(listing.no_exif_marked)
+
+        photos = []
+        for entry in listing.photos:
+            copy = dup_index.add(entry.path, entry.stat())
+            if copy:
+                log_step(logging.INFO, 'DUPLICATE: "%s" already exists as "%s"', entry.path, copy)
+                add_duplicate(renamer_engine.Duplicate(entry.path, copy))
+                dup_index.forget(entry.path)
+            else:
+                photos.append(entry)
+
+        for entry, (path_to_image, exif) in zip(photos, read_tags_of_files(photos, tags_cache)):
+            date = date_folder(renamer_engine.get_shot_time(exif))
+            if date is None:
+                log_step(logging.DEBUG, '%s has no date of shooting, it stays where it is.', path_to_image)
+                without_date += 1
+                continue
+            folder = os.path.join(destination, *date)
+            name_strings = folders.get(folder)
+            if name_strings is None:
+                name_strings = folders[folder] = name_allocator.NameAllocator(
+                    folder, listing=os.listdir(folder) if os.path.isdir(folder) else [])
+
+            # Photo from another folder is named by its full path: it never has its new name in destination already
+            # and NameAllocator gives path back as it is (os.path.join drops folder before absolute path)
+            filename = entry.name if listing.folder == folder else path_to_image
+            item = engine.name_photo(exif, path_to_image, filename, name_strings, whole_folder=False)
+            if isinstance(item, renamer_engine.Duplicate):
+                add_duplicate(item)
+            elif item is not None:
+                pending.setdefault(folder, []).append((item, device))
+                if len(pending[folder]) >= batch_size:
+                    move_pending(folder)
+
+        if images_to_delete:
+            deleted += remove_copies(disposer)
+            images_to_delete[:] = []
+            copies.clear()
+
+    for folder in list(pending):
+        move_pending(folder)
+
+    journal.close()
+    db.close()
+    dup_index.close()
+    logFile.info(tags_cache.stats())
+    tags_cache.close()
+    msg = ('{} photos were moved ({} of them to another file system), {} were skipped because of errors, {} have no '
+           'date of shooting and stay where they are, {} copies were removed'.format(
+               moved, across_devices, skipped, without_date, deleted))
+    print(msg)
+    logFile.info(msg)
+    write_run_report(dup_index)
+
+
+def resume_renames():
+    """
+    Finish renames from journals of runs that were interrupted
+    """
+    for path in rename_journal.list_journals():
+        planned, done, finished = rename_journal.read_journal(path)
+        if finished:
+            continue
+        moved, failed = rename_journal.resume(path)
+        msg = '{}: {} files were renamed, {} failed'.format(path, moved, len(failed))
+        print(msg)
+        logFile.info(msg)
+        for record, error in failed:
+            print('{} -> {}: {}'.format(record['src'], record['dst'], error))
+
+
+def undo_renames(path=None):
+    """
+    Rename files back to names they had before renaming
+
+    :param path: path to journal of run to undo, journal of the last run is used if it is not given
+    """
+    journals = rename_journal.list_journals()
+    if path is None and not journals:
+        print('There is nothing to undo.')
+        return
+    if path:
+        paths = [path]
+    else:  # sharded run has journal for every worker
+        paths = [journal for journal in journals if rename_journal.run_of(journal) ==
+                 rename_journal.run_of(journals[-1])]
+    for path in paths:
+        moved, failed = rename_journal.undo(path)
+        msg = '{}: {} files were renamed back, {} failed'.format(path, moved, len(failed))
+        print(msg)
+        logFile.info(msg)
+        for record, error in failed:
+            print('{} -> {}: {}'.format(record['dst'], record['src'], error))
+
+
 if __name__ == '__main__':
-    main()
+    import argparse  # it is needed only when module is run as script
+
+    parser = argparse.ArgumentParser(description='Rename jpg files according to date and camera from EXIF. '
+                                                 'Without arguments script asks everything it needs.')
+    parser.add_argument('--report', metavar='FILE',
+                        help='write calls, time and bytes read of every stage of run to FILE as JSON')
+    parser.add_argument('--profile', metavar='FILE', help='run script under cProfile and save statistics to FILE')
+    subparsers = parser.add_subparsers(dest='command')
+
+    batch_parser = subparsers.add_parser('batch', help='rename files and remove copies without questions')
+    batch_parser.add_argument('path', help='folder with photos (subfolders are included)')
+    batch_parser.add_argument('--rules', help='JSON or CSV file with names to use for cameras and lenses')
+    batch_parser.add_argument('--no-prompt', action='store_true',
+                              help='do not ask about unknown cameras and lenses, use names from EXIF as they are')
+    batch_parser.add_argument('--incremental', action='store_true',
+                              help='skip folders that have not been changed since the last successful run')
+    batch_parser.add_argument('--verify', action='store_true',
+                              help='with --incremental also check size and time of every file to notice '
+                                   'files that were changed in place')
+    batch_parser.add_argument('--workers', type=int, default=1, metavar='N',
+                              help='process folders in N processes at once (default: 1)')
+
+    watch_parser = subparsers.add_parser('watch', help='keep running and rename new photos as they appear')
+    watch_parser.add_argument('path', help='folder to watch (subfolders are included)')
+    watch_parser.add_argument('--settle', type=float, default=2.0,
+                              help='seconds new file has to stay unchanged before it is renamed (default: 2)')
+    watch_parser.add_argument('--batch-size', type=int, default=100,
+                              help='maximum number of files to rename at once (default: 100)')
+    watch_parser.add_argument('--poll', type=float, metavar='SECONDS',
+                              help='list folders every SECONDS instead of using inotify')
+
+    plan_parser = subparsers.add_parser('plan', help='write what batch mode would do to a plan file instead of '
+                                                     'doing it')
+    plan_parser.add_argument('path', help='folder with photos (subfolders are included)')
+    plan_parser.add_argument('plan', help='plan file to write, CSV if its name ends with .csv, JSON lines otherwise')
+    plan_parser.add_argument('--rules', help='JSON or CSV file with names to use for cameras and lenses')
+    plan_parser.add_argument('--no-prompt', action='store_true',
+                             help='do not ask about unknown cameras and lenses, use names from EXIF as they are')
+
+    organize_parser = subparsers.add_parser('organize', help='move photos to folders YYYY/MM by date of shooting '
+                                                             'and rename them there')
+    organize_parser.add_argument('path', help='folder with photos (subfolders are included)')
+    organize_parser.add_argument('destination', help='folder to put folders of years to, it can be on another disk')
+    organize_parser.add_argument('--rules', help='JSON or CSV file with names to use for cameras and lenses')
+    organize_parser.add_argument('--no-prompt', action='store_true',
+                                 help='do not ask about unknown cameras and lenses, use names from EXIF as they are')
+    for subparser in (batch_parser, plan_parser, organize_parser):
+        subparser.add_argument('--include', action='append', metavar='PATTERN',
+                               help='process only files which name or path inside folder matches PATTERN '
+                                    '(e.g. "*.jpg" or "2019/*"), can be given several times')
+        subparser.add_argument('--exclude', action='append', metavar='PATTERN',
+                               help='skip files and folders which name or path inside folder matches PATTERN, '
+                                    'can be given several times')
+    for subparser in (batch_parser, plan_parser):
+        subparser.add_argument('--near-duplicates', type=int, nargs='?', const=thumbnail_hash.THRESHOLD,
+                               metavar='BITS',
+                               help='find photos taken at the same time which EXIF thumbnails look the same '
+                                    '(resized or recompressed copies) and write them to {} to review, BITS is how '
+                                    'many bits of 64-bit hashes of thumbnails can differ (default: {})'.format(
+                                        NEAR_DUPLICATES_REPORT, thumbnail_hash.THRESHOLD))
+
+    apply_parser = subparsers.add_parser('apply', help='rename files and remove copies as it is written in plan')
+    apply_parser.add_argument('plan', help='plan file made by "plan" command')
+    apply_parser.add_argument('--root', help='folder to apply plan to, if it is not the scanned one '
+                                             '(e.g. the same folder on file server)')
+
+    for subparser in (batch_parser, watch_parser, plan_parser, organize_parser, apply_parser):
+        subparser.add_argument('-v', '--verbosity', choices=handle_logs.VERBOSITY, default='normal',
+                               help='"verbose" prints and logs every step for every file, "normal" only copies, '
+                                    'errors and totals, "quiet" only errors (default: normal)')
+        subparser.add_argument('--json-log', action='store_true', help='write log file as lines of JSON')
+    for subparser in (batch_parser, watch_parser, organize_parser, apply_parser):
+        subparser.add_argument('--dispose', choices=disposal.KINDS, default=DISPOSAL,
+                               help='how to get rid of copies: send them to trash bin (default), move them to '
+                                    'quarantine folder on the same disk or delete them for good')
+        subparser.add_argument('--quarantine-folder',
+                               help='folder for --dispose quarantine (default: {} in the root of disk or, if it '
+                                    'can not be written to, in the highest folder above files that can)'.format(
+                                        disposal.QUARANTINE_NAME))
+
+    subparsers.add_parser('resume', help='finish renames of runs that were interrupted')
+    undo_parser = subparsers.add_parser('undo', help='rename files back to names they had before the last run')
+    undo_parser.add_argument('journal', nargs='?', help='journal of run to undo (default: the last one)')
+
+    args = parser.parse_args()
+    if args.command == 'batch' and args.workers > 1 and args.near_duplicates is not None:
+        parser.error('--near-duplicates can not be used with --workers, because it needs exif of the whole library '
+                     'in one process')
+    if args.command in ('batch', 'watch', 'organize', 'apply'):
+        DISPOSAL = args.dispose
+        QUARANTINE_FOLDER = args.quarantine_folder
+    if args.command in ('batch', 'plan'):
+        NEAR_DUPLICATES = args.near_duplicates
+    if args.command in ('batch', 'watch', 'plan', 'organize', 'apply'):
+        CONSOLE_LEVEL = handle_logs.VERBOSITY[args.verbosity]
+        start_logging(CONSOLE_LEVEL, args.json_log)
+    else:
+        start_logging()
+    REPORT_PATH = args.report
+
+    def run_command():
+        if args.command == 'resume':
+            resume_renames()
+        elif args.command == 'undo':
+            undo_renames(args.journal)
+        elif args.command == 'watch':
+            watch_main(args.path, args.settle, args.batch_size, args.poll)
+        elif args.command == 'batch' and args.workers > 1:
+            sharded_main(args.path, args.rules, not args.no_prompt, args.incremental, args.verify, args.include,
+                         args.exclude, args.workers)
+        elif args.command == 'batch':
+            batch_main(args.path, args.rules, not args.no_prompt, args.incremental, args.verify, args.include,
+                       args.exclude)
+        elif args.command == 'plan':
+            batch_main(args.path, args.rules, not args.no_prompt, include=args.include, exclude=args.exclude,
+                       plan_path=args.plan)
+        elif args.command == 'organize':
+            organize_main(args.path, args.destination, args.rules, not args.no_prompt, args.include, args.exclude)
+        elif args.command == 'apply':
+            apply_plan(args.plan, args.root)
+        else:
+            main()
+
+    if args.profile:
+        run_stats.profile(run_command, args.profile)
+    else:
+        run_command()
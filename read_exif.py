@@ -1,12 +1,30 @@
 #!python3
 # -*- coding: utf-8 -*-
-# Utility script to check EXIF of individual file
+# Utility script to check EXIF of files, e.g. to find out why photos were named the way they were.
+#
+# Without arguments it asks path to one photo and prints all its tags.
+# With paths to photos and folders (subfolders are included) or with --list it reads EXIF of all of them
+# in a pool of workers and writes tags of every file as soon as it is read, as JSON lines or CSV:
+# python read_exif.py path/to/photos --renamer-tags --output tags.csv
+# --renamer-tags decodes only tags that photo_renamer uses with its fast reader, --tags picks any other tags.
 
-import exifread
+import csv
+import functools
+import json
 import os
+import sys
+import time
+
+import exif_pipeline
+import fast_exif
+import tree_walker
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg')  # files with these extensions are taken from folders
 
 
 def read_exif(file):
+    import exifread
+
     with open(file, 'rb') as image:
         tags = exifread.process_file(image, details=False)
         if len(tags.keys()) < 1:
@@ -14,12 +32,169 @@ def read_exif(file):
         for tag, value in tags.items():
             print(str(tag) + ' --- ' + str(value))
 
-while True:
-    file_path = input('Please type in path to photo:\n')
-    if os.path.exists(file_path):
-        print('Gotcha!')
-        read_exif(file_path)
-        break
-    else:
-        print('There is no such file. Try another.')
-        continue
+
+def read_tags(path, renamer_tags_only=False):
+    """
+    Read tags of one file, it is run by workers
+
+    :param path: full path to file
+    :param renamer_tags_only: decode only tags that photo_renamer uses (with fast reader), not all of them
+    :return: tuple (dict tag -> value as string, None) or (None, text of error) if file can't be read
+    """
+    try:
+        if renamer_tags_only:
+            return fast_exif.read_tags(path), None
+        import exifread
+
+        with open(path, 'rb') as f:
+            return {name: str(value) for name, value in exifread.process_file(f, details=False).items()}, None
+    except Exception as e:  # broken file must not stop the whole dump
+        return None, '{}: {}'.format(type(e).__name__, e)
+
+
+def find_files(paths, list_file=None):
+    """
+    :param paths: paths to files and folders, files from folders and their subfolders are taken by extension
+    :param list_file: path to file with one path to photo per line, '-' for standard input
+    :return: generator of paths to files
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for listing in tree_walker.walk(path, IMAGE_EXTENSIONS):
+            for entry in listing.photos + listing.no_exif_marked:
+                yield entry.path
+
+    if list_file:
+        f = sys.stdin if list_file == '-' else open(list_file, encoding='utf8')
+        try:
+            for line in f:
+                if line.strip():
+                    yield line.rstrip('\r\n')
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+
+class TagWriter:
+    def __init__(self, f, is_csv, tags=None):
+        """
+        :param f: opened file to write to
+        :param is_csv: write CSV with column for every tag instead of JSON lines
+        :param tags: names of tags to write, None for all tags (only for JSON lines)
+        """
+        self.f = f
+        self.tags = tags
+        self.writer = None
+        if is_csv:
+            self.writer = csv.DictWriter(f, ('path', 'error') + tuple(tags), extrasaction='ignore')
+            self.writer.writeheader()
+
+    def write(self, path, tags, error=None):
+        """
+        :param path: path to file
+        :param tags: dict tag -> value as string, None if file can't be read
+        :param error: why file can't be read
+        """
+        record = {'path': path}  # path goes first to make lines easier to read
+        if tags is None:
+            record['error'] = error
+        elif self.tags is None:
+            record.update(tags)
+        else:
+            record.update((name, tags[name]) for name in self.tags if name in tags)
+        if self.writer is not None:
+            self.writer.writerow(record)
+        else:
+            self.f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def dump(paths, output, is_csv=False, tags=None, renamer_tags_only=False, workers=exif_pipeline.WORKERS,
+         use_processes=False):
+    """
+    Read tags of files in parallel and write them to output in the same order as files were given
+
+    :param paths: iterable with paths to files
+    :param output: opened file to write to
+    :param is_csv: write CSV instead of JSON lines
+    :param tags: names of tags to write, None for all tags
+    :param renamer_tags_only: decode only tags that photo_renamer uses
+    :param workers: size of pool of workers
+    :param use_processes: use processes instead of threads
+    :return: tuple (number of files, number of files without EXIF, number of files that can't be read)
+    """
+    writer = TagWriter(output, is_csv, tags)
+    reader = functools.partial(read_tags, renamer_tags_only=renamer_tags_only)
+    files = no_exif = errors = 0
+    for path, (file_tags, error) in exif_pipeline.iter_tags(paths, workers, use_processes, reader):
+        files += 1
+        if file_tags is None:
+            errors += 1
+        elif not file_tags:
+            no_exif += 1
+        writer.write(path, file_tags, error)
+    return files, no_exif, errors
+
+
+def ask_and_read():
+    while True:
+        file_path = input('Please type in path to photo:\n')
+        if os.path.exists(file_path):
+            print('Gotcha!')
+            read_exif(file_path)
+            break
+        else:
+            print('There is no such file. Try another.')
+            continue
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 1:
+        ask_and_read()
+        sys.exit()
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Write EXIF tags of many photos as JSON lines or CSV')
+    parser.add_argument('paths', nargs='*', help='photos and folders with photos (subfolders are included)')
+    parser.add_argument('--list', metavar='FILE', help="file with one path to photo per line, '-' for standard input")
+    parser.add_argument('--output', '-o', metavar='FILE', help='file to write to instead of standard output')
+    parser.add_argument('--format', choices=('jsonl', 'csv'),
+                        help='format of output (default: csv if name of output file ends with .csv, jsonl otherwise)')
+    parser.add_argument('--tags', nargs='+', metavar='TAG', help="names of tags to write, like 'Image Model'")
+    parser.add_argument('--renamer-tags', action='store_true',
+                        help='read only the {} tags that photo_renamer uses, it is much faster than reading '
+                             'all of them'.format(len(fast_exif.RENAMER_TAGS)))
+    parser.add_argument('--workers', type=int, default=exif_pipeline.WORKERS,
+                        help='how many files are read at the same time (default: {})'.format(exif_pipeline.WORKERS))
+    parser.add_argument('--processes', action='store_true',
+                        help='read files in processes instead of threads (when decoding and not disk is slow)')
+    args = parser.parse_args()
+
+    if not args.paths and not args.list:
+        parser.error('give paths to photos or folders, or --list')
+    is_csv = args.format == 'csv' or (args.format is None and (args.output or '').lower().endswith('.csv'))
+    # Fast reader knows only renamer tags, so it is used also when only some of them are asked for
+    only_renamer_tags_asked = bool(args.tags) and set(args.tags) <= set(fast_exif.RENAMER_TAGS)
+    if args.renamer_tags and args.tags and not only_renamer_tags_asked:
+        parser.error('only renamer tags can be picked with --tags together with --renamer-tags')
+    renamer_tags_only = args.renamer_tags or only_renamer_tags_asked
+    selected_tags = args.tags or (list(fast_exif.RENAMER_TAGS) if args.renamer_tags else None)
+    if is_csv and not selected_tags:
+        parser.error('CSV needs --tags or --renamer-tags to know its columns')
+
+    output = open(args.output, 'w', encoding='utf8', newline='') if args.output else sys.stdout
+    start = time.perf_counter()
+    try:
+        files, no_exif, errors = dump(find_files(args.paths, args.list), output, is_csv, selected_tags,
+                                      renamer_tags_only, args.workers, args.processes)
+    except BrokenPipeError:  # e.g. output was given to head, which has read enough
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    seconds = time.perf_counter() - start
+    print('{} files were read ({:.0f} files/s), {} have no EXIF, {} can\'t be read'.format(
+        files, files / max(seconds, 1e-9), no_exif, errors), file=sys.stderr)
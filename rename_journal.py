@@ -0,0 +1,269 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+# Renames files in bulk and keeps a journal of what it is doing, so renaming can be resumed if script
+# was killed in the middle, and everything can be renamed back later.
+#
+# Journal is a text file in db/journal where every line is JSON:
+# {"seq": 1, "src": "...", "dst": "..."} - planned move, all moves of a batch are written to disk before renaming
+#                                          ("copy": true is added for moves to another file system)
+# {"done": 1} - move with this number has been done
+# {"end": true} - script finished its work normally (moves can be planned after it again by the same journal,
+#                then journal is not finished till the next "end")
+#
+# In sharded batch mode every worker process writes its own journal, its name is the name of journal of
+# the whole run with .w<pid of worker> before extension, so all of them can be undone together.
+#
+# Files are moved without replacing existing files and without checking whether destination exists first:
+# on Linux it is done with renameat2(RENAME_NOREPLACE), on other systems with hard link + unlink
+# (Windows never replaces files on rename anyway). So there is no gap between check and renaming.
+# Files that go to another file system are copied and then removed by file_transfer, both ways as well.
+
+import errno
+import json
+import os
+import sys
+import time
+
+import compare_files
+
+JOURNAL_FOLDER = os.path.join('db', 'journal')
+AT_FDCWD = -100
+RENAME_NOREPLACE = 1
+
+
+def _load_renameat2():
+    if not sys.platform.startswith('linux'):
+        return None
+    import ctypes
+    import ctypes.util
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        renameat2 = libc.renameat2
+    except (OSError, AttributeError):  # old glibc doesn't have it
+        return None
+    renameat2.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+    return renameat2
+
+
+_renameat2 = None  # renameat2 from libc, it is loaded on the first move, False if there is no such function
+
+
+def move_no_replace(src, dst):
+    """
+    Rename file, but never replace existing file
+
+    :param src: path to file
+    :param dst: new path to file
+    :raise FileExistsError: if dst already exists
+    :raise OSError: any other error of renaming (e.g. PermissionError)
+    """
+    global _renameat2
+    if os.name == 'nt':  # Windows doesn't replace existing files on rename
+        os.rename(src, dst)
+        return
+
+    if _renameat2 is None:
+        _renameat2 = _load_renameat2() or False
+    if _renameat2:
+        if _renameat2(AT_FDCWD, os.fsencode(src), AT_FDCWD, os.fsencode(dst), RENAME_NOREPLACE) == 0:
+            return
+        import ctypes
+        error = ctypes.get_errno()
+        # Kernel or file system that doesn't support this flag, then try another way
+        if error not in (errno.ENOSYS, errno.EINVAL, errno.ENOTSUP):
+            raise OSError(error, os.strerror(error), src, None, dst)
+
+    try:
+        os.link(src, dst)  # fails if dst exists
+    except FileExistsError:
+        raise
+    except OSError:
+        # File system doesn't support hard links, so the only thing left is to check and rename
+        if os.path.lexists(dst):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), dst)
+        os.rename(src, dst)
+    else:
+        os.unlink(src)
+
+
+def _move(record, back=False):
+    """
+    :param record: planned move from journal
+    :param back: move file from dst to src
+    """
+    src, dst = (record['dst'], record['src']) if back else (record['src'], record['dst'])
+    if record.get('copy'):
+        import file_transfer  # it is needed only for moves to another file system
+
+        file_transfer.move_across_devices(src, dst)
+    else:
+        move_no_replace(src, dst)
+
+
+class RenameJournal:
+    def __init__(self, path=None):
+        """
+        :param path: path to journal file, new file in JOURNAL_FOLDER is created if it is not given
+        """
+        if path is None:
+            os.makedirs(JOURNAL_FOLDER, exist_ok=True)
+            path = os.path.join(JOURNAL_FOLDER, 'renames_{}_{}.jsonl'.format(
+                time.strftime('%Y-%m-%d__%Hh%Mm%Ss'), os.getpid()))
+        self.path = path
+        self.seq = 0
+        self.file = None
+
+    def _write(self, records, sync=False):
+        if self.file is None:
+            self.file = open(self.path, 'a', encoding='utf8')
+        for record in records:
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.file.flush()
+        if sync:
+            os.fsync(self.file.fileno())
+
+    def apply(self, moves, across_devices=False):
+        """
+        Write planned moves to journal and then do them
+
+        :param moves: list of tuples (path to file, new path to file)
+        :param across_devices: files go to another file system, so they are copied and removed instead of renaming
+        :return: list of errors in the same order as moves: None for successful move or exception
+        """
+        planned = []
+        for src, dst in moves:
+            self.seq += 1
+            # Absolute paths, so journal can be resumed or undone from any working folder
+            record = {'seq': self.seq, 'src': os.path.abspath(src), 'dst': os.path.abspath(dst)}
+            if across_devices:
+                record['copy'] = True
+            planned.append(record)
+        # Plan must be on disk before the first file is renamed, otherwise there is nothing to resume or undo
+        self._write(planned, sync=True)
+
+        errors = []
+        done = []
+        for record in planned:
+            try:
+                _move(record)
+            except OSError as error:
+                errors.append(error)
+            else:
+                errors.append(None)
+                done.append({'done': record['seq']})
+        self._write(done)
+        return errors
+
+    def close(self):
+        if self.file is not None:
+            self._write([{'end': True}], sync=True)
+            self.file.close()
+            self.file = None
+
+
+def read_journal(path):
+    """
+    :return: tuple (list of planned moves as dicts, set of numbers of done moves, True if journal was finished)
+    """
+    planned, done, finished = [], set(), False
+    with open(path, encoding='utf8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:  # the last line can be cut if script was killed while writing it
+                continue
+            if 'seq' in record:
+                planned.append(record)
+                finished = False
+            elif 'done' in record:
+                done.add(record['done'])
+            elif record.get('end'):
+                finished = True
+    return planned, done, finished
+
+
+def worker_path(path, worker):
+    """
+    :param path: path to journal of run
+    :param worker: number of worker process
+    :return: path to journal of this worker
+    """
+    return '{}.w{}.jsonl'.format(path[:-len('.jsonl')], worker)
+
+
+def run_of(path):
+    """
+    :return: name of run which journal it is, journals of all workers of one run have the same one
+    """
+    return os.path.basename(path).split('.', 1)[0]
+
+
+def list_journals():
+    """
+    :return: paths to all journals from the oldest to the newest
+    """
+    if not os.path.exists(JOURNAL_FOLDER):
+        return []
+    return [os.path.join(JOURNAL_FOLDER, name) for name in sorted(os.listdir(JOURNAL_FOLDER), key=lambda name: (
+        os.path.getmtime(os.path.join(JOURNAL_FOLDER, name)), name)) if name.endswith('.jsonl')]
+
+
+def resume(path):
+    """
+    Do moves that were planned, but not done because script was interrupted
+
+    :param path: path to journal
+    :return: tuple (number of moves done now, list of (move, error) that failed)
+    """
+    planned, done, finished = read_journal(path)
+    moved, failed = 0, []
+    for record in planned:
+        if record['seq'] in done:
+            continue
+        # Move could have been done right before script was killed without being marked in journal
+        if not os.path.lexists(record['src']) and os.path.lexists(record['dst']):
+            continue
+        # Copy on another file system could have been made without removing the original
+        if record.get('copy') and os.path.lexists(record['dst']) and \
+                compare_files.FileComparator().same(record['src'], record['dst']):
+            os.unlink(record['src'])
+            moved += 1
+            continue
+        try:
+            _move(record)
+            moved += 1
+        except OSError as error:
+            failed.append((record, error))
+    # The last line can be cut if script was killed while writing it, then "end" must start a new line
+    new_line = ''
+    with open(path, 'rb') as f:
+        if f.seek(0, os.SEEK_END):
+            f.seek(-1, os.SEEK_END)
+            new_line = '' if f.read(1) == b'\n' else '\n'
+    with open(path, 'a', encoding='utf8') as f:
+        f.write(new_line + json.dumps({'end': True}) + '\n')
+    return moved, failed
+
+
+def undo(path):
+    """
+    Rename files from journal back to their previous names, from the last move to the first
+
+    :param path: path to journal
+    :return: tuple (number of files renamed back, list of (move, error) that failed)
+    """
+    planned, done, finished = read_journal(path)
+    moved, failed = 0, []
+    for record in reversed(planned):
+        was_done = record['seq'] in done or (not os.path.lexists(record['src']) and os.path.lexists(record['dst']))
+        if not was_done:
+            continue
+        try:
+            _move(record, back=True)
+            moved += 1
+        except OSError as error:
+            failed.append((record, error))
+    os.rename(path, path[:-len('.jsonl')] + '.undone')
+    return moved, failed
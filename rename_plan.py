@@ -0,0 +1,106 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+# Plan of renames and removals of copies. Scan of folders writes what it would do to a plan file
+# folder by folder while it works, instead of doing it. Later (maybe on another machine, e.g. on file server
+# itself) plan is applied without reading EXIF or comparing files once again.
+#
+# Plan is either JSON lines (one record per line) or CSV (if name of file ends with .csv) with these fields:
+# action - 'root', 'rename' or 'delete'
+# path - path to file relative to root ('root' record has absolute path of scanned folder here)
+# new_path - new path of file relative to root for 'rename'
+# copy_of - path relative to root of file that is kept instead of this one for 'delete'
+# size, mtime_ns - size and modification time of file when it was scanned, file that was changed since then
+# is not touched
+
+import csv
+import json
+import os
+
+FIELDS = ('action', 'path', 'new_path', 'copy_of', 'size', 'mtime_ns')
+MTIME_TOLERANCE = 2 * 10**9  # file systems like FAT or network shares keep modification time roughly
+
+
+class PlanWriter:
+    def __init__(self, path, root):
+        """
+        :param path: path to plan file, it is CSV if its name ends with .csv and JSON lines otherwise
+        :param root: scanned folder, paths in plan are relative to it
+        """
+        self.root = os.path.abspath(root)
+        self.is_csv = path.lower().endswith('.csv')
+        self.file = open(path, 'w', encoding='utf8', newline='')
+        self.writer = None
+        if self.is_csv:
+            self.writer = csv.DictWriter(self.file, FIELDS)
+            self.writer.writeheader()
+        self.renames = self.deletes = 0
+        self._write({'action': 'root', 'path': self.root})
+
+    def _relative(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root)
+
+    def _write(self, record):
+        if self.is_csv:
+            self.writer.writerow(record)
+        else:
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def rename(self, path, new_path, state):
+        """
+        :param path: path to file
+        :param new_path: new path to file
+        :param state: tuple (size, modification time in nanoseconds) of file
+        """
+        self._write({'action': 'rename', 'path': self._relative(path), 'new_path': self._relative(new_path),
+                     'size': state[0], 'mtime_ns': state[1]})
+        self.renames += 1
+
+    def delete(self, path, copy_of, state):
+        """
+        :param path: path to copy to remove
+        :param copy_of: path to file with the same content that is kept
+        :param state: tuple (size, modification time in nanoseconds) of file
+        """
+        self._write({'action': 'delete', 'path': self._relative(path), 'copy_of': self._relative(copy_of),
+                     'size': state[0], 'mtime_ns': state[1]})
+        self.deletes += 1
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_plan(path, root=None):
+    """
+    Read plan record by record
+
+    :param path: path to plan file
+    :param root: folder to apply plan to instead of folder that was scanned (e.g. the same share mounted elsewhere)
+    :return: generator of dicts with action and absolute paths
+    """
+    with open(path, encoding='utf8', newline='') as f:
+        records = csv.DictReader(f) if path.lower().endswith('.csv') else (json.loads(line) for line in f
+                                                                           if line.strip())
+        for record in records:
+            if record['action'] == 'root':
+                root = root or record['path']
+                continue
+            for field in ('path', 'new_path', 'copy_of'):
+                if record.get(field):
+                    record[field] = os.path.join(root, record[field])
+            record['size'], record['mtime_ns'] = int(record['size']), int(record['mtime_ns'])
+            yield record
+
+
+def is_unchanged(record):
+    """
+    :return: True if file from record has the same size and modification time as it had when it was scanned
+    """
+    try:
+        stat = os.stat(record['path'])
+    except FileNotFoundError:
+        return False
+    return stat.st_size == record['size'] and abs(stat.st_mtime_ns - record['mtime_ns']) < MTIME_TOLERANCE
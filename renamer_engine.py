@@ -0,0 +1,491 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+# Engine that picks up new names for photos and finds their copies without printing or asking anything,
+# so it can be used from other programs (e.g. from a service that takes in new photos). photo_renamer itself
+# uses it as well and only adds questions to user and output to console on top of it.
+#
+# Engine has no global state: names of cameras without brand, index of file contents and everything else
+# are kept by every PhotoRenamer object, so several engines can work at the same time in one process
+# (one engine per thread, they only must not share the same DuplicateIndex).
+#
+# Usage:
+# engine = renamer_engine.PhotoRenamer(lambda tag, tag_type: aliases.get(tag) or tag or 'Unknown camera')
+# plan = engine.plan(paths)
+# for photo in plan.renames: ... photo.path, photo.new_path
+# for copy in plan.duplicates: ... copy.path, copy.copy_of
+# for pair in plan.near_duplicates: ... pair.path, pair.copy_of (smaller and larger photo of the same shot to review)
+# for photo in plan.no_exif: ... photo.path, photo.new_path (same name with "(no exif)" mark)
+
+import contextlib
+import logging
+import os
+import re
+from datetime import datetime
+
+import duplicate_index
+import name_allocator
+import thumbnail_hash
+import tree_walker
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg')
+
+
+def get_shot_time(exif):
+    """
+    :param exif: dict with tags of photo
+    :return: string with date and time when photo was taken or empty string if it is not in EXIF
+    """
+    return (str(exif.get('EXIF DateTimeOriginal', '')) or str(exif.get('EXIF DateTimeDigitized', '')) or
+            str(exif.get('Image DateTime', '')))
+
+
+def larger_photo(first, second):
+    """
+    Pick photo to keep from two photos that look the same (e.g. original and its resized copy)
+
+    :param first: full path to photo that was met first
+    :param second: full path to another photo
+    :return: path to photo with more pixels, if they have the same number of pixels, to bigger file,
+    and if files have the same size as well, to the first photo
+    """
+    def size(path):
+        width, height = thumbnail_hash.image_size(path) or (0, 0)
+        return width * height, os.path.getsize(path)
+
+    return second if size(second) > size(first) else first
+
+
+def read_tags(path):
+    import fast_exif
+
+    return fast_exif.read_tags(path)
+
+
+class NoExifRecord(name_allocator.PhotoRecord):
+    """
+    Photo without date of shooting in EXIF, new name is its current name with "(no exif)" mark
+    """
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'NoExifRecord({!r}, {!r}, {!r})'.format(self.folder, self.filename, self.new_name)
+
+
+class Duplicate:
+    """
+    Superfluous copy of photo that can be removed, or smaller one of two photos that look the same,
+    which is only to be shown to user
+    """
+    __slots__ = ('path', 'copy_of', 'similar')
+
+    def __init__(self, path, copy_of, similar=False):
+        """
+        :param path: full path to copy
+        :param copy_of: full path to photo that is kept instead of it (the larger one for similar photos)
+        :param similar: True if photos only look the same (resized or recompressed copy), False if they are equal
+        byte by byte
+        """
+        self.path = path
+        self.copy_of = copy_of
+        self.similar = similar
+
+    def __repr__(self):
+        return 'Duplicate({!r}, {!r}, similar={!r})'.format(self.path, self.copy_of, self.similar)
+
+
+class Plan:
+    """
+    What should be done with photos, nothing is done by engine itself
+    """
+    def __init__(self):
+        self.renames = []  # PhotoRecord objects of photos to rename
+        self.duplicates = []  # Duplicate objects of copies to remove
+        # Duplicate objects of photos that only look the same, they are not removed but only shown to user
+        self.near_duplicates = []
+        self.no_exif = []  # NoExifRecord objects of photos without EXIF to add mark to
+
+    def add(self, item):
+        if isinstance(item, Duplicate) and item.similar:
+            self.near_duplicates.append(item)
+        elif isinstance(item, Duplicate):
+            self.duplicates.append(item)
+        elif isinstance(item, NoExifRecord):
+            self.no_exif.append(item)
+        else:
+            self.renames.append(item)
+
+
+class PhotoRenamer:
+    def __init__(self, resolve_alias, dup_index=None, read_tags=read_tags, log=None, stats=None):
+        """
+        :param resolve_alias: function (tag, tag_type) -> name to use in new names instead of name of camera or lens
+        from EXIF, tag_type is 'camera_brand', 'camera_model', 'lens_brand' or 'lens_model'. It is called with empty
+        tag and 'camera_brand' once per engine for camera without brand in EXIF
+        :param dup_index: DuplicateIndex object to find copies with, by default index is kept only in memory
+        :param read_tags: function that takes path to photo and gives back dict with its tags
+        :param log: function (level, message, *args) that is called for every step like logging.log does,
+        by default nothing is logged
+        :param stats: RunStats object to count time of stages in
+        """
+        self.resolve_alias = resolve_alias
+        self.dup_index = dup_index if dup_index is not None else duplicate_index.DuplicateIndex(None)
+        self.read_tags = read_tags
+        self.log = log
+        self.stats = stats
+        self.unknown_camera = None  # name for camera without brand, it is asked from resolve_alias only once
+
+    def _log(self, level, message, *args):
+        if self.log is not None:
+            self.log(level, message, *args)
+
+    def _stage(self, name):
+        return self.stats.stage(name) if self.stats is not None else contextlib.nullcontext()
+
+    def plan(self, paths):
+        """
+        Pick up new names for photos and find copies among them and among photos that were planned before
+        by this engine
+
+        :param paths: iterable of paths to photos, they can be in different folders
+        :return: Plan object
+        """
+        folders = {}  # folder -> names of files to process, in the same order as they were given
+        for path in paths:
+            folder, filename = os.path.split(os.path.abspath(path))
+            folders.setdefault(folder, []).append(filename)
+
+        result = Plan()
+        photo_filter = tree_walker.PhotoFilter(IMAGE_EXTENSIONS)
+        for folder, filenames in folders.items():
+            name_strings = name_allocator.NameAllocator(folder)
+            listing = tree_walker.list_folder(folder, filenames, photo_filter)
+            # Photos of folder that are not in plan can also be copies of these photos
+            requested = set(name.lower() for name in filenames)
+            whole_folder = all(entry.name.lower() in requested
+                               for entry in tree_walker.list_folder(folder, name_strings.listing, photo_filter).photos)
+            for item in self.plan_folder(listing.photos, name_strings, whole_folder=whole_folder):
+                result.add(item)
+        return result
+
+    def plan_folder(self, photos, name_strings, read_tags_of_files=None, whole_folder=True):
+        """
+        Pick up new names for photos of one folder and find copies among them
+
+        :param photos: DirEntry (or tree_walker.PathEntry) objects of photos of folder without "no exif" mark
+        :param name_strings: NameAllocator object of folder
+        :param read_tags_of_files: function that takes list of entries and gives back tuples (path, tags) in the same
+        order (e.g. from cache or from background workers), by default tags are read one by one
+        :param whole_folder: False if there are photos in folder that are not given, then they are always compared
+        with photos that are going to get their names
+        :return: generator of PhotoRecord (photo to rename), NoExifRecord (photo without EXIF) and Duplicate
+        (copy to remove or, with similar=True, photos to review, both of them are named as usual) objects,
+        photos that already have right names are skipped
+        """
+        images_to_parse = []  # entries of images which exif has to be read
+        copies_here = set()  # paths of images that have copy in this folder, they are handled by check_duplicates
+
+        for entry in photos:
+            path_to_image = entry.path
+
+            # Check whether the same photo has been already met in one of previous folders.
+            # Copies inside the current folder are handled later while picking up new name for photo
+            copy = self.dup_index.add(path_to_image, entry.stat())
+            if copy and os.path.dirname(copy) != os.path.dirname(os.path.abspath(path_to_image)):
+                self._log(logging.INFO, 'DUPLICATE: "%s" already exists as "%s"', path_to_image, copy)
+                self._log(logging.INFO, 'You can delete this extra copy later in this program.')
+                self.dup_index.forget(path_to_image)
+                yield Duplicate(path_to_image, copy)
+                continue
+            if copy:
+                copies_here.add(path_to_image)
+
+            images_to_parse.append(entry)
+
+        if read_tags_of_files is None:
+            tags_of_files = ((entry.path, self.read_tags(entry.path)) for entry in images_to_parse)
+        else:
+            tags_of_files = read_tags_of_files(images_to_parse)
+        for entry, (path_to_image, tags) in zip(images_to_parse, tags_of_files):
+            # Resized or recompressed copy of photo that has been already met
+            similar = None
+            if self.dup_index.similar_threshold is not None and path_to_image not in copies_here:
+                with self._stage('near_duplicates'):
+                    similar = self.dup_index.add_similar(path_to_image, get_shot_time(tags))
+            if similar:
+                # Photos can be different shots after all, so they are only reported and both get their names
+                self._log(logging.INFO, 'NEAR DUPLICATE: "%s" looks the same as "%s"', path_to_image, similar)
+                with self._stage('near_duplicates'):
+                    kept = larger_photo(similar, path_to_image)
+                yield Duplicate(similar if kept == path_to_image else path_to_image, kept, similar=True)
+            item = self.name_photo(tags, path_to_image, entry.name, name_strings, whole_folder)
+            if item is not None:
+                yield item
+
+    def check_tag(self, tag, tag_type):
+        """
+        :param tag: name of camera or lens from EXIF, empty for camera without brand
+        :param tag_type: type of tag e.g. camera_brand, camera_model, lens_brand, lens_model
+        :return: name to use for renaming of file
+        """
+        with self._stage('check_tag'):
+            if tag:
+                return self.resolve_alias(tag, tag_type).strip()
+            # Camera without brand gets the same name for all photos
+            if self.unknown_camera is None:
+                self.unknown_camera = (self.resolve_alias(tag, tag_type) or '').strip()
+            return self.unknown_camera
+
+    def name_photo(self, exif, path_to_picture, original_filename, name_strings, whole_folder=True):
+        """
+        Takes exif info of one photo, covert it to appropriate name by the template, check if there are some
+        duplicates
+
+        :param exif: exif data from current file
+        :param path_to_picture: full path to picture
+        :param original_filename: file name to compare with new name to avoid creating copies of the same file
+        :param name_strings: NameAllocator object - dict with strings how files are supposed to be renamed
+        that also knows which files exist in the folder
+        :param whole_folder: False if not all photos of folder are in index of copies
+        :return: PhotoRecord with path to picture and new name for it, NoExifRecord for photo without EXIF,
+        Duplicate if the same photo is already in folder or None if file will not be renamed
+        """
+        log = self._log
+        dup_index = self.dup_index
+        filename = original_filename  # current name of file, original_filename can be changed below
+        found_copy = None  # path to photo with the same content as this one
+
+        def remove_repeated_words(camera_info_string):
+            """
+            Remove name of brand or whatever if it is mentioned more than one time
+
+            :param camera_info_string: string like "date_time camera_brand camera_model lens_brand lens_model"
+            :return: string without words that are used more than once
+            """
+
+            words_array = []
+            # Dedupe string
+            for one_item in camera_info_string.split(' '):
+                if one_item not in words_array:
+                    words_array.append(one_item)
+
+            # Convert back to string from list and return
+            return ' '.join(words_array)
+
+        def binary_comparison(current_photo, processed_photo):
+            """
+            Check whether two photos are totally equal
+            :param current_photo: full path to picture for which script tries to come up with a new name
+            :param processed_photo: full path of picture that can be possibly a duplicate of a current photo
+            :return: True or False
+            """
+            nonlocal found_copy
+            # Sizes and hashes are compared instead of reading both files every time
+            with self._stage('binary_comparison'):
+                equal = dup_index.same_content(current_photo, processed_photo)
+            if equal:
+                log(logging.INFO, 'DUPLICATE: "%s" already exists here as "%s"', current_photo, processed_photo)
+                log(logging.INFO, 'You can delete this extra copy later in this program.')
+                found_copy = processed_photo
+                return True
+            else:
+                log(logging.DEBUG, '"%s" is not duplicate of "%s"', current_photo, processed_photo)
+                return False
+
+        def check_duplicates(supposed_name):
+            """
+            That was most hard function for me.
+            Function checks whether file is going to get unique name after renaming.
+            If there is more than one file with this name (usually because of burst shooting) these file should
+            be named as someName[2].jpg, someName[3].jpg and so on. Function just keeps track of every name that app
+            is going to give to every file.
+            This function maybe doesn't look very elegant, but I did my best and at least it works write.
+
+            :param supposed_name: string with name that script wants to give to a photo
+            :return: it either returns new name according to existing duplicates (is any) or returns None if current
+            photo ia a duplicate or has been already renamed
+
+            """
+
+            # Counter which increases every time there is a duplicate for current photo.
+            # It will be added to the end of the photo name if it is > 1
+            counter = 1
+
+            # If there is no copy of this photo in the folder, none of files with the same name can be its duplicate,
+            # so free name can be taken right away without comparing files one by one
+            has_copy = None if whole_folder else True
+
+            def may_have_copy():
+                nonlocal has_copy
+                if has_copy is None:
+                    has_copy = dup_index.has_copy(path_to_picture, os.path.dirname(path_to_picture))
+                return has_copy
+
+            def already_has_this_name(name):
+                """
+                Check whether file already has exactly this name that script wants to give it
+                :param name: string with new supposed name of file
+                :return: Boolean
+                """
+
+                if name.lower() == original_filename.lower():
+                    log(logging.DEBUG, 'New name matches current name. This file has already been renamed.')
+                    return True
+                return False
+
+            def get_new_order_name(name, name_with_counter):
+                """
+                Avoid giving the same names for photos that were taken during the same second
+                Also avoid giving new order names to duplicates instead of ignoring them
+                :param name: string with new supposed name of file
+                :param name_with_counter: same name, but with counter to manage photos with same date of shooting
+                :return: string with name with counter or None
+                """
+
+                nonlocal counter
+
+                # We don't always need to use name_with_counter in this function,
+                # sometimes we need to use just name everywhere
+                if not name_with_counter:
+                    name_with_counter = name
+
+                log(logging.DEBUG, 'That name has already been picked up during this session.')
+                # Check whether files are duplicates
+                if binary_comparison(path_to_picture, name_strings[name_with_counter]):
+                    return None
+
+                # Check if it is possible to give to file a name with next order number
+                # or name with this order number has been already picked up during the session
+                counter += 1
+                if not may_have_copy():
+                    counter = name_strings.next_free_counter(name, counter)
+                while name + '[{}]'.format(counter) in name_strings:
+                    log(logging.DEBUG, 'New supposed name is "%s[%s].jpg"', name, counter)
+                    # Check if there is already the duplicate of this file
+                    if binary_comparison(path_to_picture, name_strings[name + '[{}]'.format(counter)]):
+                        return None
+                    counter += 1
+                log(logging.DEBUG, 'New supposed name is "%s[%s]"', name, counter)
+                return name + '[{}]'.format(counter)
+
+            log(logging.DEBUG, 'Supposed name is "%s.jpg"', supposed_name)
+            log(logging.DEBUG, 'Checking for duplicates...')
+
+            if already_has_this_name(supposed_name + '.jpg'):
+                return None
+
+            if supposed_name in name_strings:
+                supposed_name = get_new_order_name(supposed_name, None)
+                if not supposed_name:
+                    return None
+
+            # Check whether file with the same new name already exists in folder (avoiding duplicates).
+            # Folder was listed only once, so it doesn't cost a request to disk
+            if name_strings.exists(supposed_name):
+                # Check if files are duplicates
+                if binary_comparison(path_to_picture, name_strings.existing_path(supposed_name)):
+                    return None
+                else:
+                    # If there is file with this name but not a duplicate of already existing file
+                    log(logging.DEBUG, 'There is already another file with this name.')
+                    counter = 2
+                    if not may_have_copy():
+                        # Jump to the first free name, but check whether file already has one of names in between
+                        counter = name_strings.next_free_counter(supposed_name, counter, on_disk=True)
+                        match = re.fullmatch(re.escape(supposed_name.lower()) + r'\[([1-9]\d*)\]\.jpg',
+                                             original_filename.lower())
+                        if match and 2 <= int(match.group(1)) < counter and already_has_this_name(match.group(0)):
+                            return None
+                    # Try to give it new name with next order number
+                    while name_strings.exists(supposed_name + '[{}]'.format(counter)):
+                        # Check if file already has this name and script doesn't need to rename it
+                        if already_has_this_name(supposed_name + '[{}].jpg'.format(counter)):
+                            return None
+                        new_supposed_name = name_strings.existing_path(supposed_name + '[{}]'.format(counter))
+                        log(logging.DEBUG, 'New supposed name is "%s[%s].jpg"', supposed_name, counter)
+                        # To be on safe side check whether file to be renamed and file with this name that already
+                        # exists are duplicates
+                        if binary_comparison(path_to_picture, new_supposed_name):
+                            return None
+                        counter += 1
+
+                    # Second check whether supposed name has been picked up already (yes, it is 100% need second check)
+                    if supposed_name + '[{}]'.format(counter) in name_strings:
+                        supposed_name = get_new_order_name(supposed_name, supposed_name + '[{}]'.format(counter))
+                        if not supposed_name:
+                            return None
+                        log(logging.DEBUG, 'New supposed name is "%s[%s]"', supposed_name, counter)
+                        return supposed_name
+                    else:
+                        log(logging.DEBUG, 'New supposed name is "%s[%s]"', supposed_name, counter)
+                        supposed_name = supposed_name + '[{}]'.format(counter)
+
+            return supposed_name
+
+        # Get date of when picture was shot
+        date_time = get_shot_time(exif)
+
+        if date_time == '':  # If there is no date and time in EXIF
+            log(logging.INFO, '%s --- there is no EXIF data.', path_to_picture)
+
+            #  if file mame matches pattern like 22-04-05_1304 -> rename it to pattern like 2005-04-22 13-04
+            match = re.match(r'(\d\d-\d\d-\d\d)_(\d{4})', original_filename)
+            if match:
+                original_filename = datetime.strptime(match.group(0), '%d-%m-%y_%H%M').strftime('%Y-%m-%d %H-%M')
+
+            # Add "(no exif)" mark in order to know in advance there is no EXIF in photo in order not to spend time
+            # on opening it next time
+            if original_filename.lower().endswith('.jpg'):
+                original_filename = original_filename[:-4] + ' ' + tree_walker.NO_EXIF_MARK
+            elif original_filename.lower().endswith('.jpeg'):
+                original_filename = original_filename[:-5] + ' ' + tree_walker.NO_EXIF_MARK
+            else:
+                original_filename = original_filename + ' ' + tree_walker.NO_EXIF_MARK
+
+            return NoExifRecord(name_strings.folder, filename, original_filename)
+
+        # Get necessary tags from EXIF data
+        camera_brand = str(exif.get('Image Make', '')).strip()
+        camera_model = str(exif.get('Image Model', '')).strip()
+        lens_brand = str(exif.get('EXIF LensMake', '')).strip()
+        lens_model = str(exif.get('EXIF LensModel', '')).strip()
+
+        # Show raw data from EXIF
+        log(logging.DEBUG, '')
+        log(logging.DEBUG, 'Raw data from %s', path_to_picture)
+        log(logging.DEBUG, 'DateTime: %s Camera brand: %s Camera model: %s Lens brand: %s Lens model: %s',
+            date_time, camera_brand, camera_model, lens_brand, lens_model)
+
+        if camera_brand + camera_model + lens_brand + lens_model != '':
+            # Check if we have more appropriate name for every tag. Camera without brand in EXIF gets the same name
+            # for all photos, it is asked only once
+            camera_brand = self.check_tag(camera_brand, 'camera_brand')
+            camera_model = self.check_tag(camera_model, 'camera_model') if camera_model else camera_model
+            lens_brand = self.check_tag(lens_brand, 'lens_brand') if lens_brand else lens_brand
+            lens_model = self.check_tag(lens_model, 'lens_model') if lens_model else lens_model
+
+        # Make string 'name_string' out of photo date, camera model etc and put it in one list with path
+        # Example of name_string after loop:
+        # 2015:06:13 15:20:32 Canon Canon EOS 60D 17-50mm
+        name_string = ''
+        for entry in [date_time, camera_brand, camera_model, lens_brand, lens_model]:
+            if entry:
+                name_string += entry + ' '
+
+        # Replace not allowed characters before calling function
+        name_string = remove_repeated_words(name_string.replace(':', '-').replace('/', '')).strip()
+
+        with self._stage('check_duplicates'):
+            new_name = check_duplicates(name_string)
+        if not new_name:
+            return Duplicate(path_to_picture, found_copy) if found_copy else None
+
+        # All info about image, folder is stored once for all photos of folder
+        one_image_with_info = name_allocator.PhotoRecord(name_strings.folder, filename, new_name)
+
+        # Put final file name and it's full path in dictionary in order to be able to keep tracked of name that have
+        # been picked up during the session and to be able to perform binary comparison to figure out duplicates
+        name_strings.pick(new_name, filename)
+        log(logging.DEBUG, 'How it will be renamed: ')
+        log(logging.DEBUG, '%s.jpg\n', new_name)
+        return one_image_with_info
@@ -0,0 +1,100 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+# Counts how many times every stage of script was run, how long it took and how many bytes it read,
+# so it is clear where time of a slow run went: listing folders, reading EXIF, names of cameras,
+# comparing files, renaming or removing copies.
+# Stages can be nested (e.g. binary_comparison is called from check_duplicates), time of inner stage is
+# included in time of outer one.
+#
+# Usage:
+# stats = run_stats.RunStats()
+# @stats.timed('rename_photos') before function, 'with stats.stage('exif'):' around block of code
+# or 'for item in stats.timed_iter('os.walk', os.walk(path)):' for generators
+# stats.report() gives dict that can be saved as JSON
+
+import contextlib
+import functools
+import json
+import time
+
+
+class RunStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}  # name of stage -> [number of calls, seconds, bytes read]
+
+    def add(self, name, seconds=0.0, bytes_read=0, calls=1):
+        stage = self.stages.setdefault(name, [0, 0.0, 0])
+        stage[0] += calls
+        stage[1] += seconds
+        stage[2] += bytes_read
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        """
+        Decorator that adds every call of function to stage with this name
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.add(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def timed_iter(self, name, iterable):
+        """
+        Give items of iterable and add time spent on getting every item to stage with this name
+        (e.g. os.walk lists folders only when the next one is asked for)
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, time.perf_counter() - start, calls=0)
+                return
+            self.add(name, time.perf_counter() - start)
+            yield item
+
+    def report(self):
+        """
+        :return: dict with total time of run and calls, seconds and bytes read of every stage
+        """
+        return {'seconds': round(time.perf_counter() - self.started, 6),
+                'stages': {name: {'calls': calls, 'seconds': round(seconds, 6), 'bytes_read': bytes_read}
+                           for name, (calls, seconds, bytes_read) in sorted(self.stages.items())}}
+
+    def write_report(self, path):
+        with open(path, 'w', encoding='utf8') as f:
+            json.dump(self.report(), f, indent=2)
+
+
+def profile(function, path):
+    """
+    Run function under cProfile and save its statistics to file
+    (it can be read with 'python -m pstats path' or any viewer of cProfile files)
+
+    :param function: function without arguments
+    :param path: path to file for statistics
+    :return: what function returns
+    """
+    import cProfile
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function)
+    finally:
+        profiler.dump_stats(path)
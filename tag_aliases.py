@@ -0,0 +1,129 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+# Store of names that are used instead of camera and lens names from EXIF,
+# e.g 'NIKON CORPORATION' -> 'Nikon' or 'chiron' -> 'Mi MIx 2'.
+#
+# The whole store is loaded into memory once at start, so looking up tag is just a lookup in dict.
+# Every new alias is written to disk right away: the file is written next to the old one
+# and then replaces it, so the store is never left half-written if script crashes.
+#
+# Aliases can be exported to and imported from JSON or CSV file to share them between computers:
+# python tag_aliases.py export aliases.csv
+# python tag_aliases.py import aliases.csv
+
+import csv
+import json
+import os
+import sys
+
+DEFAULT_PATH = os.path.join('db', 'tags.json')
+OLD_SHELVE_PATH = os.path.join('db', 'tags_db')  # where aliases were kept by older versions of script
+
+
+class TagAliases:
+    def __init__(self, path=DEFAULT_PATH):
+        """
+        :param path: path to JSON file with aliases
+        """
+        self.path = path
+        if not os.path.exists(os.path.dirname(path)):
+            os.mkdir(os.path.dirname(path))
+
+        if os.path.exists(path):
+            with open(path, encoding='utf8') as f:
+                self.aliases = json.load(f)
+        else:
+            self.aliases = self._load_shelve()
+            if self.aliases:
+                self._save()
+
+    def _load_shelve(self):
+        """
+        Take aliases from shelve database that was used by older versions of script
+        """
+        import dbm
+        import shelve
+
+        try:
+            with shelve.open(OLD_SHELVE_PATH, flag='r') as old_db:
+                return {tag: name for tag, name in old_db.items() if tag != 'test'}
+        except dbm.error:
+            return {}
+
+    def _save(self):
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf8') as f:
+            json.dump(self.aliases, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+    def get(self, tag, default=None):
+        return self.aliases.get(tag, default)
+
+    def __getitem__(self, tag):
+        return self.aliases[tag]
+
+    def __setitem__(self, tag, name):
+        if self.aliases.get(tag) != name:
+            self.aliases[tag] = name
+            self._save()
+
+    def __contains__(self, tag):
+        return tag in self.aliases
+
+    def __len__(self):
+        return len(self.aliases)
+
+    def update(self, aliases):
+        """
+        Add many aliases at once and write them to disk only one time
+
+        :param aliases: dict where key is tag from EXIF and value is name to use instead
+        """
+        self.aliases.update(aliases)
+        self._save()
+
+    def close(self):
+        # Everything has already been written, method exists to be used like shelve object
+        pass
+
+    def export(self, path):
+        """
+        Save all aliases to JSON or CSV file (format depends on file extension)
+        """
+        if path.lower().endswith('.csv'):
+            with open(path, 'w', encoding='utf8', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['tag', 'name'])
+                for tag, name in sorted(self.aliases.items()):
+                    writer.writerow([tag, name])
+        else:
+            with open(path, 'w', encoding='utf8') as f:
+                json.dump(self.aliases, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+    def import_file(self, path):
+        """
+        Add aliases from JSON or CSV file (format depends on file extension). Existing aliases are overwritten.
+
+        :return: number of imported aliases
+        """
+        if path.lower().endswith('.csv'):
+            with open(path, encoding='utf8', newline='') as f:
+                aliases = {row['tag']: row['name'] for row in csv.DictReader(f)}
+        else:
+            with open(path, encoding='utf8') as f:
+                aliases = json.load(f)
+        self.update(aliases)
+        return len(aliases)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == 'export':
+        TagAliases().export(sys.argv[2])
+        print('Aliases were exported to ' + sys.argv[2])
+    elif len(sys.argv) == 3 and sys.argv[1] == 'import':
+        print('{} aliases were imported'.format(TagAliases().import_file(sys.argv[2])))
+    else:
+        print('Usage: python tag_aliases.py export|import path/to/file.json|csv')
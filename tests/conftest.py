@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+# Common fixtures: every test works in its own temporary folder (script keeps its databases and journals
+# in db/ of working folder) and makes small JPEG files with only those EXIF tags that names are made of.
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark  # noqa: E402
+
+CANON = ('2017:09:05 09:15:27', 'Canon', 'Canon EOS 80D', 'Canon', 'EF-S24mm f/2.8 STM')
+CANON_NAME = '2017-09-05 09-15-27 Canon EOS 80D EF-S24mm f2.8 STM'  # name photo with CANON exif gets
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def make_photo():
+    def make(path, seed=0, exif=CANON, size=2000):
+        """
+        :param path: path to file to write, its folder is created if it doesn't exist
+        :param seed: photos with the same seed (and exif) have the same content
+        :param exif: tuple (date and time, make, model, lens make, lens model) or None for photo without EXIF
+        :return: path
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(benchmark.make_jpeg(random.Random(seed), size, exif))
+        return str(path)
+    return make
+
+
+@pytest.fixture
+def write():
+    def write_file(path, data=b'photo'):
+        """
+        :param path: path to file to write, its folder is created if it doesn't exist
+        :param data: bytes to write
+        :return: path as string
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(str(path))), exist_ok=True)
+        with open(str(path), 'wb') as f:
+            f.write(data)
+        return str(path)
+    return write_file
+
+
+@pytest.fixture
+def renamer(monkeypatch):
+    """
+    photo_renamer module that never asks anything and starts with empty lists of copies
+    """
+    import photo_renamer
+
+    monkeypatch.setattr(photo_renamer, 'interactive', False)
+    monkeypatch.setattr(photo_renamer, 'unknown_camera', '')
+    monkeypatch.setattr(photo_renamer, 'images_to_delete', [])
+    monkeypatch.setattr(photo_renamer, 'copies', {})
+    return photo_renamer
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+
+import pytest
+
+import compare_files
+
+DATA = bytes(range(256)) * 40  # 10240 bytes, ten chunks of comparators below
+
+
+@pytest.fixture(params=[False, True], ids=['read', 'mmap'])
+def comparator(request):
+    return compare_files.FileComparator(chunk_size=1024, use_mmap=request.param)
+
+
+def test_equal_files_are_hashed_while_compared(comparator, write, workdir):
+    digest = hashlib.sha1()
+    assert comparator.same(write(workdir / 'a', DATA), write(workdir / 'b', DATA), digest)
+    assert digest.hexdigest() == hashlib.sha1(DATA).hexdigest()
+    assert comparator.bytes_read == 2 * len(DATA)
+
+
+def test_comparison_stops_on_first_different_chunk(comparator, write, workdir):
+    assert not comparator.same(write(workdir / 'a', DATA), write(workdir / 'b', b'x' + DATA[1:]))
+    assert comparator.bytes_read == 2 * 1024
+    assert not comparator.same(str(workdir / 'a'), write(workdir / 'c', DATA[:-1] + b'x'))
+    assert comparator.bytes_read == 2 * 1024 + 2 * len(DATA)
+    assert comparator.comparisons == 2
+
+
+def test_files_of_different_size_are_not_opened(comparator, write, workdir):
+    assert not comparator.same(write(workdir / 'a', DATA), write(workdir / 'b', DATA + b'x'))
+    assert comparator.rejected_by_size == 1 and comparator.bytes_read == 0
+
+
+def test_empty_files_are_equal(comparator, write, workdir):
+    assert comparator.same(write(workdir / 'a', b''), write(workdir / 'b', b''))
+    assert comparator.bytes_read == 0
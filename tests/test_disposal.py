@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+import disposal
+
+
+def test_delete(write, workdir):
+    paths = [write(workdir / 'photos' / 'a.jpg'), write(workdir / 'photos' / 'b.jpg')]
+    removed, failed = disposal.Disposer('delete').dispose(paths + [str(workdir / 'photos' / 'missing.jpg')])
+    assert removed == paths
+    assert [path for path, error in failed] == [str(workdir / 'photos' / 'missing.jpg')]
+    assert os.listdir(str(workdir / 'photos')) == []
+
+
+def test_unknown_kind():
+    with pytest.raises(ValueError):
+        disposal.Disposer('shred')
+
+
+def test_quarantine_keeps_full_path_of_file(write, workdir):
+    path = write(workdir / 'photos' / 'a.jpg')
+    os.mkdir(str(workdir / 'q'))
+    disposer = disposal.Disposer('quarantine', str(workdir / 'q'))
+    assert disposer.dispose([path]) == ([path], [])
+    moved = os.path.join(str(workdir / 'q'), disposer.run_name, os.path.abspath(path).lstrip(os.sep))
+    assert os.path.isfile(moved)
+
+
+def test_quarantine_goes_to_highest_writable_folder(write, workdir, monkeypatch):
+    # Only folders inside workdir can be written to, like home folder of user on system disk
+    writable = str(workdir)
+    monkeypatch.setattr(os, 'access', lambda path, mode: os.path.abspath(path).startswith(writable))
+    path = write(workdir / 'photos' / 'a.jpg')
+    disposer = disposal.Disposer('quarantine')
+    assert disposer.dispose([path]) == ([path], [])
+    assert os.path.isdir(os.path.join(writable, disposal.QUARANTINE_NAME, disposer.run_name))
+
+
+def test_quarantine_fails_once_without_writable_folder(write, workdir, monkeypatch):
+    monkeypatch.setattr(os, 'access', lambda path, mode: False)
+    paths = [write(workdir / 'photos' / 'a.jpg'), write(workdir / 'photos' / 'b.jpg')]
+    removed, failed = disposal.Disposer('quarantine').dispose(paths)
+    assert removed == []
+    assert [path for path, error in failed] == paths
+    assert failed[0][1] is failed[1][1]
+    assert '--quarantine-folder' in str(failed[0][1])
+    assert all(os.path.isfile(path) for path in paths)
+
+
+def test_quarantine_never_replaces_file_with_the_same_name(write, workdir):
+    os.mkdir(str(workdir / 'q'))
+    disposer = disposal.Disposer('quarantine', str(workdir / 'q'))
+    path = str(workdir / 'photos' / 'a.jpg')
+    for content in (b'first', b'second'):
+        write(path, content)
+        assert disposer.dispose([path]) == ([path], [])
+
+    folder = os.path.join(str(workdir / 'q'), disposer.run_name, os.path.dirname(os.path.abspath(path)).lstrip(os.sep))
+    assert sorted(os.listdir(folder)) == ['a.jpg', 'a[2].jpg']
+    with open(os.path.join(folder, 'a.jpg'), 'rb') as f:
+        assert f.read() == b'first'
+
+
+def test_batch_moves_copies_from_other_folders_to_quarantine(renamer, make_photo, workdir, monkeypatch):
+    os.mkdir(str(workdir / 'q'))
+    monkeypatch.setattr(renamer, 'DISPOSAL', 'quarantine')
+    monkeypatch.setattr(renamer, 'QUARANTINE_FOLDER', str(workdir / 'q'))
+    make_photo(workdir / 'photos' / 'a' / 'IMG_1.jpg', 1)
+    make_photo(workdir / 'photos' / 'b' / 'IMG_1 copy.jpg', 1)
+    make_photo(workdir / 'photos' / 'b' / 'IMG_2.jpg', 2)
+
+    renamer.batch_main('photos', ask=False)
+    # Copy that is met later is removed, it depends on order of folders on disk
+    left = [name for folder in ('a', 'b') for name in os.listdir(str(workdir / 'photos' / folder))]
+    assert len(left) == 2 and 'IMG_1.jpg' not in left and 'IMG_1 copy.jpg' not in left
+    quarantined = [name for _, _, names in os.walk(str(workdir / 'q')) for name in names]
+    assert len(quarantined) == 1 and quarantined[0] in ('IMG_1.jpg', 'IMG_1 copy.jpg')
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import duplicate_index
+
+
+def test_file_of_unique_size_is_never_read(write, workdir):
+    index = duplicate_index.DuplicateIndex(None)
+    assert index.add(write(workdir / 'a', b'a' * 100)) is None
+    assert index.add(write(workdir / 'b', b'b' * 200)) is None
+    assert index.bytes_read == 0
+
+
+def test_copy_is_found_only_in_its_bucket(write, workdir):
+    index = duplicate_index.DuplicateIndex(None)
+    first = write(workdir / 'x' / 'first', b'a' * 100)
+    other = write(workdir / 'x' / 'other', b'b' * 100)
+    copy = write(workdir / 'y' / 'copy', b'a' * 100)
+
+    assert index.add(first) is None
+    assert index.add(other) is None
+    assert index.add(copy) == first
+    # Files of the same size with different partial hashes are in different buckets
+    assert len(index.buckets) == 2
+    assert index.has_copy(first) is True
+    assert index.has_copy(other) is False
+    assert index.has_copy(first, str(workdir / 'x')) is False
+
+
+def test_renamed_and_removed_files(write, workdir):
+    index = duplicate_index.DuplicateIndex(None)
+    first = write(workdir / 'first', b'a' * 100)
+    index.add(first)
+    renamed = str(workdir / 'renamed')
+    os.rename(first, renamed)
+    index.moved(first, renamed)
+    assert index.add(write(workdir / 'copy', b'a' * 100)) == renamed
+
+    os.remove(renamed)
+    assert index.add(write(workdir / 'copy2', b'a' * 100)) == str(workdir / 'copy')
+    assert renamed not in index.keys
+
+
+def test_hard_link_is_not_a_copy_of_its_file(write, workdir):
+    index = duplicate_index.DuplicateIndex(None)
+    first = write(workdir / 'first', b'a' * 100)
+    link = str(workdir / 'link')
+    os.link(first, link)
+    assert index.add(first) is None
+    assert index.add(link) is None
+    assert index.has_copy(first) is False
+
+
+def test_files_of_previous_runs_are_remembered(write, workdir):
+    first = write(workdir / 'photos' / 'first', b'a' * 100)
+    index = duplicate_index.DuplicateIndex(str(workdir / 'db' / 'hash_db'))
+    index.add(first)
+    index.add(write(workdir / 'photos' / 'other', b'b' * 100))
+    index.close()
+
+    index = duplicate_index.DuplicateIndex(str(workdir / 'db' / 'hash_db'), remember_folder=str(workdir))
+    assert index.add(write(workdir / 'new' / 'copy', b'a' * 100)) == first
+    index.close()
+
+
+def test_files_of_other_trees_are_not_remembered(write, workdir):
+    index = duplicate_index.DuplicateIndex(str(workdir / 'db' / 'hash_db'))
+    index.add(write(workdir / 'photos_b' / 'first', b'a' * 100))
+    index.close()
+
+    index = duplicate_index.DuplicateIndex(str(workdir / 'db' / 'hash_db'), remember_folder=str(workdir / 'photos'))
+    assert not index.keys
+    assert index.add(write(workdir / 'photos' / 'copy', b'a' * 100)) is None
+    index.close()
+
+
+def test_forgotten_and_removed_files_are_dropped_from_db(write, workdir):
+    forgotten = write(workdir / 'photos' / 'forgotten', b'a' * 100)
+    removed = write(workdir / 'photos' / 'removed', b'b' * 100)
+    kept = write(workdir / 'photos' / 'kept', b'c' * 100)
+    index = duplicate_index.DuplicateIndex(str(workdir / 'db' / 'hash_db'))
+    for path in (forgotten, removed, kept):
+        index.add(path)
+    index.close()
+
+    index = duplicate_index.DuplicateIndex(str(workdir / 'db' / 'hash_db'))
+    index.add(forgotten)
+    index.forget(forgotten)
+    index.close()
+    os.remove(removed)
+
+    # Files are not checked at start, removed one is dropped when it is met as a candidate
+    index = duplicate_index.DuplicateIndex(str(workdir / 'db' / 'hash_db'), remember_folder=str(workdir))
+    assert sorted(index.keys) == sorted([removed, kept])
+    assert index.add(write(workdir / 'new' / 'not_a_copy', b'b' * 100)) is None
+    assert removed not in index.keys
+    assert sorted(index.db.keys()) == [kept]  # records of this run are written on close
+    index.close()
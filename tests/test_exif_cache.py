@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import exif_cache
+import fast_exif
+
+
+def test_tags_are_taken_from_cache_while_file_is_the_same(make_photo, workdir):
+    path = make_photo(workdir / 'photos' / 'IMG_1.jpg')
+    cache = exif_cache.ExifCache()
+    assert cache.get(path) is None
+    cache.put(path, fast_exif.read_tags(path))
+    cache.close()
+
+    cache = exif_cache.ExifCache()
+    assert cache.get(path)['Image Model'] == 'Canon EOS 80D'
+    os.utime(path, ns=(1, 1))  # file has been edited
+    assert cache.get(path) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert '50.0% hit rate' in cache.stats()
+    cache.close()
+
+
+def test_file_without_exif_is_cached_as_well(make_photo, workdir):
+    path = make_photo(workdir / 'IMG_1.jpg', exif=None)
+    cache = exif_cache.ExifCache()
+    cache.put(path, fast_exif.read_tags(path))
+    # Empty tags mean that file has no exif, it is not read once again
+    assert cache.get(path) == {}
+    assert cache.hits == 1
+    cache.close()
+
+
+def test_tags_follow_renamed_file(make_photo, workdir):
+    path = make_photo(workdir / 'IMG_1.jpg')
+    cache = exif_cache.ExifCache()
+    cache.put('IMG_1.jpg', fast_exif.read_tags(path))  # relative and absolute paths are the same file
+    new_path = str(workdir / 'new.jpg')
+    os.rename(path, new_path)
+    cache.moved(path, 'new.jpg')
+    assert cache.get(new_path)['EXIF DateTimeOriginal'] == '2017:09:05 09:15:27'
+    make_photo(path)  # new file with the old name
+    assert cache.get(path) is None
+    cache.close()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+import random
+import struct
+
+import pytest
+
+import benchmark
+import fast_exif
+from conftest import CANON
+
+NO_LENS = ('2019:12:31 23:59:59', 'NIKON CORPORATION', 'NIKON D750', '', '')
+SHORT_VALUES = ('2019:12:31 23:59:59', 'LG', 'G6', '', '')  # values that fit into entries of IFD
+GARBAGE_AFTER_NULL = ('2019:12:31 23:59:59', 'Canon\0junk', 'Canon EOS 80D', '', '')
+
+
+def app0(size):
+    return b'\xff\xe0' + struct.pack('>H', size + 2) + b'JFIF\0'.ljust(size, b'\0')
+
+
+def jpeg(exif, before_exif=b''):
+    data = benchmark.make_jpeg(random.Random(0), 1000, exif)
+    return data[:2] + before_exif + data[2:]
+
+
+def assert_same_as_exifread(path):
+    with open(path, 'rb') as f:
+        expected = fast_exif.read_tags_with_exifread(f)
+    assert fast_exif.read_tags(path) == expected
+    return expected
+
+
+@pytest.mark.parametrize('exif', [CANON, NO_LENS, SHORT_VALUES, GARBAGE_AFTER_NULL])
+def test_tags_are_the_same_as_from_exifread(exif, workdir):
+    path = workdir / 'photo.jpg'
+    path.write_bytes(jpeg(exif))
+    tags = assert_same_as_exifread(str(path))
+    assert tags['EXIF DateTimeOriginal'] == exif[0]
+
+
+def test_exif_after_other_segments_and_beyond_first_read(workdir):
+    path = workdir / 'photo.jpg'
+    path.write_bytes(jpeg(CANON, app0(14) + app0(2 * fast_exif.FIRST_READ)))
+    assert assert_same_as_exifread(str(path))['Image Model'] == 'Canon EOS 80D'
+
+
+def test_no_exif(workdir):
+    path = workdir / 'photo.jpg'
+    path.write_bytes(jpeg(None))
+    assert fast_exif.read_tags(str(path)) == {}
+
+
+def test_unusual_tag_type_falls_back_to_exifread(workdir):
+    # Make is written as UNDEFINED instead of ASCII, fast reader doesn't decode such tags itself
+    path = workdir / 'photo.jpg'
+    path.write_bytes(jpeg(CANON).replace(b'\x01\x0f\x00\x02', b'\x01\x0f\x00\x07', 1))
+    assert 'Image Make' in assert_same_as_exifread(str(path))
+
+
+def test_bytes_read_are_counted(workdir):
+    path = workdir / 'photo.jpg'
+    path.write_bytes(jpeg(CANON))
+    tags, bytes_read = fast_exif.read_tags_counted(str(path))
+    assert tags == fast_exif.read_tags(str(path))
+    assert 0 < bytes_read <= fast_exif.FIRST_READ
+
+
+def test_tiff_is_found_in_app1(workdir):
+    path = workdir / 'photo.jpg'
+    path.write_bytes(jpeg(CANON, app0(14)))
+    with open(str(path), 'rb') as f:
+        assert fast_exif.find_tiff(f)[:2] in (b'II', b'MM')
+    path.write_bytes(jpeg(None))
+    with open(str(path), 'rb') as f:
+        assert fast_exif.find_tiff(f) is None
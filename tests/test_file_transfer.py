@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import errno
+import os
+
+import pytest
+
+import file_transfer
+
+DATA = bytes(range(256)) * 1000
+
+
+def copy(write, workdir, data=DATA):
+    src = write(workdir / 'src.jpg', data)
+    with open(src, 'rb') as f_src, open(str(workdir / 'dst.jpg'), 'wb') as f_dst:
+        file_transfer.copy_contents(f_src.fileno(), f_dst.fileno(), len(data))
+    with open(str(workdir / 'dst.jpg'), 'rb') as f:
+        return f.read()
+
+
+def unsupported(*args):
+    raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+
+def test_kernel_copy(write, workdir):
+    assert copy(write, workdir) == DATA
+
+
+def test_fallback_to_sendfile_and_to_read_write(write, workdir, monkeypatch):
+    calls = []
+    monkeypatch.setattr(file_transfer, '_copy_file_range', unsupported)
+    original_sendfile = file_transfer._sendfile
+
+    def sendfile(*args):
+        calls.append('sendfile')
+        return original_sendfile(*args)
+
+    monkeypatch.setattr(file_transfer, '_sendfile', sendfile)
+    assert copy(write, workdir) == DATA
+    assert calls
+
+    monkeypatch.setattr(file_transfer, '_sendfile', unsupported)
+    monkeypatch.setattr(file_transfer, 'CHUNK_SIZE', 1000)  # many chunks
+    assert copy(write, workdir) == DATA
+
+
+def test_next_way_goes_on_from_the_same_place(write, workdir, monkeypatch):
+    # The first way copies only a part of file and then copies nothing, like copy_file_range on some file systems
+    def partial_copy(src_fd, dst_fd, offset, count):
+        return file_transfer._read_write(src_fd, dst_fd, offset, min(count, 1000)) if offset < 3000 else 0
+
+    monkeypatch.setattr(file_transfer, '_copy_file_range', partial_copy)
+    assert copy(write, workdir) == DATA
+
+
+def test_real_error_is_not_hidden_by_fallback(write, workdir, monkeypatch):
+    def broken(*args):
+        raise OSError(errno.EIO, os.strerror(errno.EIO))
+
+    monkeypatch.setattr(file_transfer, '_copy_file_range', broken)
+    with pytest.raises(OSError) as error:
+        copy(write, workdir)
+    assert error.value.errno == errno.EIO
+
+
+def test_move_keeps_time_and_removes_original(write, workdir):
+    src = write(workdir / 'src.jpg', DATA)
+    os.utime(src, ns=(1500000000000000000, 1500000000000000000))
+    dst = str(workdir / 'dst.jpg')
+    file_transfer.move_across_devices(src, dst)
+    assert not os.path.exists(src)
+    assert os.stat(dst).st_mtime_ns == 1500000000000000000
+    assert not os.path.exists(dst + file_transfer.PART_SUFFIX)
+
+
+def test_move_never_replaces_and_keeps_original_on_error(write, workdir):
+    src = write(workdir / 'src.jpg', DATA)
+    existing = write(workdir / 'existing.jpg', b'other')
+    with pytest.raises(FileExistsError):
+        file_transfer.move_across_devices(src, existing)
+    assert os.path.exists(src)
+
+    class DifferentCopy:
+        def same(self, first, second):
+            return False
+
+    dst = str(workdir / 'dst.jpg')
+    with pytest.raises(OSError):
+        file_transfer.move_across_devices(src, dst, DifferentCopy())
+    assert os.path.exists(src)
+    assert not os.path.exists(dst) and not os.path.exists(dst + file_transfer.PART_SUFFIX)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import logging
+import os
+import time
+
+import handle_logs
+
+
+def test_configure_changes_level_of_both_loggers():
+    log_file, log_console = logging.getLogger('test_file'), logging.getLogger('test_console')
+    handle_logs.configure(log_file, logging.WARNING, log_console=log_console)
+    assert log_file.level == log_console.level == logging.WARNING
+    assert not log_console.isEnabledFor(logging.DEBUG)
+
+
+def write_logs(folder, names, days_ago=0):
+    """
+    Write logs of previous runs, every next one is newer
+
+    :return: list of paths
+    """
+    os.makedirs(str(folder), exist_ok=True)
+    paths = []
+    for i, name in enumerate(names):
+        path = os.path.join(str(folder), name)
+        with open(path, 'w') as f:
+            f.write('message of run {}\n'.format(i) * 100)
+        created = time.time() - days_ago * 24 * 3600 + i
+        os.utime(path, (created, created))
+        paths.append(path)
+    return paths
+
+
+def test_index_is_rebuilt_from_any_files_from_the_oldest(workdir):
+    write_logs(workdir / 'log', ['zzz.txt', 'notes', 'log_2019-01-01__10h00m.txt.gz'])
+    open(str(workdir / 'log' / 'index.json.123.tmp'), 'w').close()  # left by run that was killed
+    store = handle_logs.LogStore('log')
+    assert [log['name'] for log in store.logs] == ['zzz.txt', 'notes', 'log_2019-01-01__10h00m.txt.gz']
+    assert all(log['closed'] for log in store.logs)
+
+
+def test_finished_logs_are_compressed_but_not_current_one(workdir):
+    write_logs(workdir / 'log', ['old.txt'])
+    store = handle_logs.LogStore('log')
+    current = store.new_log()
+    store.close_log()  # closed, but it is still log of this run
+    assert store.rotate(10 * 1024 ** 2) == []
+    assert sorted(os.listdir(str(workdir / 'log'))) == sorted(['index.json', 'old.txt.gz', os.path.basename(current)])
+    with gzip.open(str(workdir / 'log' / 'old.txt.gz'), 'rt') as f:
+        assert f.readline() == 'message of run 0\n'
+    assert [log['name'] for log in handle_logs.LogStore('log').logs] == ['old.txt.gz', os.path.basename(current)]
+
+
+def test_the_oldest_logs_are_removed_when_they_take_too_much(workdir):
+    write_logs(workdir / 'log', ['1.txt', '2.txt', '3.txt'])
+    store = handle_logs.LogStore('log')
+    current = os.path.basename(store.new_log())
+    store.rotate(10 * 1024 ** 2)
+    sizes = {log['name']: log['size'] for log in store.logs}
+
+    # Room for the newest compressed log only, current log is never removed even if it doesn't fit
+    assert store.rotate(sizes['3.txt.gz']) == ['1.txt.gz', '2.txt.gz']
+    assert sorted(os.listdir(str(workdir / 'log'))) == sorted(['index.json', '3.txt.gz', current])
+    assert store.rotate(0) == ['3.txt.gz']
+    assert [log['name'] for log in store.logs] == [current]
+
+
+def test_logs_older_than_max_age_are_removed(workdir):
+    write_logs(workdir / 'log', ['old.txt'], days_ago=10)
+    write_logs(workdir / 'log', ['new.txt'], days_ago=1)
+    store = handle_logs.LogStore('log')
+    assert store.rotate(10 * 1024 ** 2, max_age_days=5) == ['old.txt.gz']
+    assert sorted(os.listdir(str(workdir / 'log'))) == ['index.json', 'new.txt.gz']
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+from conftest import CANON_NAME
+
+OTHER = ('2018:01:02 03:04:05', 'Canon', 'Canon EOS 80D', 'Canon', 'EF-S24mm f/2.8 STM')
+OTHER_NAME = '2018-01-02 03-04-05 Canon EOS 80D EF-S24mm f2.8 STM'
+
+
+def test_folder_processed_with_include_is_not_skipped_next_time(renamer, make_photo, workdir):
+    folder = workdir / 'photos'
+    make_photo(folder / 'IMG_1.jpg', 1)
+    make_photo(folder / 'DSC_2.jpg', 2, exif=OTHER)
+
+    renamer.batch_main('photos', ask=False, incremental=True, include=['IMG_*'])
+    assert sorted(os.listdir(str(folder))) == sorted([CANON_NAME + '.jpg', 'DSC_2.jpg'])
+
+    renamer.batch_main('photos', ask=False, incremental=True)
+    assert sorted(os.listdir(str(folder))) == sorted([CANON_NAME + '.jpg', OTHER_NAME + '.jpg'])
+
+
+def test_the_same_tree_given_relative_and_absolute_is_not_a_copy_of_itself(renamer, make_photo, workdir,
+                                                                          monkeypatch):
+    os.mkdir(str(workdir / 'q'))
+    monkeypatch.setattr(renamer, 'DISPOSAL', 'quarantine')
+    monkeypatch.setattr(renamer, 'QUARANTINE_FOLDER', str(workdir / 'q'))
+    folder = workdir / 'photos'
+    make_photo(folder / 'IMG_1.jpg', 1)
+    make_photo(folder / 'DSC_2.jpg', 2, exif=OTHER)
+
+    renamer.batch_main('photos', ask=False, incremental=True)
+    make_photo(folder / 'IMG_3.jpg', 3)  # folder has to be walked through once again
+    renamer.batch_main(str(folder), ask=False, incremental=True)
+    assert sorted(os.listdir(str(folder))) == sorted([CANON_NAME + '.jpg', CANON_NAME + '[2].jpg',
+                                                      OTHER_NAME + '.jpg'])
+    assert not [name for _, _, names in os.walk(str(workdir / 'q')) for name in names]
+
+
+def test_photos_of_other_trees_are_not_taken_for_copies(renamer, make_photo, workdir):
+    make_photo(workdir / 'photos_b' / 'IMG_1.jpg', 1)
+    renamer.batch_main('photos_b', ask=False, incremental=True)
+
+    make_photo(workdir / 'photos' / 'IMG_1.jpg', 1)  # the same photo in a library that has nothing to do with it
+    renamer.batch_main('photos', ask=False, incremental=True)
+    assert os.listdir(str(workdir / 'photos')) == [CANON_NAME + '.jpg']
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import name_allocator
+
+
+def test_names_on_disk_are_case_insensitive(workdir):
+    allocator = name_allocator.NameAllocator(str(workdir), listing=['Photo.JPG', 'other.txt'])
+    assert allocator.exists('photo') and allocator.exists('PHOTO')
+    assert not allocator.exists('other')
+    assert allocator.existing_path('PHOTO') == os.path.join(str(workdir), 'Photo.JPG')
+
+
+def test_picked_names_keep_only_file_name(workdir):
+    allocator = name_allocator.NameAllocator(str(workdir), listing=[])
+    allocator['new name'] = os.path.join(str(workdir), 'IMG_1.jpg')
+    allocator.pick('new name[2]', 'IMG_2.jpg')
+    assert dict.__getitem__(allocator, 'new name') == 'IMG_1.jpg'
+    assert allocator['new name[2]'] == os.path.join(str(workdir), 'IMG_2.jpg')
+
+
+def test_next_free_counter_remembers_taken_numbers(workdir):
+    listing = ['shot.jpg'] + ['shot[{}].jpg'.format(number) for number in range(2, 6)]
+    allocator = name_allocator.NameAllocator(str(workdir), listing=listing)
+    assert allocator.next_free_counter('shot', on_disk=True) == 6
+    assert allocator.free_counters[('shot', True)] == 6
+    # Names picked up in this session are counted separately from names on disk
+    assert allocator.next_free_counter('shot') == 2
+    allocator.pick('shot[2]', 'IMG_1.jpg')
+    allocator.pick('shot[3]', 'IMG_2.jpg')
+    assert allocator.next_free_counter('shot') == 4
+    # Search that starts further doesn't spoil what is known about numbers from 2
+    assert allocator.next_free_counter('shot', 10, on_disk=True) == 10
+    assert allocator.next_free_counter('shot', on_disk=True) == 6
+
+
+def test_photo_record(workdir):
+    record = name_allocator.PhotoRecord(str(workdir), 'IMG_1.jpg', 'new name')
+    path, new_name = record
+    assert path == record.path == os.path.join(str(workdir), 'IMG_1.jpg')
+    assert new_name == 'new name'
+    assert record.new_path == os.path.join(str(workdir), 'new name.jpg')
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import json
+import struct
+
+import duplicate_index
+import renamer_engine
+import thumbnail_hash
+from conftest import CANON_NAME
+
+
+def add_frame(path, width, height):
+    """
+    Put frame header (SOF0 of 3-component image) before image data of file made by make_photo
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    frame = b'\xff\xc0\x00\x11\x08' + struct.pack('>HH', height, width) + b'\x03\x01\x22\x00\x02\x11\x01\x03\x11\x01'
+    start_of_scan = data.index(b'\xff\xda\x00\x02')
+    with open(path, 'wb') as f:
+        f.write(data[:start_of_scan] + frame + data[start_of_scan:])
+    return path
+
+
+def test_image_size_is_read_from_frame_header(make_photo, workdir):
+    photo = add_frame(make_photo(workdir / 'a.jpg'), 6000, 4000)
+    assert thumbnail_hash.image_size(photo) == (6000, 4000)
+
+
+def test_image_size_of_file_without_frame_or_not_jpeg(make_photo, workdir):
+    assert thumbnail_hash.image_size(make_photo(workdir / 'a.jpg')) is None
+    (workdir / 'b.jpg').write_bytes(b'not a jpeg at all')
+    assert thumbnail_hash.image_size(str(workdir / 'b.jpg')) is None
+
+
+def test_larger_photo_by_pixels_then_by_file_size(make_photo, workdir):
+    small = add_frame(make_photo(workdir / 'small.jpg', 1, size=5000), 1200, 800)
+    big = add_frame(make_photo(workdir / 'big.jpg', 2, size=2000), 6000, 4000)
+    assert renamer_engine.larger_photo(small, big) == big
+    assert renamer_engine.larger_photo(big, small) == big
+
+    first = add_frame(make_photo(workdir / 'first.jpg', 3, size=2000), 1200, 800)
+    second = add_frame(make_photo(workdir / 'second.jpg', 4, size=3000), 1200, 800)
+    assert renamer_engine.larger_photo(first, second) == second
+    same = add_frame(make_photo(workdir / 'same.jpg', 5, size=2000), 1200, 800)
+    assert renamer_engine.larger_photo(first, same) == first
+
+
+def test_near_duplicates_are_reported_and_both_are_named(make_photo, workdir, monkeypatch):
+    # Thumbnails of both photos give the same hash, only sizes of images differ
+    monkeypatch.setattr(thumbnail_hash, 'thumbnail_hash', lambda path: 0x0123456789abcdef)
+    small = add_frame(make_photo(workdir / 'a' / 'IMG_1.jpg', 1), 1200, 800)
+    big = add_frame(make_photo(workdir / 'b' / 'IMG_2.jpg', 2), 6000, 4000)
+    dup_index = duplicate_index.DuplicateIndex(None, similar_threshold=thumbnail_hash.THRESHOLD)
+    engine = renamer_engine.PhotoRenamer(lambda tag, tag_type: tag, dup_index)
+
+    plan = engine.plan([small, big])
+    assert plan.duplicates == []
+    assert [(pair.path, pair.copy_of) for pair in plan.near_duplicates] == [(small, big)]
+    assert sorted(item.path for item in plan.renames) == [small, big]
+
+
+def test_report_has_new_absolute_paths_of_both_photos(renamer, make_photo, workdir, monkeypatch):
+    monkeypatch.setattr(thumbnail_hash, 'thumbnail_hash', lambda path: 0x0123456789abcdef)
+    monkeypatch.setattr(renamer, 'NEAR_DUPLICATES', thumbnail_hash.THRESHOLD)
+    add_frame(make_photo(workdir / 'photos' / 'a' / 'IMG_1.jpg', 1), 1200, 800)
+    add_frame(make_photo(workdir / 'photos' / 'b' / 'IMG_2.jpg', 2), 6000, 4000)
+
+    renamer.batch_main('photos', ask=False)  # relative path, but index of duplicates keeps absolute ones
+    with open(renamer.NEAR_DUPLICATES_REPORT, encoding='utf8') as f:
+        assert [json.loads(line) for line in f] == [
+            {'smaller': str(workdir / 'photos' / 'a' / (CANON_NAME + '.jpg')),
+             'larger': str(workdir / 'photos' / 'b' / (CANON_NAME + '.jpg'))}]
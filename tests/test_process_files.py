@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import duplicate_index
+import exif_cache
+import name_allocator
+import run_stats
+from conftest import CANON_NAME
+
+
+def process(renamer, folder, filenames=None):
+    dup_index = duplicate_index.DuplicateIndex(None)
+    tags_cache = exif_cache.ExifCache()
+    try:
+        return renamer.process_files(str(folder), {}, name_allocator.NameAllocator(str(folder)), dup_index,
+                                     tags_cache, filenames)[0]
+    finally:
+        tags_cache.close()
+
+
+def test_burst_gets_order_numbers(renamer, make_photo, workdir):
+    for seed in range(3):
+        make_photo(workdir / 'photos' / 'IMG_{}.jpg'.format(seed), seed)
+    new_names = sorted(item.new_name for item in process(renamer, workdir / 'photos'))
+    assert new_names == [CANON_NAME, CANON_NAME + '[2]', CANON_NAME + '[3]']
+
+
+def test_copy_in_the_same_folder_is_not_renamed(renamer, make_photo, workdir):
+    make_photo(workdir / 'photos' / 'IMG_1.jpg', 1)
+    make_photo(workdir / 'photos' / 'IMG_2.jpg', 1)
+    assert len(process(renamer, workdir / 'photos')) == 1
+    assert len(renamer.images_to_delete) == 1
+
+
+def test_photo_with_right_name_is_left_alone(renamer, make_photo, workdir):
+    make_photo(workdir / 'photos' / (CANON_NAME + '.jpg'), 1)
+    assert process(renamer, workdir / 'photos') == []
+    assert renamer.images_to_delete == []
+
+
+def test_watched_photo_next_to_existing_copy_is_duplicate(renamer, make_photo, workdir):
+    # Only the new file is given like in watch mode, its copy has been renamed before and is not in index
+    folder = workdir / 'photos'
+    make_photo(folder / (CANON_NAME + '.jpg'), 1)
+    make_photo(folder / (CANON_NAME + '[2].jpg'), 2)
+    new_photo = make_photo(folder / 'IMG_1.jpg', 2)
+
+    assert process(renamer, folder, ['IMG_1.jpg']) == []
+    assert renamer.images_to_delete == [new_photo]
+    assert renamer.copies[new_photo] == os.path.join(str(folder), CANON_NAME + '[2].jpg')
+
+
+def test_photo_without_exif_gets_mark(renamer, make_photo, workdir):
+    make_photo(workdir / 'photos' / 'scan.jpg', 1, exif=None)
+    [item] = process(renamer, workdir / 'photos')
+    assert item.new_name == 'scan (no exif)'
+
+
+def test_bytes_read_for_exif_are_counted(renamer, make_photo, workdir, monkeypatch):
+    monkeypatch.setattr(renamer, 'stats', run_stats.RunStats())
+    make_photo(workdir / 'photos' / 'IMG_1.jpg', 1)
+    process(renamer, workdir / 'photos')
+    calls, seconds, bytes_read = renamer.stats.stages['exif']
+    assert calls == 1 and bytes_read > 0
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+
+import rename_journal
+
+
+def read(path):
+    with open(str(path), 'rb') as f:
+        return f.read()
+
+
+def write_journal(path, records, cut_line=''):
+    with open(str(path), 'w', encoding='utf8') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+        f.write(cut_line)
+    return str(path)
+
+
+def test_apply_never_replaces_files(write, workdir):
+    first, second = write(workdir / 'a.jpg', b'a'), write(workdir / 'b.jpg', b'b')
+    journal = rename_journal.RenameJournal()
+    errors = journal.apply([(first, str(workdir / 'c.jpg')), (second, str(workdir / 'c.jpg'))])
+    journal.close()
+    assert errors[0] is None and isinstance(errors[1], FileExistsError)
+    assert read(workdir / 'c.jpg') == b'a' and read(second) == b'b'
+
+    planned, done, finished = rename_journal.read_journal(journal.path)
+    assert [record['seq'] for record in planned] == [1, 2]
+    assert done == {1} and finished
+
+
+def test_undo_renames_files_back(write, workdir):
+    first, second = write(workdir / 'a.jpg', b'a'), write(workdir / 'b.jpg', b'b')
+    journal = rename_journal.RenameJournal()
+    # The second move takes the old name of the first file, so moves are undone from the last one
+    journal.apply([(first, str(workdir / 'c.jpg')), (second, first)])
+    journal.close()
+
+    assert rename_journal.undo(journal.path) == (2, [])
+    assert read(first) == b'a' and read(second) == b'b'
+    assert not os.path.exists(str(workdir / 'c.jpg'))
+    assert os.path.exists(journal.path[:-len('.jsonl')] + '.undone')
+
+
+def test_resume_does_only_moves_that_were_not_done(write, workdir):
+    done = write(workdir / 'done_new.jpg', b'1')  # moved and marked in journal
+    unmarked = write(workdir / 'unmarked_new.jpg', b'2')  # moved right before script was killed
+    left = write(workdir / 'left.jpg', b'3')  # not moved
+    copied = write(workdir / 'copied.jpg', b'4')  # copied to another disk, but not removed
+    copy = write(workdir / 'copy_new.jpg', b'4')
+    path = write_journal(workdir / 'renames.jsonl', [
+        {'seq': 1, 'src': str(workdir / 'done.jpg'), 'dst': done},
+        {'seq': 2, 'src': str(workdir / 'unmarked.jpg'), 'dst': unmarked},
+        {'seq': 3, 'src': left, 'dst': str(workdir / 'left_new.jpg')},
+        {'seq': 4, 'src': copied, 'dst': copy, 'copy': True},
+        {'done': 1}], cut_line='{"done": ')
+
+    assert rename_journal.resume(path) == (2, [])
+    assert read(workdir / 'left_new.jpg') == b'3' and not os.path.exists(left)
+    assert read(copy) == b'4' and not os.path.exists(copied)
+    assert read(done) == b'1' and read(unmarked) == b'2'
+    assert rename_journal.read_journal(path)[2]
+
+
+def test_worker_journals_belong_to_run(workdir):
+    path = os.path.join('db', 'journal', 'renames_2020-01-01__10h00m00s_42.jsonl')
+    worker = rename_journal.worker_path(path, 7)
+    assert worker.endswith('renames_2020-01-01__10h00m00s_42.w7.jsonl')
+    assert rename_journal.run_of(worker) == rename_journal.run_of(path)
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+import rename_plan
+from conftest import CANON_NAME
+
+
+@pytest.mark.parametrize('name', ['plan.jsonl', 'plan.csv'])
+def test_plan_round_trip(name, workdir):
+    root = workdir / 'photos'
+    os.makedirs(str(root / 'sub'))
+    plan = rename_plan.PlanWriter(name, str(root))
+    plan.rename(str(root / 'sub' / 'IMG_1, копия.jpg'), str(root / 'sub' / 'new "name".jpg'), (100, 12345))
+    plan.delete(str(root / 'IMG_2.jpg'), str(root / 'sub' / 'new "name".jpg'), (200, 67890))
+    plan.close()
+    assert (plan.renames, plan.deletes) == (1, 1)
+
+    rename, delete = rename_plan.read_plan(name)
+    assert rename['action'] == 'rename' and rename['path'] == str(root / 'sub' / 'IMG_1, копия.jpg')
+    assert rename['new_path'] == str(root / 'sub' / 'new "name".jpg')
+    assert (rename['size'], rename['mtime_ns']) == (100, 12345)
+    assert delete['action'] == 'delete' and delete['path'] == str(root / 'IMG_2.jpg')
+    assert delete['copy_of'] == str(root / 'sub' / 'new "name".jpg')
+    assert (delete['size'], delete['mtime_ns']) == (200, 67890)
+
+    # The same share mounted elsewhere
+    elsewhere = workdir / 'elsewhere'
+    moved = [record['path'] for record in rename_plan.read_plan(name, str(elsewhere))]
+    assert moved == [str(elsewhere / 'sub' / 'IMG_1, копия.jpg'), str(elsewhere / 'IMG_2.jpg')]
+
+
+def test_changed_file_is_not_touched(workdir):
+    path = workdir / 'a.jpg'
+    path.write_bytes(b'photo')
+    stat = os.stat(str(path))
+    record = {'path': str(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    assert rename_plan.is_unchanged(record)
+    path.write_bytes(b'edited photo')
+    assert not rename_plan.is_unchanged(record)
+    assert not rename_plan.is_unchanged(dict(record, path=str(workdir / 'missing.jpg')))
+
+
+def test_plan_made_by_batch_is_applied_later(renamer, make_photo, workdir, monkeypatch):
+    folder = workdir / 'photos'
+    make_photo(folder / 'IMG_1.jpg', 1)
+    make_photo(folder / 'IMG_2.jpg', 1)  # copy of the first one
+    make_photo(folder / 'IMG_3.jpg', 3)
+
+    renamer.batch_main('photos', ask=False, plan_path='plan.jsonl')
+    assert sorted(os.listdir(str(folder))) == ['IMG_1.jpg', 'IMG_2.jpg', 'IMG_3.jpg']
+
+    monkeypatch.setattr(renamer, 'DISPOSAL', 'delete')
+    renamer.apply_plan('plan.jsonl')
+    assert sorted(os.listdir(str(folder))) == [CANON_NAME + '.jpg', CANON_NAME + '[2].jpg']
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import exif_cache
+import handle_logs
+from conftest import CANON_NAME
+
+OTHER = ('2018:01:02 03:04:05', 'Canon', 'Canon EOS 80D', 'Canon', 'EF-S24mm f/2.8 STM')
+OTHER_NAME = '2018-01-02 03-04-05 Canon EOS 80D EF-S24mm f2.8 STM'
+
+
+def test_sharded_run_is_the_same_as_batch_and_can_be_undone(renamer, make_photo, workdir, monkeypatch):
+    monkeypatch.setattr(renamer, 'DISPOSAL', 'delete')
+    photos, sub = workdir / 'photos', workdir / 'photos' / 'sub'
+    make_photo(photos / 'IMG_1.jpg', 1)
+    make_photo(photos / 'IMG_2.jpg', 2, exif=OTHER)
+    make_photo(sub / 'IMG_1 copy.jpg', 1)  # copy of photo from other folder, it is met later by walk
+    make_photo(sub / 'IMG_4.jpg', 4)
+    make_photo(sub / 'IMG_5.jpg', 4)  # copy in the same folder, it is found by worker
+
+    monkeypatch.setattr(renamer.logFile, 'handlers', [])  # messages of workers are sent to queue only in this test
+    renamer.sharded_main('photos', ask=False, workers=2)
+    handle_logs.stop_loggers()
+    assert sorted(os.listdir(str(photos))) == sorted([CANON_NAME + '.jpg', OTHER_NAME + '.jpg', 'sub'])
+    assert os.listdir(str(sub)) == [CANON_NAME + '.jpg']
+
+    # Tags read by workers are written to cache by this process under new names
+    cache = exif_cache.ExifCache()
+    for path in (photos / (CANON_NAME + '.jpg'), photos / (OTHER_NAME + '.jpg'), sub / (CANON_NAME + '.jpg')):
+        assert cache.get(str(path))['Image Model'] == 'Canon EOS 80D'
+    assert cache.get(str(photos / (OTHER_NAME + '.jpg')))['EXIF DateTimeOriginal'] == OTHER[0]
+    cache.close()
+
+    # Every worker has its own journal, all of them are undone
+    renamer.undo_renames()
+    assert sorted(os.listdir(str(photos))) == ['IMG_1.jpg', 'IMG_2.jpg', 'sub']
+    left = os.listdir(str(sub))
+    assert len(left) == 1 and left[0] in ('IMG_4.jpg', 'IMG_5.jpg')
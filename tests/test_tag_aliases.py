@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shelve
+
+import pytest
+
+import tag_aliases
+
+
+def test_aliases_are_taken_from_old_shelve_once(workdir):
+    os.mkdir('db')
+    with shelve.open(tag_aliases.OLD_SHELVE_PATH) as old_db:
+        old_db['NIKON CORPORATION'] = 'Nikon'
+        old_db['chiron'] = 'Mi MIx 2'
+        old_db['test'] = 'test'  # key that older versions wrote to check database, it is not an alias
+
+    aliases = tag_aliases.TagAliases()
+    assert aliases.aliases == {'NIKON CORPORATION': 'Nikon', 'chiron': 'Mi MIx 2'}
+    with open(tag_aliases.DEFAULT_PATH, encoding='utf8') as f:
+        assert json.load(f) == aliases.aliases
+
+    # JSON file is used from now on, shelve is not read anymore
+    with shelve.open(tag_aliases.OLD_SHELVE_PATH) as old_db:
+        old_db['Canon'] = 'Canon'
+    assert 'Canon' not in tag_aliases.TagAliases()
+
+
+def test_no_old_shelve(workdir):
+    assert len(tag_aliases.TagAliases()) == 0
+    assert not os.path.exists(tag_aliases.DEFAULT_PATH)
+
+
+def test_failed_save_leaves_old_file(workdir, monkeypatch):
+    aliases = tag_aliases.TagAliases()
+    aliases['NIKON CORPORATION'] = 'Nikon'
+
+    def broken_dump(data, f, **kwargs):
+        f.write('{"half')
+        raise OSError('No space left on device')
+
+    with monkeypatch.context() as patch, pytest.raises(OSError):
+        patch.setattr(tag_aliases.json, 'dump', broken_dump)
+        aliases['chiron'] = 'Mi MIx 2'
+    assert tag_aliases.TagAliases().aliases == {'NIKON CORPORATION': 'Nikon'}
+
+
+@pytest.mark.parametrize('name', ['aliases.csv', 'aliases.json'])
+def test_export_and_import(name, workdir):
+    aliases = tag_aliases.TagAliases()
+    # Commas, quotes and non-ASCII letters have to survive CSV
+    aliases.update({'NIKON CORPORATION': 'Nikon', 'Canon, Inc.': 'Canon "EOS"', 'Смена': 'Smena'})
+    aliases.export(name)
+
+    other = tag_aliases.TagAliases(os.path.join('other', 'tags.json'))
+    other['chiron'] = 'Mi MIx 2'
+    other['Смена'] = 'old name'  # existing aliases are overwritten
+    assert other.import_file(name) == 3
+    assert other.aliases == dict(aliases.aliases, chiron='Mi MIx 2')
+    assert tag_aliases.TagAliases(os.path.join('other', 'tags.json')).aliases == other.aliases
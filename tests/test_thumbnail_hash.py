@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import struct
+
+import pytest
+
+import thumbnail_hash
+
+# Baseline JPEG files 32x16 made by Pillow (quality 95) from picture where pixel is source(x, y):
+# grayscale one, color one (green is inverted) with 4:2:0 subsampling and color one with restart marker
+# after every block
+GRAY = base64.b64decode(
+    '/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDAAIBAQEBAQIBAQECAgICAgQDAgICAgUEBAMEBgUGBgYFBgYGBwkIBgcJBwYGCAsICQoKCgoKBggLDA'
+    'sKDAkKCgr/wAALCAAQACABAREA/8QAHwAAAQUBAQEBAQEAAAAAAAAAAAECAwQFBgcICQoL/8QAtRAAAgEDAwIEAwUFBAQAAAF9AQIDAAQRBRIh'
+    'MUEGE1FhByJxFDKBkaEII0KxwRVS0fAkM2JyggkKFhcYGRolJicoKSo0NTY3ODk6Q0RFRkdISUpTVFVWV1hZWmNkZWZnaGlqc3R1dnd4eXqDhI'
+    'WGh4iJipKTlJWWl5iZmqKjpKWmp6ipqrKztLW2t7i5usLDxMXGx8jJytLT1NXW19jZ2uHi4+Tl5ufo6erx8vP09fb3+Pn6/9oACAEBAAA/APyn'
+    '/Zt+G3/Hv/o/p2r9AP2bfht/x7/6P6dq/az/AIbb/wCov/4/R/w23/1F/wDx+v50/wBm34bf8e/+j+nav0A/Zt+G3/Hv/o/p2ryv/htv/qL/AP'
+    'j9H/Dbf/UX/wDH6//Z'
+)
+COLOR = base64.b64decode(
+    '/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDAAIBAQEBAQIBAQECAgICAgQDAgICAgUEBAMEBgUGBgYFBgYGBwkIBgcJBwYGCAsICQoKCgoKBggLDA'
+    'sKDAkKCgr/2wBDAQICAgICAgUDAwUKBwYHCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgr/wAARCAAQ'
+    'ACADASIAAhEBAxEB/8QAHwAAAQUBAQEBAQEAAAAAAAAAAAECAwQFBgcICQoL/8QAtRAAAgEDAwIEAwUFBAQAAAF9AQIDAAQRBRIhMUEGE1FhBy'
+    'JxFDKBkaEII0KxwRVS0fAkM2JyggkKFhcYGRolJicoKSo0NTY3ODk6Q0RFRkdISUpTVFVWV1hZWmNkZWZnaGlqc3R1dnd4eXqDhIWGh4iJipKT'
+    'lJWWl5iZmqKjpKWmp6ipqrKztLW2t7i5usLDxMXGx8jJytLT1NXW19jZ2uHi4+Tl5ufo6erx8vP09fb3+Pn6/8QAHwEAAwEBAQEBAQEBAQAAAA'
+    'AAAAECAwQFBgcICQoL/8QAtREAAgECBAQDBAcFBAQAAQJ3AAECAxEEBSExBhJBUQdhcRMiMoEIFEKRobHBCSMzUvAVYnLRChYkNOEl8RcYGRom'
+    'JygpKjU2Nzg5OkNERUZHSElKU1RVVldYWVpjZGVmZ2hpanN0dXZ3eHl6goOEhYaHiImKkpOUlZaXmJmaoqOkpaanqKmqsrO0tba3uLm6wsPExc'
+    'bHyMnK0tPU1dbX2Nna4uPk5ebn6Onq8vP09fb3+Pn6/9oADAMBAAIRAxEAPwDutavevNclrN715rW1m9681yetXvXmvxzwe4P/AIfu9j8B8BeA'
+    'v4Xudjiv+EXH9w0f8IuP7hr0P/hGG/55Uf8ACMN/zyr+x/8AiZH/AKffif35/wATcP8A6CPxP//Z'
+)
+RESTARTS = base64.b64decode(
+    '/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDAAIBAQEBAQIBAQECAgICAgQDAgICAgUEBAMEBgUGBgYFBgYGBwkIBgcJBwYGCAsICQoKCgoKBggLDA'
+    'sKDAkKCgr/2wBDAQICAgICAgUDAwUKBwYHCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgr/wAARCAAQ'
+    'ACADAREAAhEBAxEB/8QAHwAAAQUBAQEBAQEAAAAAAAAAAAECAwQFBgcICQoL/8QAtRAAAgEDAwIEAwUFBAQAAAF9AQIDAAQRBRIhMUEGE1FhBy'
+    'JxFDKBkaEII0KxwRVS0fAkM2JyggkKFhcYGRolJicoKSo0NTY3ODk6Q0RFRkdISUpTVFVWV1hZWmNkZWZnaGlqc3R1dnd4eXqDhIWGh4iJipKT'
+    'lJWWl5iZmqKjpKWmp6ipqrKztLW2t7i5usLDxMXGx8jJytLT1NXW19jZ2uHi4+Tl5ufo6erx8vP09fb3+Pn6/8QAHwEAAwEBAQEBAQEBAQAAAA'
+    'AAAAECAwQFBgcICQoL/8QAtREAAgECBAQDBAcFBAQAAQJ3AAECAxEEBSExBhJBUQdhcRMiMoEIFEKRobHBCSMzUvAVYnLRChYkNOEl8RcYGRom'
+    'JygpKjU2Nzg5OkNERUZHSElKU1RVVldYWVpjZGVmZ2hpanN0dXZ3eHl6goOEhYaHiImKkpOUlZaXmJmaoqOkpaanqKmqsrO0tba3uLm6wsPExc'
+    'bHyMnK0tPU1dbX2Nna4uPk5ebn6Onq8vP09fb3+Pn6/90ABAAB/9oADAMBAAIRAxEAPwDutavevNfw5wdk/wAOh/nBwFkHwaH/0Lus3vXmvhuD'
+    '8n+HQ/N+Ash+DQ//0eB/4Rcf3DX9yf8AESF/Of6P/wDEXF/z8/E//9Lgf+EXH9w1/cn/ABEhfzn+j/8AxFxf8/PxP//T6PWb3rzX848H5P8ADo'
+    'fyZwFkHwaH/9StrV715r3OD8n+HQ+j4CyD4ND/1Zf+EYb/AJ5V4f8AxEn++fN/8Rb/AOnn4n//1pf+EYb/AJ5V4f8AxEn++fN/8Rb/AOnn4n//'
+    '2Q=='
+)
+
+
+def source(x, y):
+    return (x * 8 + y * 4) % 256 if x < 16 else 255 - y * 12
+
+
+def brightness(value, color):
+    return 0.299 * value + 0.587 * (255 - value) + 0.114 * value if color else value
+
+
+def block_brightness(color):
+    """
+    :return: average brightness of every 8x8 block of source picture row by row
+    """
+    return [sum(brightness(source(column * 8 + x, row * 8 + y), color) for y in range(8) for x in range(8)) / 64
+            for row in range(2) for column in range(4)]
+
+
+def exif_with_thumbnail(thumbnail):
+    """
+    :return: APP1 segment with little-endian TIFF which IFD1 has only the thumbnail
+    """
+    ifd1 = 8 + 2 + 4
+    tiff = b'II*\0' + struct.pack('<I', 8) + struct.pack('<HI', 0, ifd1)
+    tiff += struct.pack('<H', 2) + struct.pack('<HHII', thumbnail_hash.JPEG_INTERCHANGE_FORMAT, 4, 1, ifd1 + 30)
+    tiff += struct.pack('<HHII', thumbnail_hash.JPEG_INTERCHANGE_FORMAT_LENGTH, 4, 1, len(thumbnail))
+    tiff += struct.pack('<I', 0) + thumbnail
+    payload = b'Exif\0\0' + tiff
+    return b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload
+
+
+@pytest.mark.parametrize('jpeg, color', [(GRAY, False), (COLOR, True), (RESTARTS, True)])
+def test_dc_picture_is_average_brightness_of_blocks(jpeg, color):
+    width, height, picture = thumbnail_hash.dc_picture(jpeg)
+    assert (width, height) == (4, 2)
+    # DC coefficient is 8 times average of block shifted by 128
+    for dc, expected in zip(picture, block_brightness(color)):
+        assert abs(dc / 8 + 128 - expected) <= 1.5
+
+
+def test_not_baseline_jpeg_is_not_supported():
+    with pytest.raises(thumbnail_hash.UnsupportedThumbnail):
+        thumbnail_hash.dc_picture(b'\x89PNG\r\n')
+    progressive = GRAY.replace(b'\xff\xc0', b'\xff\xc2', 1)
+    with pytest.raises(thumbnail_hash.UnsupportedThumbnail):
+        thumbnail_hash.dc_picture(progressive)
+
+
+def test_difference_hash():
+    # Brightness grows from left to right, so every bit is set
+    assert thumbnail_hash.difference_hash(9, 8, list(range(9)) * 8) == 2 ** 64 - 1
+    assert thumbnail_hash.difference_hash(9, 8, list(range(9, 0, -1)) * 8) == 0
+
+
+def test_hash_of_thumbnail_from_exif(workdir):
+    photo = workdir / 'photo.jpg'
+    photo.write_bytes(b'\xff\xd8' + exif_with_thumbnail(COLOR) + b'\xff\xda\x00\x02' + b'\0' * 100 + b'\xff\xd9')
+    assert thumbnail_hash.read_thumbnail(str(photo)) == COLOR
+    value = thumbnail_hash.thumbnail_hash(str(photo))
+    assert value == thumbnail_hash.difference_hash(*thumbnail_hash.dc_picture(COLOR))
+
+    (workdir / 'plain.jpg').write_bytes(b'\xff\xd8\xff\xda\x00\x02' + b'\0' * 100 + b'\xff\xd9')
+    assert thumbnail_hash.thumbnail_hash(str(workdir / 'plain.jpg')) is None
+
+
+def test_bk_tree_finds_close_hashes():
+    tree = thumbnail_hash.BKTree()
+    values = {'a': 0b0000, 'b': 0b0001, 'c': 0b0111, 'd': 0b1111_1111}
+    for item, value in values.items():
+        tree.add(value, item)
+    assert tree.search(0, 1) == [(0, 'a'), (1, 'b')]
+    assert sorted(item for _, item in tree.search(0b0011, 1)) == ['b', 'c']
+
+    tree.replace(values['b'], 'b', 'renamed')
+    tree.remove(values['a'], 'a')
+    assert tree.search(0, 1) == [(1, 'renamed')]
+    assert tree.size == 3
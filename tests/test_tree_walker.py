@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import tree_walker
+
+EXTENSIONS = ('.jpg', '.jpeg')
+
+
+def make_tree(root, paths):
+    for path in paths:
+        path = os.path.join(str(root), *path.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'wb').close()
+
+
+def walk(root, include=None, exclude=None):
+    """
+    :return: dict folder relative to root -> tuple (names of photos, names of photos with "no exif" mark)
+    """
+    return {os.path.relpath(listing.folder, str(root)).replace(os.sep, '/'): (
+        sorted(entry.name for entry in listing.photos), sorted(entry.name for entry in listing.no_exif_marked))
+        for listing in tree_walker.walk(str(root), EXTENSIONS, include, exclude)}
+
+
+def test_photos_are_picked_out_by_extension_and_mark(workdir):
+    make_tree(workdir, ['a.JPG', 'b.jpeg', 'notes.txt', 'c (no exif).jpg', 'sub/d.jpg'])
+    assert walk(workdir) == {'.': (['a.JPG', 'b.jpeg'], ['c (no exif).jpg']), 'sub': (['d.jpg'], [])}
+
+
+def test_walk_goes_in_the_same_order_as_os_walk(workdir):
+    make_tree(workdir, ['x/1/a.jpg', 'x/2/b.jpg', 'y/c.jpg', 'z.jpg'])
+    assert [listing.folder for listing in tree_walker.walk(str(workdir), EXTENSIONS)] == \
+        [folder for folder, _, _ in os.walk(str(workdir))]
+
+
+def test_include_matches_names_and_relative_paths(workdir):
+    make_tree(workdir, ['IMG_1.jpg', 'DSC_2.jpg', '2019/IMG_3.jpg', '2019/DSC_4.jpg', '2020/DSC_5.jpg'])
+    assert walk(workdir, include=['IMG_*']) == {'.': (['IMG_1.jpg'], []), '2019': (['IMG_3.jpg'], []),
+                                                '2020': ([], [])}
+    assert walk(workdir, include=['2019/*']) == {'.': ([], []), '2019': (['DSC_4.jpg', 'IMG_3.jpg'], []),
+                                                 '2020': ([], [])}
+
+
+def test_exclude_skips_files_and_whole_folders(workdir):
+    make_tree(workdir, ['IMG_1.jpg', 'DSC_2.jpg', 'trash/IMG_3.jpg', 'trash/deep/IMG_4.jpg', 'keep/DSC_5.jpg'])
+    assert walk(workdir, exclude=['DSC_*', 'trash']) == {'.': (['IMG_1.jpg'], []), 'keep': ([], [])}
+
+
+def test_subfolders_can_be_removed_from_listing(workdir):
+    make_tree(workdir, ['a.jpg', 'skip/b.jpg', 'go/c.jpg'])
+    folders = []
+    for listing in tree_walker.walk(str(workdir), EXTENSIONS):
+        listing.subfolders[:] = [name for name in listing.subfolders if name != 'skip']
+        folders.append(os.path.basename(listing.folder))
+    assert folders[1:] == ['go']
+
+
+def test_list_folder_uses_known_names(workdir):
+    photo_filter = tree_walker.PhotoFilter(EXTENSIONS, include=['IMG_*'])
+    listing = tree_walker.list_folder(str(workdir), ['IMG_1.jpg', 'DSC_2.jpg', 'IMG_3 (no exif).jpg'], photo_filter)
+    assert [entry.name for entry in listing.photos] == ['IMG_1.jpg']
+    assert [entry.name for entry in listing.no_exif_marked] == ['IMG_3 (no exif).jpg']
+    assert listing.photos[0].path == os.path.join(str(workdir), 'IMG_1.jpg')
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import watcher
+from conftest import CANON_NAME
+
+
+class FakeWatcher:
+    """
+    Gives changed files from the list of rounds and then stops watching like Ctrl+C does
+    """
+
+    def __init__(self, rounds):
+        self.rounds = list(rounds)
+        self.overflowed = False
+
+    def changed_files(self, timeout):
+        if not self.rounds:
+            raise KeyboardInterrupt
+        return self.rounds.pop(0)
+
+    def close(self):
+        pass
+
+
+def test_file_removed_after_it_settled_does_not_stop_watching(renamer, make_photo, workdir, monkeypatch):
+    removed = make_photo(workdir / 'photos' / 'a' / 'IMG_1.jpg', 1)
+    make_photo(workdir / 'photos' / 'a' / 'IMG_2.jpg', 2)
+    make_photo(workdir / 'photos' / 'b' / 'IMG_3.jpg', 3)
+    new_files = [str(workdir / 'photos' / 'a' / 'IMG_1.jpg'), str(workdir / 'photos' / 'a' / 'IMG_2.jpg'),
+                 str(workdir / 'photos' / 'b' / 'IMG_3.jpg')]
+    monkeypatch.setattr(watcher, 'make_watcher', lambda root, poll_interval: FakeWatcher([new_files, [], [], []]))
+
+    original_settled = watcher.Debouncer.settled
+
+    def settled(self):
+        ready = original_settled(self)
+        if removed in ready:
+            os.remove(removed)  # removed right after it has settled, e.g. by user
+        return ready
+
+    monkeypatch.setattr(watcher.Debouncer, 'settled', settled)
+    renamer.watch_main(str(workdir / 'photos'), settle_seconds=0)
+    assert os.listdir(str(workdir / 'photos' / 'a')) == [CANON_NAME + '.jpg']
+    assert os.listdir(str(workdir / 'photos' / 'b')) == [CANON_NAME + '.jpg']
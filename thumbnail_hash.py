@@ -0,0 +1,408 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+# Perceptual hash of photo made from small JPEG thumbnail that cameras put into EXIF (IFD1), so resized or
+# recompressed copies of the same shot can be found without decoding full image.
+# Thumbnail is not decoded in full either: only DC coefficient of every 8x8 block is taken (it is average
+# brightness of block), that gives tiny grayscale picture like 20x15 for 160x120 thumbnail. It is scaled down to
+# 9x8 and every bit of 64-bit hash tells whether brightness goes down or up between two neighbour cells (dHash).
+# Only baseline JPEG thumbnails are supported, that is what cameras write. Photos without them have no hash.
+#
+# Hashes are kept in BK-tree, so all hashes that differ from given one in no more than few bits
+# are found without comparing it with every hash of library.
+
+import re
+import struct
+
+import fast_exif
+
+THRESHOLD = 6  # how many bits of 64 can differ for photos to be considered the same shot
+HASH_WIDTH, HASH_HEIGHT = 9, 8
+
+JPEG_INTERCHANGE_FORMAT = 0x0201
+JPEG_INTERCHANGE_FORMAT_LENGTH = 0x0202
+BASELINE_FRAMES = (0xC0, 0xC1)  # huffman coded, not progressive
+RESTART_MARKER = re.compile(b'\xff[\xd0-\xd7]')
+
+
+class UnsupportedThumbnail(Exception):
+    pass
+
+
+def read_thumbnail(path_to_image):
+    """
+    :param path_to_image: full path to JPEG file
+    :return: bytes of JPEG thumbnail from EXIF or None if there is no thumbnail
+    """
+    with open(path_to_image, 'rb') as f:
+        try:
+            tiff = fast_exif.find_tiff(f)
+        except (fast_exif.UnusualFile, struct.error):
+            return None
+    if tiff is None or len(tiff) < 8:
+        return None
+
+    endian = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+    if endian is None:
+        return None
+    try:
+        ifd0 = struct.unpack(endian + 'I', tiff[4:8])[0]
+        entries = struct.unpack(endian + 'H', tiff[ifd0:ifd0 + 2])[0]
+        ifd1 = struct.unpack(endian + 'I', tiff[ifd0 + 2 + entries * 12:ifd0 + 6 + entries * 12])[0]
+        if not ifd1:
+            return None
+        entries = struct.unpack(endian + 'H', tiff[ifd1:ifd1 + 2])[0]
+        offset = length = None
+        for i in range(entries):
+            entry = ifd1 + 2 + i * 12
+            tag, field_type = struct.unpack(endian + 'HH', tiff[entry:entry + 4])
+            # Both tags are LONG, but SHORT is seen sometimes as well
+            value = struct.unpack(endian + ('H' if field_type == 3 else 'I'),
+                                  tiff[entry + 8:entry + (10 if field_type == 3 else 12)])[0]
+            if tag == JPEG_INTERCHANGE_FORMAT:
+                offset = value
+            elif tag == JPEG_INTERCHANGE_FORMAT_LENGTH:
+                length = value
+    except struct.error:
+        return None
+    if not offset or not length or offset + length > len(tiff):
+        return None
+    return tiff[offset:offset + length]
+
+
+def _huffman_table(counts, symbols):
+    """
+    :return: tuple (list of 256 tuples (length of code, symbol) for codes that are not longer than 8 bits and
+    are looked up by next 8 bits of data, dict (length of code, code) -> symbol for longer codes)
+    """
+    lookup = [None] * 256
+    long_codes = {}
+    code = position = 0
+    for length, count in enumerate(counts, 1):
+        for _ in range(count):
+            if length <= 8:
+                shift = 8 - length
+                for tail in range(1 << shift):
+                    lookup[(code << shift) | tail] = (length, symbols[position])
+            else:
+                long_codes[(length, code)] = symbols[position]
+            code += 1
+            position += 1
+        code <<= 1
+    return lookup, long_codes
+
+
+class _Bits:
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+        self.buffer = 0
+        self.count = 0  # number of bits in buffer
+
+    def _fill(self):
+        while self.count <= 24:
+            if self.position < len(self.data):
+                self.buffer = (self.buffer << 8) | self.data[self.position]
+            elif self.position > len(self.data) + 4:
+                raise UnsupportedThumbnail('Thumbnail is truncated')
+            else:  # decoder may look a few bits ahead of the end of data
+                self.buffer <<= 8
+            self.position += 1
+            self.count += 8
+        self.buffer &= (1 << self.count) - 1
+
+    def read(self, count):
+        if self.count < count:
+            self._fill()
+        self.count -= count
+        return (self.buffer >> self.count) & ((1 << count) - 1)
+
+    def decode(self, table):
+        if self.count < 16:
+            self._fill()
+        lookup, long_codes = table
+        code = (self.buffer >> (self.count - 8)) & 255
+        found = lookup[code]
+        if found is not None:
+            self.count -= found[0]
+            return found[1]
+        self.count -= 8
+        for length in range(9, 17):
+            code = (code << 1) | self.read(1)
+            symbol = long_codes.get((length, code))
+            if symbol is not None:
+                return symbol
+        raise UnsupportedThumbnail('Wrong huffman code')
+
+    def receive(self, size):
+        if not size:
+            return 0
+        value = self.read(size)
+        return value if value >= 1 << (size - 1) else value - (1 << size) + 1
+
+
+def dc_picture(jpeg):
+    """
+    Decode only average brightness of every 8x8 block of baseline JPEG
+
+    :param jpeg: bytes of JPEG file
+    :return: tuple (width, height, list of brightness of blocks row by row)
+    """
+    if jpeg[:2] != b'\xff\xd8':
+        raise UnsupportedThumbnail('It is not JPEG')
+    quantization = {}
+    huffman = {}
+    frame = None
+    restart_interval = 0
+    position = 2
+    while True:
+        if jpeg[position] != 0xFF:
+            raise UnsupportedThumbnail('Broken JPEG marker')
+        marker = jpeg[position + 1]
+        if marker == 0xFF:
+            position += 1
+            continue
+        if marker == 0xD9:
+            raise UnsupportedThumbnail('There is no image data')
+        length = struct.unpack('>H', jpeg[position + 2:position + 4])[0]
+        segment = jpeg[position + 4:position + 2 + length]
+        position += 2 + length
+
+        if marker == 0xDB:  # quantization tables, only the first (DC) value of every table is needed
+            i = 0
+            while i < len(segment):
+                precision, table_id = segment[i] >> 4, segment[i] & 15
+                quantization[table_id] = segment[i + 1] if not precision else struct.unpack(
+                    '>H', segment[i + 1:i + 3])[0]
+                i += 65 if not precision else 129
+        elif marker == 0xC4:
+            i = 0
+            while i < len(segment):
+                table_class, table_id = segment[i] >> 4, segment[i] & 15
+                counts = segment[i + 1:i + 17]
+                symbols = segment[i + 17:i + 17 + sum(counts)]
+                huffman[(table_class, table_id)] = _huffman_table(counts, symbols)
+                i += 17 + sum(counts)
+        elif marker == 0xDD:
+            restart_interval = struct.unpack('>H', segment[:2])[0]
+        elif 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            if marker not in BASELINE_FRAMES:
+                raise UnsupportedThumbnail('Only baseline JPEG is supported')
+            height, width = struct.unpack('>HH', segment[1:5])
+            components = [(segment[6 + i * 3], segment[7 + i * 3] >> 4, segment[7 + i * 3] & 15, segment[8 + i * 3])
+                          for i in range(segment[5])]
+            frame = (width, height, components)
+        elif marker == 0xDA:
+            if frame is None:
+                raise UnsupportedThumbnail('Image data before frame header')
+            scan = [(segment[1 + i * 2], segment[2 + i * 2] >> 4, segment[2 + i * 2] & 15)
+                    for i in range(segment[0])]
+            end = jpeg.find(b'\xff\xd9', position)
+            return _decode_scan(jpeg[position:end if end != -1 else len(jpeg)], frame, scan, quantization, huffman,
+                                restart_interval)
+
+
+def _decode_scan(data, frame, scan, quantization, huffman, restart_interval):
+    width, height, components = frame
+    by_id = {component[0]: component for component in components}
+    if len(scan) != len(components):
+        raise UnsupportedThumbnail('Only one scan with all components is supported')
+    h_max = max(component[1] for component in components)
+    v_max = max(component[2] for component in components)
+    luma_id, luma_h, luma_v, luma_table = components[0]
+    luma_q = quantization.get(luma_table, 1)
+
+    if len(components) == 1:  # blocks of grayscale picture go one by one without MCU structure
+        mcus_x, mcus_y = (width + 7) // 8, (height + 7) // 8
+        luma_h = luma_v = 1
+        layout = [(scan[0], 1)]
+    else:
+        mcus_x, mcus_y = (width + 8 * h_max - 1) // (8 * h_max), (height + 8 * v_max - 1) // (8 * v_max)
+        layout = [(item, by_id[item[0]][1] * by_id[item[0]][2]) for item in scan]
+    blocks_x, blocks_y = mcus_x * luma_h, mcus_y * luma_v
+    picture = [0] * (blocks_x * blocks_y)
+
+    tables = []
+    for (component_id, dc_table, ac_table), blocks in layout:
+        try:
+            tables.append((component_id, blocks, huffman[(0, dc_table)], huffman[(1, ac_table)]))
+        except KeyError:
+            raise UnsupportedThumbnail('Huffman table is missing')
+
+    mcus = mcus_x * mcus_y
+    per_segment = restart_interval or mcus
+    mcu = 0
+    for segment in RESTART_MARKER.split(data):
+        bits = _Bits(segment.replace(b'\xff\x00', b'\xff'))
+        predictors = {}
+        for _ in range(min(per_segment, mcus - mcu)):
+            mcu_y, mcu_x = divmod(mcu, mcus_x)
+            for component_id, blocks, dc, ac in tables:
+                for block in range(blocks):
+                    predictors[component_id] = predictors.get(component_id, 0) + bits.receive(bits.decode(dc))
+                    k = 1
+                    while k < 64:  # AC coefficients are not needed, but they have to be read to get to next block
+                        symbol = bits.decode(ac)
+                        zeros, size = symbol >> 4, symbol & 15
+                        if not size:
+                            if zeros != 15:
+                                break
+                            k += 16
+                            continue
+                        bits.read(size)
+                        k += zeros + 1
+                    if component_id == luma_id:
+                        y, x = divmod(block, luma_h)
+                        index = (mcu_y * luma_v + y) * blocks_x + mcu_x * luma_h + x
+                        picture[index] = predictors[component_id] * luma_q
+            mcu += 1
+        if mcu >= mcus:
+            break
+
+    # Blocks that are only padding of MCU to the right and to the bottom are dropped
+    used_x, used_y = (width + 7) // 8, (height + 7) // 8
+    if (used_x, used_y) != (blocks_x, blocks_y):
+        picture = [picture[y * blocks_x + x] for y in range(used_y) for x in range(used_x)]
+    return used_x, used_y, picture
+
+
+def difference_hash(width, height, picture):
+    """
+    :param width, height: size of picture
+    :param picture: list of brightness of pixels row by row
+    :return: 64-bit int
+    """
+    cells = []
+    for row in range(HASH_HEIGHT):
+        top = row * height // HASH_HEIGHT
+        bottom = max((row + 1) * height // HASH_HEIGHT, top + 1)
+        for column in range(HASH_WIDTH):
+            left = column * width // HASH_WIDTH
+            right = max((column + 1) * width // HASH_WIDTH, left + 1)
+            total = sum(sum(picture[y * width + left:y * width + right]) for y in range(top, bottom))
+            cells.append(total / ((bottom - top) * (right - left)))
+
+    value = 0
+    for row in range(HASH_HEIGHT):
+        for column in range(HASH_WIDTH - 1):
+            cell = row * HASH_WIDTH + column
+            value = (value << 1) | (cells[cell] < cells[cell + 1])
+    return value
+
+
+def thumbnail_hash(path_to_image):
+    """
+    :param path_to_image: full path to JPEG file
+    :return: 64-bit perceptual hash of EXIF thumbnail or None if there is no thumbnail that can be read
+    """
+    thumbnail = read_thumbnail(path_to_image)
+    if not thumbnail:
+        return None
+    try:
+        width, height, picture = dc_picture(thumbnail)
+    except (UnsupportedThumbnail, IndexError, struct.error):
+        return None
+    if width < 2 or height < 2:
+        return None
+    return difference_hash(width, height, picture)
+
+
+def image_size(path_to_image):
+    """
+    Find size of the main image of JPEG file by reading only headers of its segments
+
+    :param path_to_image: full path to JPEG file
+    :return: tuple (width, height) or None if file is not JPEG or it is broken
+    """
+    with open(path_to_image, 'rb') as f:
+        if f.read(2) != b'\xff\xd8':
+            return None
+        while True:
+            head = f.read(4)
+            if len(head) < 4 or head[0] != 0xFF:
+                return None
+            marker = head[1]
+            if marker in fast_exif.STANDALONE_MARKERS or marker == 0xFF:  # no length after them
+                f.seek(-2, 1)
+                continue
+            # Every frame marker except DHT, JPG and DAC tells size of image
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                frame = f.read(5)
+                if len(frame) < 5:
+                    return None
+                height, width = struct.unpack('>HH', frame[1:5])
+                return width, height
+            if marker == 0xDA:  # image data has begun without frame header
+                return None
+            f.seek(struct.unpack('>H', head[2:4])[0] - 2, 1)
+
+
+def distance(first, second):
+    return bin(first ^ second).count('1')
+
+
+class BKTree:
+    """
+    Tree of hashes where every child is kept under its distance to parent, so search for hashes that
+    are close to given one skips whole branches that are too far by triangle inequality
+    """
+
+    def __init__(self):
+        self.root = None  # node is [hash, list of items with this hash, dict distance -> child node]
+        self.size = 0
+
+    def _find(self, value):
+        node = self.root
+        while node is not None:
+            d = distance(value, node[0])
+            if not d:
+                return node
+            node = node[2].get(d)
+        return None
+
+    def add(self, value, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            d = distance(value, node[0])
+            if not d:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value, threshold):
+        """
+        :return: list of tuples (distance, item) for items which hashes differ from value in no more than
+        threshold bits, the closest ones go first
+        """
+        found = []
+        nodes = [self.root] if self.root is not None else []
+        while nodes:
+            node = nodes.pop()
+            d = distance(value, node[0])
+            if d <= threshold:
+                found.extend((d, item) for item in node[1])
+            for child_distance, child in node[2].items():
+                if d - threshold <= child_distance <= d + threshold:
+                    nodes.append(child)
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+    def replace(self, value, item, new_item):
+        node = self._find(value)
+        if node is not None and item in node[1]:
+            node[1][node[1].index(item)] = new_item
+
+    def remove(self, value, item):
+        # Node itself stays in tree (it is needed for its children), it just has no items anymore
+        node = self._find(value)
+        if node is not None and item in node[1]:
+            node[1].remove(item)
+            self.size -= 1
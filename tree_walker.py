@@ -0,0 +1,147 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+# Walks through folder and its subfolders with os.scandir and gives them back one by one as soon as
+# every folder is listed, so work on huge trees starts right away.
+# Every folder is listed only once: the same listing is used to pick up new names, to check whether folder
+# has been changed and to find photos. Photos are picked out by name only (extension, "(no exif)" mark and
+# include/exclude patterns), and every photo keeps its DirEntry, so its size is not asked from disk again
+# (on Windows scandir gives it for free, elsewhere it is asked once and then cached).
+#
+# Usage is the same as with os.walk:
+# for listing in tree_walker.walk(path, ('.jpg', '.jpeg')):
+#     listing.subfolders[:] = [...]  # to not go inside some subfolders
+#     for entry in listing.photos: ...
+
+import fnmatch
+import os
+
+NO_EXIF_MARK = '(no exif)'
+
+
+class PathEntry:
+    """
+    Same as os.DirEntry for file which path is known, but which wasn't listed with os.scandir
+    """
+    __slots__ = ('name', 'path', '_stat')
+
+    def __init__(self, folder, name):
+        self.name = name
+        self.path = os.path.join(folder, name)
+        self._stat = None
+
+    def stat(self):
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+
+class FolderListing:
+    def __init__(self, folder, names, subfolders, photos, no_exif_marked):
+        self.folder = folder
+        self.names = names  # names of all entries of folder
+        self.subfolders = subfolders  # names of subfolders, it can be changed to not walk into some of them
+        self.photos = photos  # DirEntry (or PathEntry) objects of photos to process
+        self.no_exif_marked = no_exif_marked  # DirEntry objects of photos with "no exif" mark
+
+
+def _matches(name, relative_path, patterns):
+    return any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relative_path, pattern) for pattern in patterns)
+
+
+class PhotoFilter:
+    def __init__(self, extensions, include=None, exclude=None, root=None):
+        """
+        :param extensions: tuple of lowercase extensions of photos, e.g. ('.jpg', '.jpeg')
+        :param include: list of glob patterns, only files which name or path (relative to root,
+        with '/' between folders) matches one of them are processed
+        :param exclude: list of glob patterns for files and folders to skip
+        :param root: folder that paths in patterns are relative to
+        """
+        self.extensions = extensions
+        self.include = include or []
+        self.exclude = exclude or []
+        self.root = root
+
+    def _relative(self, path):
+        if self.root is None:
+            return path.replace(os.sep, '/')
+        return os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def skip_folder(self, path, name):
+        return bool(self.exclude) and _matches(name, self._relative(path), self.exclude)
+
+    def split(self, entries):
+        """
+        :param entries: DirEntry or PathEntry objects of files
+        :return: tuple (photos to process, photos with "no exif" mark)
+        """
+        photos, no_exif_marked = [], []
+        for entry in entries:
+            if not entry.name.lower().endswith(self.extensions):
+                continue
+            if self.include or self.exclude:
+                relative_path = self._relative(entry.path)
+                if self.include and not _matches(entry.name, relative_path, self.include):
+                    continue
+                if self.exclude and _matches(entry.name, relative_path, self.exclude):
+                    continue
+            if NO_EXIF_MARK in entry.name:
+                no_exif_marked.append(entry)
+            else:
+                photos.append(entry)
+        return photos, no_exif_marked
+
+
+def list_folder(folder, names, photo_filter):
+    """
+    Make listing of folder from names that are already known without listing it again
+
+    :param folder: path to folder
+    :param names: names of files in folder
+    :param photo_filter: PhotoFilter object
+    :return: FolderListing object without subfolders
+    """
+    photos, no_exif_marked = photo_filter.split(PathEntry(folder, name) for name in names)
+    return FolderListing(folder, list(names), [], photos, no_exif_marked)
+
+
+def walk(root, extensions, include=None, exclude=None):
+    """
+    Go through folder and its subfolders from top to bottom in the same order as os.walk does
+
+    :param root: path to folder
+    :param extensions: tuple of lowercase extensions of photos
+    :param include: list of glob patterns for files to process
+    :param exclude: list of glob patterns for files and folders to skip
+    :return: generator of FolderListing objects, folders that can't be listed are skipped
+    """
+    photo_filter = PhotoFilter(extensions, include, exclude, root)
+    folders = [root]
+    while folders:
+        folder = folders.pop()
+        try:
+            with os.scandir(folder) as iterator:
+                entries = list(iterator)
+        except OSError:
+            continue
+
+        names, subfolders, files = [], [], []
+        for entry in entries:
+            names.append(entry.name)
+            try:
+                is_folder = entry.is_dir()  # type of entry is usually known without asking disk
+            except OSError:
+                is_folder = False
+            if is_folder:
+                # Like os.walk, it doesn't go inside symbolic links to folders
+                if not entry.is_symlink() and not photo_filter.skip_folder(entry.path, entry.name):
+                    subfolders.append(entry.name)
+            else:
+                files.append(entry)
+
+        photos, no_exif_marked = photo_filter.split(files)
+        listing = FolderListing(folder, names, subfolders, photos, no_exif_marked)
+        yield listing
+        # Subfolders are taken after listing was given back, so they can be removed from it like in os.walk
+        folders.extend(os.path.join(folder, name) for name in reversed(listing.subfolders))
@@ -0,0 +1,174 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+# Watches folders for new files. It is used by watch mode of photo_renamer to rename photos
+# as soon as they land in ingest folders.
+#
+# On Linux it uses inotify (through ctypes, so nothing has to be installed), elsewhere or if inotify
+# is not available it falls back to listing folders every few seconds.
+# New files are not given back immediately: file has to keep the same size and modification time for
+# some time first, so files that are still being copied are not touched.
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+# Flags of inotify from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, length of name
+
+
+class InotifyWatcher:
+    def __init__(self, root):
+        """
+        :param root: folder to watch, subfolders (including new ones) are watched as well
+        :raise OSError: if inotify is not available
+        """
+        if not sys.platform.startswith('linux'):
+            raise OSError('inotify is available only on Linux')
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.folders = {}  # watch descriptor -> path to folder
+        self.overflowed = False  # True if kernel dropped some events and folders have to be listed again
+        for folder, subfolders, files in os.walk(root):
+            self._add_watch(folder)
+
+    def _add_watch(self, folder):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+        if wd >= 0:
+            self.folders[wd] = folder
+
+    def changed_files(self, timeout):
+        """
+        Wait for events not longer than timeout
+
+        :param timeout: seconds to wait
+        :return: list of paths of files that were created or written
+        """
+        paths = []
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return paths
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return paths
+
+        position = 0
+        while position + EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, position)
+            name = data[position + EVENT_HEADER.size:position + EVENT_HEADER.size + length].rstrip(b'\0')
+            position += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+            if wd not in self.folders or not name:
+                continue
+            path = os.path.join(self.folders[wd], os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):  # new subfolder and everything that is already inside it
+                    for folder, subfolders, files in os.walk(path):
+                        self._add_watch(folder)
+                        paths.extend(os.path.join(folder, filename) for filename in files)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                paths.append(path)
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    def __init__(self, root, interval=5.0):
+        """
+        :param root: folder to watch, subfolders are watched as well
+        :param interval: seconds between listings of folders
+        """
+        self.root = root
+        self.interval = interval
+        self.snapshot = self._scan()
+        self.overflowed = False
+
+    def _scan(self):
+        snapshot = {}
+        for folder, subfolders, files in os.walk(self.root):
+            for filename in files:
+                path = os.path.join(folder, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def changed_files(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        snapshot = self._scan()
+        paths = [path for path, state in snapshot.items() if self.snapshot.get(path) != state]
+        self.snapshot = snapshot
+        return paths
+
+    def close(self):
+        pass
+
+
+def make_watcher(root, poll_interval=None):
+    """
+    :param root: folder to watch
+    :param poll_interval: if it is given, polling is used even if inotify is available
+    :return: InotifyWatcher or PollingWatcher object
+    """
+    if poll_interval is None:
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError):  # AttributeError if libc has no inotify functions
+            pass
+    return PollingWatcher(root, poll_interval or 5.0)
+
+
+class Debouncer:
+    """
+    Keeps new files till they stop changing
+    """
+
+    def __init__(self, settle_seconds=2.0):
+        """
+        :param settle_seconds: how long file has to stay the same to be considered completely written
+        """
+        self.settle_seconds = settle_seconds
+        self.pending = {}  # path -> (size, mtime, time when file was seen changed last time)
+
+    def touch(self, path):
+        self.pending[path] = (None, None, time.monotonic())
+
+    def settled(self):
+        """
+        :return: list of files that haven't been changed for settle_seconds, they are removed from pending
+        """
+        now = time.monotonic()
+        ready = []
+        for path, (size, mtime, changed) in list(self.pending.items()):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:  # it was removed or renamed meanwhile
+                del self.pending[path]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime):
+                self.pending[path] = (stat.st_size, stat.st_mtime_ns, now)
+            elif now - changed >= self.settle_seconds:
+                ready.append(path)
+                del self.pending[path]
+        return ready